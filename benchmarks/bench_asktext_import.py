@@ -0,0 +1,38 @@
+"""
+Measures the time needed to import the GUI module of TexText with and without
+loading the GUI toolkit (GTK or Tk), i.e. the startup time saved by runs which
+do not show the dialog (--text, recompiling nodes).
+
+Each measurement runs in a fresh interpreter so no module is cached.
+
+Usage: python benchmarks/bench_asktext_import.py [repetitions]
+"""
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SCRIPTS = [
+    ("interpreter only", "pass"),
+    ("import asktext", "import textext.asktext"),
+    ("import asktext + toolkit", "import textext.asktext as a; a._load_toolkit()"),
+]
+
+
+def run(script):
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, "-c", script], cwd=REPO_DIR)
+    return time.perf_counter() - start
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, script in SCRIPTS:
+        times = [run(script) for _ in range(repetitions)]
+        print("{:<26} {:8.1f} ms (best of {})".format(name, min(times) * 1000, repetitions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Micro-benchmark of the in-memory log buffer (CycleBufferHandler) under heavy debug
+logging as during batch conversions: the list based implementation copying the
+buffer on each record beyond its capacity vs. the deque based one.
+
+Usage: python benchmarks/bench_log_buffer.py [number of records] [capacity]
+"""
+import logging
+import logging.handlers
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from textext.utility import CycleBufferHandler  # noqa: E402
+
+
+class ListCycleBufferHandler(logging.handlers.BufferingHandler):
+    """ The previous implementation """
+
+    def emit(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) > self.capacity:
+            self.buffer = self.buffer[-self.capacity:]
+
+
+def measure(handler, n_records):
+    logger = logging.Logger("bench")
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    start = time.perf_counter()
+    for i in range(n_records):
+        logger.debug("Compiled snippet %d of %d", i, n_records)
+    return time.perf_counter() - start
+
+
+def main():
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    capacity = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    for name, handler_class in [("list", ListCycleBufferHandler), ("deque", CycleBufferHandler)]:
+        seconds = measure(handler_class(capacity), n_records)
+        print("{:<6} {:10.0f} records/s ({} records, capacity {})".format(name, n_records / seconds, n_records,
+                                                                          capacity))
+
+
+if __name__ == "__main__":
+    main()
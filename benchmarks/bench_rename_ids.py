@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of the id renaming applied to every converted TexText node.
+
+Builds a fragment resembling large TikZ output (glyph definitions referenced by
+<use> elements, clip paths referenced from styles) and compares the previous
+implementation (uuid per id, regex over every attribute) with svg_tools.rename_ids.
+
+Usage: python benchmarks/bench_rename_ids.py [number of glyphs]
+"""
+import os
+import re
+import sys
+import timeit
+import uuid
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from textext.svg_tools import XLINK_HREF, content_id_prefix, rename_ids  # noqa: E402
+
+
+def make_fragment(n_glyphs):
+    root = ET.Element("g")
+    defs = ET.SubElement(root, "defs")
+    for i in range(n_glyphs):
+        ET.SubElement(defs, "path", {"id": "glyph0-%d" % i, "d": "M 0 0 L 1 1 C 2 2 3 3 4 4 Z",
+                                     "style": "stroke:none;"})
+    for i in range(n_glyphs // 10):
+        clip = ET.SubElement(defs, "clipPath", {"id": "clip%d" % i})
+        ET.SubElement(clip, "path", {"d": "M 0 0 L 10 0 L 10 10 Z"})
+    body = ET.SubElement(root, "g", {"id": "surface1"})
+    for i in range(n_glyphs * 3):
+        ET.SubElement(body, "use", {XLINK_HREF: "#glyph0-%d" % (i % n_glyphs), "x": "%d" % i, "y": "3.5",
+                                    "style": "fill:rgb(0%,0%,0%);fill-opacity:1;"})
+    for i in range(n_glyphs // 10):
+        ET.SubElement(body, "path", {"d": "M 0 0 L 5 5", "transform": "matrix(1,0,0,1,2,2)",
+                                     "clip-path": "url(#clip%d)" % i,
+                                     "style": "fill:none;stroke-width:0.4;stroke:rgb(0%,0%,0%);"})
+    return root
+
+
+def legacy_rename_ids(root):
+    rename_map = {}
+    for el in root.iterfind('.//*[@id]'):
+        new_id = 'id-' + str(uuid.uuid4())
+        rename_map[el.attrib["id"]] = new_id
+        el.attrib["id"] = new_id
+
+    def replace_old_id(m):
+        return "url(#{})".format(rename_map.get(m.group(1), m.group(1)))
+    regex = re.compile(r"url\(#([^)(]*)\)")
+
+    for el in root.iter():
+        for name, value in el.items():
+            el.attrib[name] = regex.sub(replace_old_id, value)
+
+
+def main():
+    n_glyphs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = 5
+    prefix = content_id_prefix(b"benchmark")
+    for name, func in [("legacy", legacy_rename_ids), ("rename_ids", lambda root: rename_ids(root, prefix))]:
+        times = timeit.repeat("func(fragment)", setup="fragment = make_fragment(%d)" % n_glyphs,
+                              number=1, repeat=repeat, globals={"func": func, "make_fragment": make_fragment})
+        print("{:<12} {:8.2f} ms (best of {}, {} glyphs)".format(name, min(times) * 1000, repeat, n_glyphs))
+
+
+if __name__ == "__main__":
+    main()
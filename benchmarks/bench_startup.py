@@ -0,0 +1,55 @@
+"""
+Measures the startup time of TexText (import of textext.base and construction of
+the TexText effect, i.e. everything before effect() runs) in fresh interpreters
+with the startup profiler enabled, prints the recorded phases of the fastest run
+and fails if it exceeds the time budget.
+
+Requires the environment TexText runs in (inkex, lxml) and uses the TexText
+settings of the current user. The first run is not counted since it may run the
+requirements check.
+
+Usage: python benchmarks/bench_startup.py [budget in ms] [repetitions]
+"""
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SCRIPT = """
+import json
+from textext.utility import startup_profiler
+import textext.base
+startup_profiler.mark("import textext.base")
+textext.base.TexText()
+startup_profiler.mark("TexText()")
+print(json.dumps({"total": startup_profiler.total(), "phases": startup_profiler.phases}))
+"""
+
+
+def run():
+    env = dict(os.environ, TEXTEXT_PROFILE_STARTUP="1")
+    output = subprocess.check_output([sys.executable, "-c", SCRIPT], cwd=REPO_DIR, env=env)
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 1000.0
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    run()  # warm up: requirements check, file system caches
+    best = min((run() for _ in range(repetitions)), key=lambda profile: profile["total"])
+
+    for name, seconds in best["phases"]:
+        print("{:<32} {:8.1f} ms".format(name, seconds * 1000))
+    total = best["total"] * 1000
+    print("{:<32} {:8.1f} ms (best of {}, budget {:.0f} ms)".format("total", total, repetitions, budget))
+
+    if total > budget:
+        print("Startup time exceeds the budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
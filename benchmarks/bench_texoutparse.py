@@ -0,0 +1,157 @@
+"""
+Benchmark of LatexLogParser on large LaTeX logs.
+
+Compares the previous implementation (the missing ref, badbox, warning and error
+regexes tried one after another on every line) with the prefix check and the
+combined regex of LatexLogParser. Both must produce the same
+messages and the combined regex must be faster. Additionally the time to find
+the first error (as after a failed compilation) by reading the lines and by
+scanning the memory mapped file is measured.
+
+Without arguments a log resembling the output of a TikZ/ pgfplots document
+(file loading, package info, boxes, font warnings) of several megabytes is
+generated.
+
+Usage: python benchmarks/bench_texoutparse.py [path/to/file.log ...]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from textext.texoutparse import LatexLogParser, _LineIterWrapper  # noqa: E402
+
+
+class LegacyLatexLogParser(LatexLogParser):
+
+    def process(self, lines):
+        lines_iterable = _LineIterWrapper(lines, self.context_lines)
+        process_line = self.process_line
+        pending_error = None
+        for _, line in enumerate(lines_iterable):
+            if not line:
+                continue
+            if pending_error is not None:
+                match = self.error_line.match(line)
+                if match is not None:
+                    pending_error['line'] = int(match.group(1))
+                    pending_error = None
+                    continue
+            err = process_line(line)
+            if err is not None:
+                err.context_lines = lines_iterable.get_context()
+                if self.errors and err is self.errors[-1]:
+                    pending_error = err
+
+    def process_line(self, line, categories=None):
+        match = self.missing_ref.match(line)
+        if match is not None:
+            return self.process_missing_ref(match)
+        match = self.badbox.match(line)
+        if match is not None:
+            return self.process_badbox(match)
+        match = self.warning.match(line)
+        if match is not None:
+            return self.process_warning(match)
+        match = self.error.match(line)
+        if match is not None:
+            return self.process_error(match)
+        return None
+
+
+def make_log(n_pages):
+    lines = ["This is pdfTeX, Version 3.141592653-2.6-1.40.25 (TeX Live 2023) (preloaded format=pdflatex)",
+             "entering extended mode",
+             "(/usr/share/texlive/texmf-dist/tex/latex/pgfplots/pgfplots.sty"]
+    for page in range(n_pages):
+        lines += [
+            "(/usr/share/texlive/texmf-dist/tex/generic/pgf/frontendlayer/tikz/libraries/tikzlibraryplot%d.code.tex"
+            % page,
+            "File: pgfplots.code.tex 2021/05/15 (1.18.1)",
+            "\\pgfplots@table@%d=\\toks%d" % (page, page),
+            "Package pgfplots Info: Using table 'data%d.dat' with 1000 rows on input line %d." % (page, page),
+            "Package pgfplots notification 'compat/show suggested version=true': you might benefit from",
+            "LaTeX Font Info:    Font shape `OT1/cmr/bx/n' in size <12> not available",
+            "(Font)              Font shape `OT1/cmr/b/n' tried instead on input line %d." % page,
+            "Overfull \\hbox (%d.5pt too wide) in paragraph at lines %d--%d" % (page % 20, page, page + 2),
+            "[]\\OT1/cmr/m/n/10 Some text of the plot caption",
+            "",
+            " []",
+            "",
+            "LaTeX Warning: Reference `fig:plot%d' on page %d undefined on input line %d." % (page, page, page),
+            "Underfull \\vbox (badness 10000) has occurred while \\output is active [%d]" % page,
+            "LaTeX Font Warning: Font shape `T1/cmss/m/it' undefined",
+            "(Font)              using `T1/cmss/m/sl' instead on input line %d." % page,
+            "<plot%d.pdf, id=%d, 433.62pt x 289.08pt>" % (page, page),
+            "File: plot%d.pdf Graphic file (type pdf)" % page,
+            "<use plot%d.pdf>" % page,
+            "Package pdftex.def Info: plot%d.pdf  used on input line %d." % (page, page),
+            "(pdftex.def)             Requested size: 345.0pt x 230.0pt.",
+            "[%d{/usr/share/texlive/texmf-dist/fonts/map/pdftex/updmap/pdftex.map}]" % page,
+        ]
+    lines += ["! Undefined control sequence.",
+              "l.%d \\foo" % n_pages,
+              "Output written on document.pdf (%d pages, 1234567 bytes)." % n_pages]
+    return [line + "\n" for line in lines]
+
+
+def messages(parser):
+    return [(message.category, sorted(message.info.items()), message.context_lines)
+            for message in parser.errors + parser.warnings + parser.badboxes + parser.missing_refs]
+
+
+def parse(parser_class, lines):
+    parser = parser_class()
+    parser.process(lines)
+    return parser
+
+
+def benchmark(name, lines):
+    size = sum(len(line) for line in lines)
+    assert messages(parse(LegacyLatexLogParser, lines)) == messages(parse(LatexLogParser, lines)), \
+        "Results of the parsers differ for %s" % name
+
+    repeat = 5
+    best = {}
+    for parser_class in (LegacyLatexLogParser, LatexLogParser):
+        times = timeit.repeat(lambda: parse(parser_class, lines), number=1, repeat=repeat)
+        best[parser_class] = min(times)
+        print("{:<22} {:8.1f} ms (best of {}, {}: {:.1f} MB, {} lines)".format(
+            parser_class.__name__, best[parser_class] * 1000, repeat, name, size / 1e6, len(lines)))
+    assert best[LatexLogParser] < best[LegacyLatexLogParser], "No speedup for %s" % name
+    print("speedup {:.2f}x".format(best[LegacyLatexLogParser] / best[LatexLogParser]))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_file = os.path.join(tmp_dir, "document.log")
+        with open(log_file, "w", encoding="utf8") as f:
+            f.writelines(lines)
+
+        def first_error_from_lines():
+            parser = LatexLogParser()
+            with open(log_file, encoding="utf8") as f:
+                return next(parser.iter_messages(f, True, [parser.ERROR]), None)
+
+        def first_error_from_file():
+            parser = LatexLogParser()
+            errors = parser.iter_file_messages(log_file, True, [parser.ERROR])
+            error = next(errors, None)
+            errors.close()
+            return error
+
+        for func in (first_error_from_lines, first_error_from_file):
+            times = timeit.repeat(func, number=1, repeat=repeat)
+            print("{:<22} {:8.1f} ms (best of {})".format(func.__name__, min(times) * 1000, repeat))
+
+
+def main():
+    if len(sys.argv) > 1:
+        for filename in sys.argv[1:]:
+            with open(filename, encoding="utf8", errors="replace") as f:
+                benchmark(os.path.basename(filename), f.readlines())
+    else:
+        benchmark("generated log", make_log(4000))
+
+
+if __name__ == "__main__":
+    main()
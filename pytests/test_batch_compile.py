@@ -0,0 +1,83 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import re
+import shutil
+
+import pytest
+
+pytest.importorskip("inkex")
+
+from textext.base import TexToPdfConverter  # noqa: E402
+from textext.diagnostics import Diagnostic, LatexDiagnostics  # noqa: E402
+from textext.errors import TexTextConversionError  # noqa: E402
+
+
+class FakeTexConverter(TexToPdfConverter):
+    """
+    Instead of running TeX, fails for documents containing \\undefined (reported in its line)
+    or \\runaway (reported three lines later, i.e. in the next snippet of a batch) and produces
+    one page per non-empty snippet otherwise
+    """
+
+    def __init__(self):
+        super(FakeTexConverter, self).__init__(None)
+        self.num_pages = None
+
+    def run_tex(self, tex_command, preamble, texwrapper, output_format="pdf", snippet_lines=None,
+                first_error_only=False):
+        lines = texwrapper.split("\n")
+        for number, line in enumerate(lines, start=1):
+            error_line = None
+            if "\\undefined" in line:
+                error_line = number
+            elif "\\runaway" in line:
+                error_line = number if snippet_lines is not None else number + 3
+            if error_line is not None:
+                diagnostics = LatexDiagnostics()
+                diagnostics.diagnostics.append(Diagnostic("error", "Some error", error_line))
+                raise TexTextConversionError("Some error", diagnostics=diagnostics)
+        snippets = re.findall(r"\\textextresetcounters\n(.*?)\n\\endgroup", texwrapper, re.DOTALL)
+        self.num_pages = sum(1 for snippet in snippets if snippet.strip())
+
+    def parse_pdf_page_count(self):
+        return self.num_pages
+
+
+def test_failing_snippet_is_removed():
+    results = FakeTexConverter().tex_to_pdf_batch("pdflatex", ["$a$", "\\undefined", "$c$"], "")
+    assert results[0] == 1 and results[2] == 2
+    assert isinstance(results[1], TexTextConversionError)
+
+
+def test_error_reported_in_later_snippet_is_not_attributed_to_it():
+    results = FakeTexConverter().tex_to_pdf_batch("pdflatex", ["$a$", "\\runaway", "$c$", "$d$"], "")
+    # $c$ is blamed by the log but compiles on its own, hence all snippets are compiled one by one
+    assert results == [None, None, None, None]
+
+
+def test_page_count_mismatch_compiles_snippets_on_their_own():
+    assert FakeTexConverter().tex_to_pdf_batch("pdflatex", ["$a$", "", "$c$"], "") == [None, None, None]
+
+
+def test_snippets_with_global_assignments_are_not_batched():
+    results = FakeTexConverter().tex_to_pdf_batch("pdflatex", ["\\gdef\\x{1}", "$b$", "\\setcounter{page}{3}"], "")
+    assert results == [None, 1, None]
+
+
+@pytest.mark.skipif(shutil.which("pdflatex") is None, reason="pdflatex is not installed")
+def test_snippets_are_isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    snippet = ("\\newcommand\\x{x}\\bfseries"
+               "\\begin{equation}\\x\\end{equation}\\typeout{TEXTEXT-EQUATION=\\theequation}")
+    converter = TexToPdfConverter(None)
+    assert converter.tex_to_pdf_batch("pdflatex", [snippet, snippet], "") == [1, 2]
+    with open(converter.tmp("log"), encoding="utf-8", errors="replace") as f:
+        assert f.read().count("TEXTEXT-EQUATION=1") == 2
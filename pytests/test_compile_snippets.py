@@ -0,0 +1,89 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import multiprocessing
+import types
+
+import pytest
+
+pytest.importorskip("inkex")
+
+import textext.base as base  # noqa: E402
+from textext.base import TexText, TexToPdfConverter  # noqa: E402
+from textext.errors import TexTextConversionError  # noqa: E402
+from textext.render_cache import RenderCache  # noqa: E402
+
+
+class FakeSvgConverter(TexToPdfConverter):
+    """ Instead of running TeX and inkscape, fails for snippets containing \\undefined """
+
+    def tex_to_svg(self, tex_command, latex_text, preamble_file):
+        if "\\undefined" in latex_text:
+            raise TexTextConversionError("Undefined control sequence")
+        with open(self.tmp("svg"), "w") as f:
+            f.write("<svg>%s</svg>" % latex_text)
+        return "inkscape"
+
+
+def make_textext(tmp_path, workers):
+    textext = TexText.__new__(TexText)
+    textext.config = {"recompile_workers": workers}
+    textext.options = types.SimpleNamespace(svg_backend="inkscape")
+    textext.requirements_checker = types.SimpleNamespace(
+        inkscape_executable="/usr/bin/inkscape", available_tex_to_pdf_converters={"pdflatex": "/usr/bin/pdflatex"})
+    textext.render_cache = RenderCache(str(tmp_path / "cache"))
+    textext.format_cache = None
+    textext.inkscape_shell = None
+    textext.command_limits = {}
+    return textext
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the fake converter is only used by forked worker processes")
+def test_snippets_are_compiled_in_worker_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(base, "TexToPdfConverter", FakeSvgConverter)
+    # Different preambles, hence each snippet is compiled by another worker process
+    good = ("$x$", str(tmp_path / "a.tex"), "pdflatex")
+    bad = ("\\undefined", str(tmp_path / "b.tex"), "pdflatex")
+
+    results = make_textext(tmp_path, 2).compile_snippets([good, bad], str(tmp_path))
+
+    svg_file, error, svg_converter = results[good]
+    assert error is None and svg_converter == "inkscape"
+    with open(svg_file) as f:
+        assert f.read() == "<svg>$x$</svg>"
+    assert results[bad] == (None, "Undefined control sequence", None)
+
+
+def test_worker_failure_is_reported_for_its_snippets(tmp_path, monkeypatch):
+    class CrashingPool(object):
+        """ Process pool whose workers die """
+
+        def __init__(self, max_workers, initializer, initargs):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def submit(self, *args, **kwargs):
+            from concurrent.futures import Future
+            future = Future()
+            future.set_exception(RuntimeError("killed"))
+            return future
+
+    monkeypatch.setattr(base.concurrent.futures, "ProcessPoolExecutor", CrashingPool)
+    snippets = [("$x$", str(tmp_path / "a.tex"), "pdflatex"), ("$y$", str(tmp_path / "b.tex"), "pdflatex")]
+
+    results = make_textext(tmp_path, 2).compile_snippets(snippets, str(tmp_path))
+
+    assert results == {snippet: (None, "Worker process failed: killed", None) for snippet in snippets}
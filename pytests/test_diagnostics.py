@@ -0,0 +1,48 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+from textext.diagnostics import LatexDiagnostics
+
+LOG = """This is pdfTeX, Version 3.141592653-2.6-1.40.25 (TeX Live 2023) (preloaded format=pdflatex)
+Package hyperref Warning: Token not allowed in a PDF string (Unicode):
+(hyperref)                removing `\\alpha' on input line 9.
+
+Overfull \\hbox (12.5pt too wide) in paragraph at lines 3--4
+LaTeX Warning: Reference `fig' on page 1 undefined on input line 10.
+! Undefined control sequence.
+l.11 \\foo
+! Missing $ inserted.
+l.2 \\usepackage
+"""
+
+
+def test_lines_are_mapped_to_the_snippet(tmp_path):
+    log_file = tmp_path / "tmp.log"
+    log_file.write_text(LOG)
+    # The snippet of 4 lines starts at line 8 of the tex file
+    diagnostics = LatexDiagnostics.from_log_file(str(log_file), 8, 4)
+    assert [(d.category, d.tex_line, d.snippet_line) for d in diagnostics.diagnostics] == [
+        ("warning", 9, 2),
+        ("badbox", 3, None),
+        ("missing_ref", 10, 3),
+        ("error", 11, 4),
+        ("error", 2, None),
+    ]
+    assert diagnostics.first_error["message"] == "Undefined control sequence."
+    assert diagnostics.error_lines() == [4]
+    assert str(diagnostics).splitlines()[3] == "line 4: error: Undefined control sequence."
+
+
+def test_first_error_only(tmp_path):
+    log_file = tmp_path / "tmp.log"
+    log_file.write_text(LOG)
+    diagnostics = LatexDiagnostics.from_log_file(str(log_file), 8, 4, first_error_only=True)
+    assert [(d.category, d.tex_line, d.snippet_line) for d in diagnostics.diagnostics] == [("error", 11, 4)]
+    assert diagnostics.first_error["message"] == "Undefined control sequence."
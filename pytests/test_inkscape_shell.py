@@ -0,0 +1,121 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import os
+import sys
+
+import pytest
+
+from textext.errors import TexTextCommandError, TexTextCommandFailed
+from textext.inkscape_shell import InkscapeShell
+
+pytestmark = pytest.mark.skipif(sys.platform.startswith("win"), reason="the fake inkscape is a script")
+
+# Mimics `inkscape --shell`: Prints the prompt and executes the actions of each line. Besides
+# the export actions it knows echo:<text>, sleep:<seconds> and exit:<code>.
+FAKE_INKSCAPE = """#!{python}
+import sys
+import time
+
+def prompt():
+    sys.stdout.write("> ")
+    sys.stdout.flush()
+
+sys.stdout.write("Inkscape interactive shell mode.\\n")
+prompt()
+export_filename = None
+for line in sys.stdin:
+    for action in line.split(";"):
+        name, _, value = action.strip().partition(":")
+        if name == "quit":
+            sys.exit(0)
+        elif name == "exit":
+            sys.exit(int(value))
+        elif name == "sleep":
+            time.sleep(float(value))
+        elif name == "echo":
+            sys.stdout.write(value + "\\n")
+            sys.stdout.flush()
+        elif name == "export-filename":
+            export_filename = value
+        elif name == "export-do":
+            with open(export_filename, "w") as f:
+                f.write("<svg/>")
+    prompt()
+"""
+
+
+@pytest.fixture
+def fake_inkscape(tmp_path):
+    filename = str(tmp_path / "inkscape")
+    with open(filename, "w") as f:
+        f.write(FAKE_INKSCAPE.format(python=sys.executable))
+    os.chmod(filename, 0o755)
+    return filename
+
+
+@pytest.fixture
+def shell(fake_inkscape):
+    shell = InkscapeShell(fake_inkscape, timeout=2)
+    yield shell
+    shell.close()
+
+
+def test_export(shell, tmp_path):
+    output_file = str(tmp_path / "out.svg")
+    shell.export(str(tmp_path / "in.pdf"), output_file, "svg", text_to_path=True)
+    assert os.path.isfile(output_file)
+
+
+def test_output_is_read_up_to_the_prompt(shell):
+    # The output arrives in several chunks and contains "> " before the prompt
+    assert shell.execute(["echo:a > b", "sleep:0.2", "echo:c"]) == b"a > b\nc\n"
+    assert shell.execute(["echo:d"]) == b"d\n"
+
+
+def test_shell_is_restarted_after_crash(shell):
+    shell.execute(["echo:a"])
+    pid = shell._process.pid
+    with pytest.raises(TexTextCommandFailed, match="terminated"):
+        shell.execute(["exit:3"])
+    assert shell.execute(["echo:b"]) == b"b\n"
+    assert shell._process.pid != pid
+
+
+def test_shell_is_killed_on_timeout(fake_inkscape):
+    shell = InkscapeShell(fake_inkscape, timeout=0.5)
+    try:
+        shell.execute(["echo:a"])
+        process = shell._process
+        with pytest.raises(TexTextCommandFailed, match="did not answer"):
+            shell.execute(["sleep:10"])
+        assert process.poll() is not None
+        assert shell.execute(["echo:b"]) == b"b\n"
+    finally:
+        shell.close()
+
+
+def test_commands_are_rejected_if_too_many_are_waiting(fake_inkscape):
+    shell = InkscapeShell(fake_inkscape, timeout=0.2, max_pending=1)
+    try:
+        shell._pending.acquire()  # another thread is waiting for the shell
+        with pytest.raises(TexTextCommandError, match="Too many commands"):
+            shell.execute(["echo:a"])
+        shell._pending.release()
+        assert shell.execute(["echo:a"]) == b"a\n"
+    finally:
+        shell.close()
+
+
+def test_paths_with_action_separator_are_rejected(shell, tmp_path):
+    output_file = str(tmp_path / "a;export-do.svg")
+    with pytest.raises(TexTextCommandError, match="cannot be passed"):
+        shell.export(str(tmp_path / "in.pdf"), output_file, "svg")
+    assert not shell.is_alive()
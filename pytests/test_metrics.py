@@ -0,0 +1,72 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import io
+
+import pytest
+
+from textext.metrics import Metrics, percentile, print_report, summarize
+
+RECORDS = [
+    {"stage": "tex_to_pdf", "tex_command": "pdflatex", "seconds": 0.3},
+    {"stage": "tex_to_pdf", "tex_command": "pdflatex", "seconds": 0.1},
+    {"stage": "tex_to_pdf", "tex_command": "lualatex", "seconds": 0.9},
+    {"stage": "pdf_to_svg", "seconds": 0.2},
+    {"counter": "render_cache_hit", "tex_command": "pdflatex", "value": 2},
+    {"counter": "render_cache_hit", "tex_command": "pdflatex"},
+]
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([4.0], 90) == 4.0
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 100) == 5.0
+    # Interpolated between the values at positions 3 and 4
+    assert percentile(values, 90) == pytest.approx(4.6)
+
+
+def test_summarize_groups_by_stage_and_tex_command():
+    stages, counters = summarize(RECORDS)
+    assert stages == {("tex_to_pdf", "pdflatex"): [0.1, 0.3],
+                      ("tex_to_pdf", "lualatex"): [0.9],
+                      ("pdf_to_svg", "-"): [0.2]}
+    assert counters == {("render_cache_hit", "pdflatex"): 3}
+
+
+def test_report():
+    out = io.StringIO()
+    print_report(RECORDS, out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].split()[:3] == ["stage", "command", "count"]
+    assert lines[1].split() == ["pdf_to_svg", "-", "1", "200.0", "200.0", "200.0", "200.0"]
+    assert lines[3].split() == ["tex_to_pdf", "pdflatex", "2", "200.0", "280.0", "298.0", "300.0"]
+    assert lines[-1].split() == ["render_cache_hit", "pdflatex", "3"]
+
+
+def test_merge_records_of_other_instance():
+    worker = Metrics(enabled=True)
+    with worker.labels(tex_command="xelatex"):
+        worker.observe("tex_to_pdf", 0.5)
+        worker.count("render_cache_miss")
+    records = worker.take_records()
+    assert worker.take_records() == []
+
+    main = Metrics(enabled=True)
+    main.merge(records)
+    assert main.counters["render_cache_miss"] == 1
+    stages, _ = summarize(main.take_records())
+    assert stages == {("tex_to_pdf", "xelatex"): [0.5]}
+
+    disabled = Metrics()
+    disabled.merge(records)
+    assert disabled.take_records() == []
@@ -0,0 +1,91 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("inkex")
+
+import textext.base as base  # noqa: E402
+from textext.base import TexToPdfConverter  # noqa: E402
+from textext.errors import TexTextCommandFailed, TexTextCommandNotFound  # noqa: E402
+from textext.render_cache import RenderCache  # noqa: E402
+
+PREAMBLE = "\\documentclass{article}\\usepackage{amsmath}"
+
+
+class FakeTexInstallation(object):
+    """
+    Replaces exec_command: kpsewhich finds mylatexformat.ltx only if it is installed and
+    format builds (-ini runs) write the format file only if mylatexformat is installed
+    """
+
+    def __init__(self, tmp_dir, mylatexformat_installed=True):
+        self.tmp_dir = tmp_dir
+        self.mylatexformat_installed = mylatexformat_installed
+        self.format_builds = 0
+        self.lookups = 0
+
+    def __call__(self, cmd, ok_return_value=0, **limits):
+        if os.path.basename(cmd[0]) == "kpsewhich":
+            self.lookups += 1
+            if not self.mylatexformat_installed:
+                raise TexTextCommandFailed("Command %s failed" % cmd, 1)
+            return b"/texmf/tex/latex/mylatexformat/mylatexformat.ltx\n"
+        if "-ini" not in cmd:
+            raise TexTextCommandNotFound("Unexpected command %s" % cmd)
+        self.format_builds += 1
+        if not self.mylatexformat_installed:
+            raise TexTextCommandFailed("File `mylatexformat.ltx' not found", 1)
+        jobname = [arg for arg in cmd if arg.startswith("-jobname=")][0][len("-jobname="):]
+        with open(os.path.join(self.tmp_dir, jobname + ".fmt"), "w") as f:
+            f.write("format")
+        return b""
+
+
+@pytest.fixture
+def converter(tmp_path, monkeypatch):
+    monkeypatch.setattr(TexToPdfConverter, "_tex_files", {})  # a new process
+    tmp_dir = tmp_path / "tmp"
+    tmp_dir.mkdir()
+    return TexToPdfConverter(None, format_cache=RenderCache(str(tmp_path / "formats")), tmp_dir=str(tmp_dir))
+
+
+def test_format_is_built_once(converter, monkeypatch):
+    tex = FakeTexInstallation(converter.tmp_dir)
+    monkeypatch.setattr(base, "exec_command", tex)
+    format_file = converter.preamble_format("/usr/bin/pdflatex", PREAMBLE)
+    assert format_file is not None and os.path.isfile(format_file)
+    assert converter.preamble_format("/usr/bin/pdflatex", PREAMBLE) == format_file
+    assert tex.format_builds == 1
+    assert converter.preamble_format("/usr/bin/pdflatex", PREAMBLE + "\\usepackage{amssymb}") != format_file
+    assert tex.format_builds == 2
+
+
+def test_failed_build_is_retried_after_installing_mylatexformat(converter, monkeypatch):
+    tex = FakeTexInstallation(converter.tmp_dir, mylatexformat_installed=False)
+    monkeypatch.setattr(base, "exec_command", tex)
+    assert converter.preamble_format("/usr/bin/pdflatex", PREAMBLE) is None
+    assert converter.preamble_format("/usr/bin/pdflatex", PREAMBLE) is None
+    assert tex.format_builds == 1
+    assert tex.lookups == 1
+
+    tex.mylatexformat_installed = True
+    monkeypatch.setattr(TexToPdfConverter, "_tex_files", {})  # the next run of TexText
+    assert converter.preamble_format("/usr/bin/pdflatex", PREAMBLE) is not None
+    assert tex.format_builds == 2
+
+
+def test_no_format_for_engines_without_format_support(converter, monkeypatch):
+    tex = FakeTexInstallation(converter.tmp_dir)
+    monkeypatch.setattr(base, "exec_command", tex)
+    assert converter.preamble_format("/usr/bin/lualatex", PREAMBLE) is None
+    assert tex.format_builds == 0
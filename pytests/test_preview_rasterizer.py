@@ -0,0 +1,41 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import pytest
+
+from textext.errors import TexTextConversionError
+from textext.preview_rasterizer import MAX_DPI, MIN_DPI, PopplerRasterizer, drawing_bbox, read_pgm
+
+
+def test_read_pgm(tmp_path):
+    pgm_file = tmp_path / "probe.pgm"
+    pgm_file.write_bytes(b"P5\n# created by pdftoppm\n3 2\n255\n" + bytes(range(6)) + b"trailing")
+    assert read_pgm(str(pgm_file)) == (3, 2, bytes(range(6)))
+
+    pgm_file.write_bytes(b"P6\n3 2\n255\n" + bytes(18))
+    with pytest.raises(TexTextConversionError):
+        read_pgm(str(pgm_file))
+
+
+def test_drawing_bbox():
+    white = b"\xff"
+    assert drawing_bbox(4, 3, white * 12) is None
+    # Dark pixels at (1, 1) and (2, 2)
+    data = white * 4 + white + b"\x00" + white * 2 + white * 2 + b"\x80" + white
+    assert drawing_bbox(4, 3, data) == (1, 1, 3, 3)
+
+
+def test_choose_dpi():
+    assert PopplerRasterizer.choose_dpi(1.0, 1.0, None) == MAX_DPI
+    assert PopplerRasterizer.choose_dpi(0.0, 1.0, (100, 100)) == MAX_DPI
+    # The drawing must fit in both directions
+    assert PopplerRasterizer.choose_dpi(2.0, 1.0, (200, 150)) == 100
+    assert PopplerRasterizer.choose_dpi(1.0, 1.0, (10000, 10000)) == MAX_DPI
+    assert PopplerRasterizer.choose_dpi(10.0, 10.0, (50, 50)) == MIN_DPI
@@ -0,0 +1,93 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import threading
+import time
+
+from textext.asktext import PreviewWorker
+
+
+class Dispatcher(object):
+    """ Collects the calls dispatched to the GUI thread, run() executes them """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, function, *args):
+        self.calls.append((function, args))
+
+    def run(self):
+        calls, self.calls = self.calls, []
+        for function, args in calls:
+            function(*args)
+
+
+def make_worker(preview_callback, dispatch, images, errors):
+    return PreviewWorker(preview_callback, lambda path: path, images.append, errors.append, dispatch)
+
+
+def preview(text, preamble, load_image, tex_command, white_bg, max_size):
+    load_image(text + ".png")
+
+
+def wait_for_calls(dispatch):
+    deadline = time.time() + 5
+    while not dispatch.calls and time.time() < deadline:
+        time.sleep(0.01)
+    return dispatch.calls
+
+
+def test_preview_image_is_delivered():
+    dispatch = Dispatcher()
+    images, errors = [], []
+    worker = make_worker(preview, dispatch, images, errors)
+    try:
+        worker.request("a", "", "pdflatex", False)
+        assert wait_for_calls(dispatch)
+        dispatch.run()
+        assert images == ["a.png"] and errors == []
+    finally:
+        assert worker.stop()
+
+
+def test_stop_does_not_wait_for_blocked_preview():
+    dispatch = Dispatcher()
+    images, errors = [], []
+    started, release = threading.Event(), threading.Event()
+
+    def blocked_preview(text, preamble, load_image, tex_command, white_bg, max_size):
+        started.set()
+        release.wait(10)  # ignores the cancellation
+        load_image(text + ".png")
+
+    worker = make_worker(blocked_preview, dispatch, images, errors)
+    worker.request("a", "", "pdflatex", False)
+    assert started.wait(5)
+
+    start = time.time()
+    assert not worker.stop(timeout=0.2)
+    assert time.time() - start < 2
+
+    release.set()
+    worker._thread.join(5)
+    dispatch.run()
+    assert images == [] and errors == []
+
+
+def test_results_are_dropped_once_the_worker_is_stopped():
+    dispatch = Dispatcher()
+    images, errors = [], []
+    worker = make_worker(preview, dispatch, images, errors)
+    worker.request("a", "", "pdflatex", False)
+    assert wait_for_calls(dispatch)
+    assert worker.stop()
+    # The dialog has been closed before the GUI thread executed the dispatched result
+    dispatch.run()
+    assert images == [] and errors == []
@@ -0,0 +1,117 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import os
+
+import pytest
+
+from textext.render_cache import RenderCache
+
+
+def make_file(directory, name, size):
+    filename = str(directory / name)
+    with open(filename, "wb") as f:
+        f.write(b"x" * size)
+    return filename
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    key = RenderCache.make_key("text", 1)
+    assert cache.get(key, "svg") is None
+    cached = cache.put(key, "svg", make_file(tmp_path, "a.svg", 10))
+    assert cached == cache.path(key, "svg")
+    assert cache.get(key, "svg") == cached
+    with open(cached, "rb") as f:
+        assert f.read() == b"x" * 10
+    assert cache.get(key, "png") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_size=25)
+    for index, key in enumerate(["a", "b"]):
+        cache.put(key, "svg", make_file(tmp_path, key, 10))
+        os.utime(cache.path(key, "svg"), (index, index))
+    os.utime(cache.get("a", "svg"), (5, 5))  # a is used more recently than b
+    cache.put("c", "svg", make_file(tmp_path, "c", 10))
+    assert cache.get("b", "svg") is None
+    assert cache.get("a", "svg") is not None
+    assert cache.get("c", "svg") is not None
+
+
+def test_new_entry_is_never_evicted(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_size=15)
+    cache.put("a", "svg", make_file(tmp_path, "a", 10))
+    # The old entry is more recent than the new one (same timestamps or clock skew)
+    os.utime(cache.path("a", "svg"), (2 ** 31, 2 ** 31))
+    cached = cache.put("b", "svg", make_file(tmp_path, "b", 10))
+    assert os.path.isfile(cached)
+    assert cache.get("a", "svg") is None
+
+
+def test_entry_larger_than_cache_is_not_stored(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_size=0)
+    filename = make_file(tmp_path, "a.svg", 10)
+    assert cache.put("a", "svg", filename) == filename
+    assert os.path.isfile(filename)
+    assert cache.get("a", "svg") is None
+
+
+def test_disabled_cache(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), enabled=False)
+    filename = make_file(tmp_path, "a.svg", 10)
+    assert cache.put("a", "svg", filename) == filename
+    assert cache.get("a", "svg") is None
+    assert not os.path.exists(str(tmp_path / "cache"))
+
+
+def test_render_cache_key(tmp_path):
+    pytest.importorskip("inkex")
+    import textext.base as textext
+    preamble = tmp_path / "preamble.tex"
+    preamble.write_text("\\usepackage{amsmath}")
+
+    def key(text="$x$", latex_options=("-halt-on-error",), *extra):
+        return textext.TexText.render_cache_key("svg", text, str(preamble), "pdflatex", "/usr/bin/pdflatex",
+                                                latex_options, *extra)
+
+    reference = key()
+    assert key() == reference
+    assert key("$y$") != reference
+    assert key(latex_options=("-shell-escape",)) != reference
+    assert key("$x$", ("-halt-on-error",), ["dvisvgm"]) != reference
+    preamble.write_text("\\usepackage{amssymb}")
+    assert key() != reference
+
+
+def test_backend_keys_change_with_the_executables(tmp_path):
+    pytest.importorskip("inkex")
+    import types
+    import textext.base as textext
+    executables = {name: make_file(tmp_path, name, 10) for name in ["inkscape", "pdftoppm", "dvisvgm"]}
+    tt = textext.TexText.__new__(textext.TexText)
+    tt.requirements_checker = types.SimpleNamespace(inkscape_executable=executables["inkscape"],
+                                                    available_pdf_to_png_converters={
+                                                        "pdftoppm": executables["pdftoppm"]})
+    converter = types.SimpleNamespace(dvisvgm=executables["dvisvgm"])
+
+    def keys():
+        return (tt.svg_backend_key(converter, "inkscape"), tt.svg_backend_key(converter, "dvisvgm"),
+                tt.png_backend_key())
+
+    reference = keys()
+    assert keys() == reference
+    # Updating a program changes the keys of the outputs it may create: svg of inkscape,
+    # svg of dvisvgm, png
+    for index, (name, changed_keys) in enumerate([("inkscape", [0, 2]), ("dvisvgm", [1]), ("pdftoppm", [2])]):
+        os.utime(executables[name], (index + 1, index + 1))
+        changed = keys()
+        assert [i for i in range(3) if changed[i] != reference[i]] == changed_keys
+        reference = changed
@@ -0,0 +1,142 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import logging
+import os
+import sys
+
+import pytest
+
+from textext import requirements_check
+from textext.requirements_check import PathIndex, TexTextRequirementsChecker
+
+
+def make_executable(directory, name):
+    filename = str(directory / name)
+    with open(filename, "w") as f:
+        f.write("#!/bin/sh\n")
+    os.chmod(filename, 0o755)
+    return filename
+
+
+@pytest.fixture
+def bin_dir(tmp_path, monkeypatch):
+    """ A directory which is the only one in the search path """
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    monkeypatch.setattr(requirements_check.defaults, "get_system_path", lambda: [str(directory)])
+    return directory
+
+
+def test_path_index_finds_programs_in_path_order(tmp_path):
+    directories = [str(tmp_path / name) for name in ["a", "b", "c", "missing"]]
+    for directory in directories[:3]:
+        os.mkdir(directory)
+    for directory in directories[1:3]:
+        make_executable(tmp_path / os.path.basename(directory), "pdflatex")
+
+    index = PathIndex()
+    assert list(index.find("pdflatex", directories)) == directories[1:3]
+    assert list(index.find("typst", directories)) == []
+
+
+def test_path_index_lists_directories_again_if_program_is_not_found(tmp_path):
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    index = PathIndex()
+    assert list(index.find("typst", [str(directory)])) == []
+
+    make_executable(directory, "typst")
+    os.utime(str(directory), ns=(0, 0))  # the listing is outdated even if the clock is coarse
+    assert list(index.find("typst", [str(directory)])) == [str(directory)]
+
+
+def checker_with_results(bin_dir):
+    checker = TexTextRequirementsChecker(logging.getLogger("TexText"), {})
+    checker.inkscape_executable = make_executable(bin_dir, "inkscape")
+    checker.available_tex_to_pdf_converters = {"pdflatex": make_executable(bin_dir, "pdflatex")}
+    checker.available_pdf_to_svg_converters = {"inkscape": checker.inkscape_executable}
+    checker.pygtk_is_found = True
+    return checker
+
+
+def test_cached_results_are_restored(bin_dir):
+    cached = checker_with_results(bin_dir).cached_results()
+
+    checker = TexTextRequirementsChecker(logging.getLogger("TexText"), {})
+    assert checker.restore_cached_results(cached)
+    assert checker.inkscape_executable == str(bin_dir / "inkscape")
+    assert checker.available_tex_to_pdf_converters == {"pdflatex": str(bin_dir / "pdflatex")}
+    assert checker.available_pdf_to_svg_converters == {"inkscape": str(bin_dir / "inkscape")}
+    assert checker.pygtk_is_found and not checker.tkinter_is_found
+
+
+@pytest.mark.parametrize("change", ["install program", "update program", "configure program"])
+def test_changed_environment_requires_new_check(bin_dir, change):
+    cached = checker_with_results(bin_dir).cached_results()
+    config = {}
+    if change == "install program":
+        make_executable(bin_dir, "xelatex")
+        os.utime(str(bin_dir), (0, 0))
+    elif change == "update program":
+        os.utime(str(bin_dir / "pdflatex"), (0, 0))
+    else:
+        config["pdflatex-executable"] = "/opt/texlive/bin/pdflatex"
+
+    checker = TexTextRequirementsChecker(logging.getLogger("TexText"), config)
+    assert not checker.restore_cached_results(cached)
+    assert checker.inkscape_executable is None
+    assert checker.available_tex_to_pdf_converters == {}
+
+
+def test_invalid_cache_requires_new_check():
+    checker = TexTextRequirementsChecker(logging.getLogger("TexText"), {})
+    assert not checker.restore_cached_results(None)
+    assert not checker.restore_cached_results({"fingerprint": None})
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super(RecordingHandler, self).__init__(logging.NOTSET)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+def run_check(parallel):
+    logger = logging.getLogger("TexText.test_requirements_check.%s" % ("parallel" if parallel else "serial"))
+    logger.setLevel(1)
+    logger.propagate = False
+    handler = RecordingHandler()
+    logger.addHandler(handler)
+    try:
+        checker = TexTextRequirementsChecker(logger, {}, first_match=True)
+        value = checker.check(parallel=parallel)
+    finally:
+        logger.removeHandler(handler)
+    return value.value, checker.results(), handler.messages
+
+
+def test_parallel_check_equals_serial_check(bin_dir, monkeypatch):
+    # Detect inkscape via the search path, not via inkex
+    monkeypatch.setitem(sys.modules, "inkex.command", None)
+    with open(make_executable(bin_dir, "inkscape"), "a") as f:
+        f.write("echo 'Inkscape 1.4.2 (ebf0e940d0, 2025-05-08)'\n")
+    for name in ["pdflatex", "xelatex", "pdftoppm"]:
+        make_executable(bin_dir, name)
+
+    serial = run_check(parallel=False)
+    parallel = run_check(parallel=True)
+
+    assert parallel == serial
+    assert serial[1]["available_tex_to_pdf_converters"] == {"pdflatex": str(bin_dir / "pdflatex"),
+                                                            "xelatex": str(bin_dir / "xelatex")}
+    assert serial[1]["available_pdf_to_png_converters"] == {"pdftoppm": str(bin_dir / "pdftoppm")}
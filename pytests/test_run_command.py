@@ -0,0 +1,56 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+from textext.errors import TexTextCommandFailed, TexTextCommandTimeout
+from textext.utility import run_command
+
+
+def test_output_tail_is_kept():
+    result = run_command([sys.executable, "-c", "import sys; sys.stdout.write('x' * 1000000 + 'end')"],
+                         max_output=100)
+    assert result.stdout == b"x" * 97 + b"end"
+    assert result.truncated
+    assert result.elapsed > 0
+
+
+def test_timeout_kills_command():
+    start = time.perf_counter()
+    with pytest.raises(TexTextCommandTimeout):
+        run_command([sys.executable, "-c", "import time; print('started', flush=True); time.sleep(60)"], timeout=1)
+    assert time.perf_counter() - start < 30
+
+
+def test_failed_command():
+    with pytest.raises(TexTextCommandFailed) as error:
+        run_command([sys.executable, "-c", "import sys; sys.stderr.write('oops'); sys.exit(3)"])
+    assert error.value.return_code == 3
+    assert error.value.stderr == b"oops"
+
+
+def test_working_directory(tmp_path):
+    cwd = os.getcwd()
+    result = run_command([sys.executable, "-c", "import os; print(os.getcwd())"], cwd=str(tmp_path))
+    assert os.path.realpath(result.stdout.decode().strip()) == os.path.realpath(str(tmp_path))
+    assert os.getcwd() == cwd
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="resource limits are not supported on Windows")
+def test_cpu_limit_applies_to_started_processes():
+    # The command starts another process which reports its limit
+    child = "import resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0])"
+    command = "import subprocess, sys; subprocess.check_call([sys.executable, '-c', %r])" % child
+    result = run_command([sys.executable, "-c", command], cpu_limit=100)
+    assert result.stdout.strip() == b"100"
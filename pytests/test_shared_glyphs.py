@@ -0,0 +1,61 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import pytest
+
+inkex = pytest.importorskip("inkex")
+
+from textext.base import TexTextElement  # noqa: E402
+
+# Glyph definitions as written by Inkscape (<symbol>), poppler/ cairo (<g>) and dvisvgm (<path>)
+GLYPHS = {
+    "symbol": '<symbol id="glyph0-1"><path style="stroke:none;fill:{color}" d="M 1 1 L 2 2 L 1 2 Z"/></symbol>',
+    "g": '<g id="glyph0-1"><path style="stroke:none;fill:{color}" d="M 1 1 L 2 2 L 1 2 Z"/></g>',
+    "path": '<path id="glyph0-1" fill="{color}" d="M 1 1 L 2 2 L 1 2 Z"/>',
+}
+
+SNIPPET = """<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+     width="10pt" height="10pt" viewBox="0 0 10 10">
+  <defs>{glyph}</defs>
+  <g id="surface1">
+    <use xlink:href="#glyph0-1" x="1" y="2"/>
+    <use xlink:href="#glyph0-1" x="{x}" y="2"/>
+  </g>
+</svg>"""
+
+DOCUMENT = """<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm" viewBox="0 0 100 100">
+  <defs/>
+</svg>"""
+
+
+@pytest.mark.parametrize("glyph_type", sorted(GLYPHS))
+def test_nodes_share_one_glyph_and_keep_their_color(glyph_type):
+    svg = inkex.load_svg(DOCUMENT).getroot()
+    colors = ["#ff0000", "#0000ff"]
+    nodes = []
+    for x, color in zip([3, 4], colors):
+        content = SNIPPET.format(glyph=GLYPHS[glyph_type].format(color=color), x=x).encode("utf-8")
+        node = TexTextElement(content, svg.unit, keep_glyphs=True)
+        svg.append(node)
+        node.share_glyphs(svg)
+        nodes.append(node)
+
+    shared = [el for el in svg.defs if el.get("id", "").startswith(TexTextElement.SHARED_GLYPH_PREFIX)]
+    assert len(shared) == 1
+    assert shared[0].get("style") is None and shared[0].get("fill") is None
+
+    for node, color in zip(nodes, colors):
+        uses = [el for el in node.iter() if isinstance(el, inkex.Use)]
+        assert len(uses) == 2
+        for use in uses:
+            assert use.get("xlink:href") == "#" + shared[0].get("id")
+            assert inkex.Style(use.get("style"))["fill"] == color
+        # The glyph definitions of the node have been removed
+        assert not [el for el in node.iter() if el.get("d") is not None]
@@ -0,0 +1,54 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import pytest
+
+from textext.svg_tools import XLINK_HREF, content_id_prefix, rename_ids
+
+etree = pytest.importorskip("lxml.etree")
+
+SNIPPET = b"""<g xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" id="node">
+  <defs>
+    <path id="glyph0-1" d="M 0 0 L 1 1 Z"/>
+    <clipPath id="clip1"><path d="M 0 0 L 10 0 L 10 10 Z"/></clipPath>
+    <linearGradient id="gradient1"/>
+    <mask id="mask1"/>
+  </defs>
+  <g id="surface1" clip-path="url(#clip1)" style="fill:url(#gradient1);mask:url( #mask1 )">
+    <use xlink:href="#glyph0-1" x="1" y="2"/>
+    <use href="#glyph0-1" fill="url(#gradient1)"/>
+    <use xlink:href="#elsewhere" style="fill:url(#other)"/>
+  </g>
+</g>"""
+
+
+def test_rename_ids_updates_references():
+    root = etree.fromstring(SNIPPET)
+    rename_map = rename_ids(root, "p-")
+    assert rename_map == {"glyph0-1": "p-0", "clip1": "p-1", "gradient1": "p-2", "mask1": "p-3", "surface1": "p-4"}
+    assert root.get("id") == "node"
+
+    surface = root.find("{http://www.w3.org/2000/svg}g")
+    assert surface.get("clip-path") == "url(#p-1)"
+    assert surface.get("style") == "fill:url(#p-2);mask:url(#p-3)"
+
+    use_xlink, use_href, use_external = surface
+    assert use_xlink.get(XLINK_HREF) == "#p-0"
+    assert use_href.get("href") == "#p-0"
+    assert use_href.get("fill") == "url(#p-2)"
+    # References to ids not defined in the snippet are kept
+    assert use_external.get(XLINK_HREF) == "#elsewhere"
+    assert use_external.get("style") == "fill:url(#other)"
+
+
+def test_content_id_prefix_is_deterministic():
+    assert content_id_prefix(SNIPPET) == content_id_prefix(SNIPPET)
+    assert content_id_prefix(SNIPPET) != content_id_prefix(SNIPPET + b" ")
+    assert content_id_prefix(SNIPPET, 2) == content_id_prefix(SNIPPET) + "2-"
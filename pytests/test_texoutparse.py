@@ -0,0 +1,103 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+"""
+import pytest
+
+from textext.texoutparse import LatexLogParser
+
+LOG = """This is pdfTeX, Version 3.141592653-2.6-1.40.25 (TeX Live 2023) (preloaded format=pdflatex)
+LaTeX Warning: Citation `knuth' on page 1 undefined on input line 7.
+Overfull \\hbox (12.5pt too wide) in paragraph at lines 8--9
+Package hyperref Warning: Token not allowed in a PDF string (Unicode):
+! Undefined control sequence.
+l.10 \\foo
+Underfull \\hbox (badness 10000) detected at line 11
+! LaTeX Error: Environment bar undefined.
+
+See the LaTeX manual or LaTeX Companion for explanation.
+Type  H <return>  for immediate help.
+ ...
+l.12 \\begin{bar}
+LaTeX Warning: Reference `fig' on page 1 undefined on input line 13.
+"""
+
+
+class CountingLines(object):
+    """ Iterable over the lines of a string which counts the lines read """
+
+    def __init__(self, text):
+        self.lines = text.splitlines(True)
+        self.read = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+
+def test_process_collects_all_messages():
+    parser = LatexLogParser()
+    parser.process(LOG.splitlines(True))
+    assert [e["message"] for e in parser.errors] == ["Undefined control sequence.",
+                                                     "Environment bar undefined."]
+    assert [e["line"] for e in parser.errors] == [10, 12]
+    assert [w["package"] for w in parser.warnings] == ["hyperref"]
+    assert [b["type"] for b in parser.badboxes] == ["Over", "Under"]
+    assert [r["key"] for r in parser.missing_refs] == ["knuth", "fig"]
+
+
+def test_iter_messages_yields_same_messages_as_process():
+    parser = LatexLogParser()
+    messages = list(parser.iter_messages(LOG.splitlines(True)))
+    assert [m.category for m in messages] == ["missing_ref", "badbox", "warning", "error", "badbox",
+                                              "error", "missing_ref"]
+    assert len(messages) == len(parser.errors + parser.warnings + parser.badboxes + parser.missing_refs)
+
+
+def test_stop_after_first_error():
+    lines = CountingLines(LOG)
+    parser = LatexLogParser()
+    errors = list(parser.iter_messages(lines, stop_after_first_error=True, categories=[parser.ERROR]))
+    assert len(errors) == 1
+    assert errors[0]["message"] == "Undefined control sequence."
+    assert errors[0]["line"] == 10
+    assert lines.read < len(lines.lines)
+    assert parser.warnings == [] and parser.badboxes == [] and parser.missing_refs == []
+
+
+def test_category_filter():
+    parser = LatexLogParser()
+    warnings = list(parser.iter_messages(LOG.splitlines(True), categories=[parser.WARNING]))
+    # Missing references are not reported as ordinary warnings
+    assert [w.category for w in warnings] == ["warning"]
+    with pytest.raises(ValueError):
+        list(parser.iter_messages(LOG.splitlines(True), categories=["info"]))
+
+
+def test_file_messages_match_line_messages(tmp_path):
+    log_file = tmp_path / "document.log"
+    log_file.write_bytes(LOG.replace("\n", "\r\n").encode("utf8"))
+    file_parser = LatexLogParser()
+    file_messages = list(file_parser.iter_file_messages(str(log_file)))
+    messages = list(LatexLogParser().iter_messages(LOG.splitlines(True)))
+    assert [(m.category, m.info, m.context_lines) for m in file_messages] == \
+           [(m.category, m.info, m.context_lines) for m in messages]
+    assert len(file_parser.errors) == 2
+
+
+def test_file_messages_join_wrapped_lines(tmp_path):
+    # TeX wraps lines after 79 characters
+    message = "Package foo Warning: " + "x" * 60 + " continued after the wrap"
+    log_file = tmp_path / "document.log"
+    log_file.write_bytes("{}\n{}\n! Bar.\nl.3 \\bar\n".format(message[:79], message[79:]).encode("utf8"))
+    parser = LatexLogParser()
+    warning, error = parser.iter_file_messages(str(log_file))
+    assert warning["message"] == message[len("Package foo Warning: "):]
+    assert error["line"] == 3
@@ -17,22 +17,34 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from textext.base import *
 import traceback
 
+startup_profiler.mark("import textext.base")
+
 if __name__ == "__main__":
     try:
 
         effect = TexText()
+        startup_profiler.mark("argument parser")
         effect.run()
+        startup_profiler.mark("run effect")
         effect.cache["previous_exit_code"] = EXIT_CODE_OK
         effect.cache.save()
+        startup_profiler.report(logger)
+        if startup_profiler.enabled:
+            flush_deferred_log()
+        stop_file_logging()
 
     except TexTextInternalError as e:
         # TexTextInternalError should never be raised.
         # It's TexText logic error and should be reported.
         logger.error(str(e))
         logger.error(traceback.format_exc())
+        log_system_information()
+        startup_profiler.report(logger)
         logger.info("TexText finished with error, please run extension again")
         logger.info("If problem persists, please file a bug "
                     "https://github.com/textext/textext/issues/new?template=bug_report.md")
+        flush_deferred_log()
+        stop_file_logging()
         user_log_channel.show_messages()
         try:
             cache = Cache()
@@ -43,6 +55,10 @@ if __name__ == "__main__":
         exit(EXIT_CODE_UNEXPECTED_ERROR)  # TexText internal error
     except TexTextFatalError as e:
         logger.error(str(e))
+        log_system_information()
+        startup_profiler.report(logger)
+        flush_deferred_log()
+        stop_file_logging()
         user_log_channel.show_messages()
         try:
             cache = Cache()
@@ -56,9 +72,13 @@ if __name__ == "__main__":
         # If any propagates here it's TexText logic error and should be reported.
         logger.error(str(e))
         logger.error(traceback.format_exc())
+        log_system_information()
+        startup_profiler.report(logger)
         logger.info("TexText finished with error, please run extension again")
         logger.info("If problem persists, please file a bug "
                     "https://github.com/textext/textext/issues/new?template=bug_report.md")
+        flush_deferred_log()
+        stop_file_logging()
         user_log_channel.show_messages()
         try:
             cache = Cache()
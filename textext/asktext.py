@@ -37,71 +37,87 @@ TOOLKIT = None
 
 import os
 import sys
+import threading
 import warnings
-from .errors import TexTextCommandFailed
-from textext.utility import SuppressStream
+from .errors import TexTextCancelledError, TexTextCommandFailed, TexTextConversionError
+from textext.utility import CancelToken, SuppressStream, cancel_scope
 
 # unfortunately, with Inkscape being 32bit on OSX, I couldn't get GTKSourceView to work, yet
 
-# Try GTK first
-#   If successful, try GTKSourceView (bonus points!)
-#   If unsuccessful, try TK (first for Python 3, then for Python 2)
-#   When not even TK could be imported, abort with error message
-try:
-    import gi
-    gi.require_version("Gtk", "3.0")
-
-    # The import statement
-    # from gi.repository import Gtk
-    # writes a warning into stderr under Python 3.10 which always pops up after the
-    # extensions has been executed:
-    # "DynamicImporter.exec_module() not found; falling back to load_module()"
-    # We redirect stderr here into a string, check if
-    # this warning has been writen and silently discard it. If something else has
-    # been written to stderr we pass it to stderr.
-    # Related issues:
-    # https://gitlab.com/inkscape/extensions/-/issues/463
-    # ToDo: Remove the stuff around the import statement when this has been fixed in
-    #       updated Python 3.10 releases or is properly handled by Inkscape
-    # ======
-    from contextlib import redirect_stderr
-    import io
-    with redirect_stderr(io.StringIO()) as h:
-        from gi.repository import Gtk
-
-    # Sort out messages matching the ImportWarning, keep all others and send them to stderr
-    for msg in (val for val in h.getvalue().splitlines(keepends=True)
-                    if val and val.find("ImportWarning: DynamicImporter") == -1):
-        sys.stderr.write(msg)
-    # ======
-
-    from gi.repository import Gdk, GdkPixbuf
+def _load_toolkit():
+    """
+    Imports the GUI toolkit on first use, so runs without dialog (e.g. --text or recompiling
+    nodes) do not pay for it. The toolkit modules are bound to the module globals used by
+    the AskText classes.
+
+    Try GTK first
+      If successful, try GTKSourceView (bonus points!)
+      If unsuccessful, try TK (first for Python 3, then for Python 2)
+      When not even TK could be imported, abort with error message
+
+    :return: The loaded toolkit (GTKSOURCEVIEW, GTK or TK)
+    """
+    global TOOLKIT, gi, Gtk, Gdk, GdkPixbuf, GLib, GtkSource, Tk, TkMsgBoxes, TkFileDialogs
+    if TOOLKIT is not None:
+        return TOOLKIT
 
     try:
+        import gi
+        gi.require_version("Gtk", "3.0")
+
+        # The import statement
+        # from gi.repository import Gtk
+        # writes a warning into stderr under Python 3.10 which always pops up after the
+        # extensions has been executed:
+        # "DynamicImporter.exec_module() not found; falling back to load_module()"
+        # We redirect stderr here into a string, check if
+        # this warning has been writen and silently discard it. If something else has
+        # been written to stderr we pass it to stderr.
+        # Related issues:
+        # https://gitlab.com/inkscape/extensions/-/issues/463
+        # ToDo: Remove the stuff around the import statement when this has been fixed in
+        #       updated Python 3.10 releases or is properly handled by Inkscape
+        # ======
+        from contextlib import redirect_stderr
+        import io
+        with redirect_stderr(io.StringIO()) as h:
+            from gi.repository import Gtk
+
+        # Sort out messages matching the ImportWarning, keep all others and send them to stderr
+        for msg in (val for val in h.getvalue().splitlines(keepends=True)
+                        if val and val.find("ImportWarning: DynamicImporter") == -1):
+            sys.stderr.write(msg)
+        # ======
+
+        from gi.repository import Gdk, GdkPixbuf, GLib
+
+        try:
 
-        gi.require_version('GtkSource', '3.0')
-        from gi.repository import GtkSource
+            gi.require_version('GtkSource', '3.0')
+            from gi.repository import GtkSource
+
+            TOOLKIT = GTKSOURCEVIEW
+        except (ImportError, TypeError, ValueError) as _:
+            TOOLKIT = GTK
 
-        TOOLKIT = GTKSOURCEVIEW
     except (ImportError, TypeError, ValueError) as _:
-        TOOLKIT = GTK
+        try:
+            if sys.version_info[0] == 3: # TK for Python 3 (if this fails, try Python 2 below)
+                import tkinter as Tk
+                from tkinter import messagebox as TkMsgBoxes
+                from tkinter import filedialog as TkFileDialogs
+            else: # TK for Python 2
+                import Tkinter as Tk
+                import tkMessageBox as TkMsgBoxes
+                import tkFileDialog as TkFileDialogs
+            TOOLKIT = TK
 
-except (ImportError, TypeError, ValueError) as _:
-    try:
-        if sys.version_info[0] == 3: # TK for Python 3 (if this fails, try Python 2 below)
-            import tkinter as Tk
-            from tkinter import messagebox as TkMsgBoxes
-            from tkinter import filedialog as TkFileDialogs
-        else: # TK for Python 2
-            import Tkinter as Tk
-            import tkMessageBox as TkMsgBoxes
-            import tkFileDialog as TkFileDialogs
-        TOOLKIT = TK
+        except ImportError:
+            raise RuntimeError("\nNeither GTK nor TKinter is available!\nMake sure that at least one of these "
+                               "bindings for the graphical user interface of TexText is installed! Refer to the "
+                               "installation instructions on https://textext.github.io/textext/ !")
 
-    except ImportError:
-        raise RuntimeError("\nNeither GTK nor TKinter is available!\nMake sure that at least one of these "
-                           "bindings for the graphical user interface of TexText is installed! Refer to the "
-                           "installation instructions on https://textext.github.io/textext/ !")
+    return TOOLKIT
 
 
 def set_monospace_font(text_view, font_size):
@@ -119,6 +135,111 @@ def set_monospace_font(text_view, font_size):
         pass
 
 
+class PreviewWorker(object):
+    """
+    Runs the preview callback in a background thread so the GUI does not freeze while
+    the snippet is compiled.
+
+    Only the latest request matters: A new request cancels the running one (its LaTeX
+    process is killed, see CancelToken) and replaces a request which has not been started
+    yet. Results and errors are passed to the GUI thread via `dispatch` (e.g. GLib.idle_add)
+    and are dropped if the request has been cancelled or the worker stopped meanwhile.
+    """
+
+    # Seconds stop() waits for the worker thread, a preview callback which does not react
+    # on cancellation must not block closing the dialog
+    STOP_TIMEOUT = 2.0
+
+    def __init__(self, preview_callback, load_image, on_image, on_error, dispatch):
+        """
+        :param preview_callback: The preview callback given to AskText.ask
+        :param load_image: Called in the worker thread with the path of the preview image, its
+                           return value is passed to on_image (the image file is deleted afterwards)
+        :param on_image: Called in the GUI thread with the loaded image
+        :param on_error: Called in the GUI thread with the exception raised by preview_callback
+        :param dispatch: Function executing a callable with arguments in the GUI thread
+        """
+        self._preview_callback = preview_callback
+        self._load_image = load_image
+        self._on_image = on_image
+        self._on_error = on_error
+        self._dispatch = dispatch
+
+        self._condition = threading.Condition()
+        self._request = None  # (args, token) waiting to be processed
+        self._token = None  # token of the running request
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="TexText preview")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, text, preamble, tex_command, white_bg, max_size=None):
+        """ Schedules a new preview, cancels the running one """
+        with self._condition:
+            self._cancel_locked()
+            self._request = ((text, preamble, tex_command, white_bg, max_size), CancelToken())
+            self._condition.notify()
+
+    def cancel(self):
+        """ Cancels the running and the pending request """
+        with self._condition:
+            self._cancel_locked()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Cancels all requests and waits for the worker thread to finish
+
+        :param timeout: Seconds to wait for the thread, None waits until it has finished
+        :return: True if the thread has finished. Otherwise it is left behind as daemon
+                 thread, its results are dropped.
+        """
+        with self._condition:
+            self._cancel_locked()
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _cancel_locked(self):
+        if self._request is not None:
+            self._request[1].cancel()
+            self._request = None
+        if self._token is not None:
+            self._token.cancel()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                (text, preamble, tex_command, white_bg, max_size), token = self._request
+                self._request = None
+                self._token = token
+
+            images = []
+            try:
+                with cancel_scope(token):
+                    self._preview_callback(text, preamble, lambda path: images.append(self._load_image(path)),
+                                           tex_command, white_bg, max_size)
+                if images and not token.cancelled:
+                    self._dispatch(self._deliver, token, self._on_image, images[-1])
+            except TexTextCancelledError:
+                pass
+            except Exception as error:
+                if not token.cancelled:
+                    self._dispatch(self._deliver, token, self._on_error, error)
+            finally:
+                with self._condition:
+                    self._token = None
+
+    def _deliver(self, token, callback, value):
+        if not token.cancelled and not self._stopped:
+            callback(value)
+        return False  # run only once when dispatched via GLib.idle_add
+
+
 class AskText(object):
     """GUI for editing TexText objects"""
 
@@ -135,6 +256,10 @@ class AskText(object):
     DEFAULT_CLOSE_SHORTCUT = "Escape"
     DEFAULT_CONFIRM_CLOSE = True
     DEFAULT_PREVIEW_WHITE_BACKGROUND = False
+    DEFAULT_AUTO_PREVIEW = False
+    AUTO_PREVIEW_DELAY = 700  # ms without changes in the editor before the preview is updated
+    MAX_PREVIEW_HEIGHT = 150
+    ERROR_LINE_BACKGROUND = "rgba(255, 0, 0, 0.2)"  # lines of the snippet LaTeX reported errors for
     FONT_SIZE = [11, 12, 14, 16]
     NEW_NODE_CONTENT = ["Empty", "InlineMath", "DisplayMath"]
     CLOSE_SHORTCUT = ["Escape", "CtrlQ", "None"]
@@ -503,6 +628,9 @@ class AskTextTK(AskText):
 
         add_textview(message_text, str(exception))
 
+        if isinstance(exception, TexTextConversionError) and exception.diagnostics:
+            add_textview('Messages:', str(exception.diagnostics))
+
         if isinstance(exception, TexTextCommandFailed):
             if exception.stdout:
                 add_textview('Stdout:', exception.stdout.decode('utf-8'))
@@ -530,6 +658,11 @@ class AskTextGTKSource(AskText):
         self._preview_callback = None
         self._source_view = None
         self._preamble_delete_btn = None
+        self._preview_worker = None  # type: PreviewWorker
+        self._preview_fitted = False  # preview has been rendered to fit into the preview area
+        self._working_directory = os.getcwd()
+        self._auto_preview_source = None
+        self._error_line_tag = None  # type: Gtk.TextTag
 
         self.buffer_actions = [
             ('Open', Gtk.STOCK_OPEN, '_Open', '<control>O', 'Open a file', self.open_file_cb)
@@ -583,6 +716,11 @@ class AskTextGTKSource(AskText):
              'Set preview background to white', self.on_preview_background_chagned)
         ]
 
+        self._auto_preview_action = [
+            ('AutoPreview', None, '_Automatic preview', None,
+             'Update the preview automatically while typing', self.auto_preview_toggled_cb)
+        ]
+
         self._confirm_close_action = [
             ('ConfirmClose', None, '_Confirm Closing of Window', None,
              'Request confirmation for closing the window when text has been changed', self.confirm_close_toggled_cb)
@@ -631,6 +769,7 @@ class AskTextGTKSource(AskText):
               <menuitem action='WordWrap'/>
               {additions}
               <menuitem action='WhitePreviewBackground'/>
+              <menuitem action='AutoPreview'/>
             </menu>
             <menu action='SettingsMenu'>
               <menu action='NewNodeContent'>
@@ -746,6 +885,9 @@ class AskTextGTKSource(AskText):
     def on_preview_background_chagned(self, action, sourceview):
         self._gui_config["white_preview_background"] = action.get_active()
 
+    def auto_preview_toggled_cb(self, action, sourceview):
+        self._gui_config["auto_preview"] = action.get_active()
+
     def tabs_toggled_cb(self, action, previous_value, sourceview):
         sourceview.set_tab_width(action.get_current_value())
         self._gui_config["tab_width"] = action.get_current_value()
@@ -796,6 +938,8 @@ class AskTextGTKSource(AskText):
         return False
 
     def cb_ok(self, widget=None, data=None):
+        self.stop_preview_worker()
+
         text_buffer = self._source_buffer
         self.text = text_buffer.get_text(text_buffer.get_start_iter(),
                                          text_buffer.get_end_iter(), True)
@@ -809,11 +953,13 @@ class AskTextGTKSource(AskText):
 
         self.global_scale_factor = self._scale_adj.get_value()
 
+        self.clear_error_lines()
         try:
             self.callback(self.text, self.preamble_file, self.global_scale_factor,
                           self.ALIGNMENT_LABELS[self._alignment_combobox.get_active()],
                           self.TEX_COMMANDS[self._texcmd_cbox.get_active()].lower())
         except Exception as error:
+            self.mark_error_lines(error)
             self.show_error_dialog("TexText Error",
                                    "Error occurred while converting text from Latex to SVG:",
                                    error)
@@ -837,7 +983,8 @@ class AskTextGTKSource(AskText):
             preamble_file_str = self.typst_default_preamble_file
 
         if hasattr(Gtk, 'FileChooserButton'):
-            file_path = os.path.abspath(preamble_file_str)
+            # Relative to the directory TexText has been started in
+            file_path = os.path.join(self._working_directory, preamble_file_str)
             self._preamble_widget.set_filename(file_path)
         else:
             self._preamble_widget.set_text(preamble_file_str)
@@ -869,8 +1016,12 @@ class AskTextGTKSource(AskText):
         return False
 
     def update_preview(self, widget):
-        """Update the preview image of the GUI using the callback it gave """
+        """
+        Update the preview image of the GUI using the callback it gave. The preview is
+        generated in a background thread, a preview still being generated is cancelled.
+        """
         if self._preview_callback:
+            self.clear_error_lines()
             text = self._source_buffer.get_text(self._source_buffer.get_start_iter(),
                                                 self._source_buffer.get_end_iter(), True)
 
@@ -881,23 +1032,86 @@ class AskTextGTKSource(AskText):
             else:
                 preamble = self._preamble_widget.get_text()
 
-            try:
-                self._preview_callback(text, preamble, self.set_preview_image_from_file,
-                                       self.TEX_COMMANDS[self._texcmd_cbox.get_active()].lower(),
-                                       self._gui_config.get("white_preview_background", self.DEFAULT_PREVIEW_WHITE_BACKGROUND))
-            except Exception as error:
-                self.show_error_dialog("TexText Error",
-                                       "Error occurred while generating preview:",
-                                        error)
-                return False
-
-    def set_preview_image_from_file(self, path):
+            if self._preview_worker is None:
+                self._preview_worker = PreviewWorker(self._preview_callback,
+                                                     GdkPixbuf.Pixbuf.new_from_file,
+                                                     self.set_preview_image,
+                                                     self.show_preview_error,
+                                                     GLib.idle_add)
+
+            # In scaled mode the resolution of the preview is chosen so that it fits into the
+            # preview area, in scroll mode it is rendered in original size
+            max_size = None
+            if self.preview_representation == "SCALE":
+                max_size = (self._source_view.get_allocation().width, self.MAX_PREVIEW_HEIGHT)
+            self._preview_fitted = max_size is not None
+
+            self._preview_worker.request(text, preamble,
+                                         self.TEX_COMMANDS[self._texcmd_cbox.get_active()].lower(),
+                                         self._gui_config.get("white_preview_background",
+                                                              self.DEFAULT_PREVIEW_WHITE_BACKGROUND),
+                                         max_size)
+
+    def show_preview_error(self, error):
+        self.mark_error_lines(error)
+        self.show_error_dialog("TexText Error",
+                               "Error occurred while generating preview:",
+                               error)
+
+    def mark_error_lines(self, error):
+        """
+        Highlights the lines of the snippet LaTeX reported errors for and scrolls to the first one
+        """
+        self.clear_error_lines()
+        diagnostics = getattr(error, "diagnostics", None)
+        if not diagnostics:
+            return
+        lines = diagnostics.error_lines()
+        for line in lines:
+            start = self._source_buffer.get_iter_at_line(line - 1)
+            end = start.copy()
+            if not end.ends_line():
+                end.forward_to_line_end()
+            self._source_buffer.apply_tag(self._error_line_tag, start, end)
+        if lines:
+            self._source_view.scroll_to_iter(self._source_buffer.get_iter_at_line(lines[0] - 1),
+                                             0.1, False, 0.0, 0.0)
+
+    def clear_error_lines(self):
+        self._source_buffer.remove_tag(self._error_line_tag, self._source_buffer.get_start_iter(),
+                                       self._source_buffer.get_end_iter())
+
+    def text_changed_cb(self, text_buffer):
+        """ Cancels outdated previews and schedules an automatic preview if requested """
+        if self._preview_worker is not None:
+            self._preview_worker.cancel()
+
+        if self._auto_preview_source is not None:
+            GLib.source_remove(self._auto_preview_source)
+            self._auto_preview_source = None
+
+        if self._gui_config.get("auto_preview", self.DEFAULT_AUTO_PREVIEW):
+            self._auto_preview_source = GLib.timeout_add(self.AUTO_PREVIEW_DELAY, self.auto_preview_cb)
+
+    def auto_preview_cb(self):
+        self._auto_preview_source = None
+        self.update_preview(None)
+        return False  # do not repeat
+
+    def stop_preview_worker(self):
+        if self._auto_preview_source is not None:
+            GLib.source_remove(self._auto_preview_source)
+            self._auto_preview_source = None
+        if self._preview_worker is not None:
+            self._preview_worker.stop()
+            self._preview_worker = None
+
+    def set_preview_image(self, pixbuf):
         """
         Set the preview image in the GUI, scaled to the text view's width
-        :param path: the path of the image
+        :param (GdkPixbuf.Pixbuf) pixbuf: the image
         """
-
-        self._pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+        self._pixbuf = pixbuf
         self._preview_scroll_window.set_has_tooltip(False)
         self.update_preview_representation()
 
@@ -907,6 +1121,10 @@ class AskTextGTKSource(AskText):
                 if self.preview_representation == "SCALE":
                     if self._preview_scroll_window.get_has_tooltip():
                         self.preview_representation = "SCROLL"
+                        if self._preview_fitted:
+                            # Render again in original size
+                            self.update_preview(None)
+                            return
                 else:
                     if self._preview_scroll_window.get_has_tooltip():
                         self.preview_representation = "SCALE"
@@ -914,7 +1132,7 @@ class AskTextGTKSource(AskText):
 
     def update_preview_representation(self):
 
-        max_preview_height = 150
+        max_preview_height = self.MAX_PREVIEW_HEIGHT
 
         textview_width = self._source_view.get_allocation().width
         image_width = self._pixbuf.get_width()
@@ -933,6 +1151,8 @@ class AskTextGTKSource(AskText):
                 pixbuf = self._pixbuf.scale_simple(int(image_width * scale), int(image_height * scale),
                                                                               GdkPixbuf.InterpType.BILINEAR)
                 self._preview_scroll_window.set_tooltip_text("Double click: scale to original size")
+            elif self._preview_fitted:
+                self._preview_scroll_window.set_tooltip_text("Double click: show in original size")
 
             self._preview.set_from_pixbuf(pixbuf)
             self._preview.set_size_request(pixbuf.get_width(), pixbuf.get_height())
@@ -1009,7 +1229,7 @@ class AskTextGTKSource(AskText):
 
     def set_preamble(self):
         if hasattr(Gtk, 'FileChooserButton'):
-            file_path = os.path.abspath(self.preamble_file)
+            file_path = os.path.join(self._working_directory, self.preamble_file)
             self._preamble_widget.set_filename(file_path)
         else:
             self._preamble_widget.set_text(self._preamble_widget.set_filename(self.preamble_file))
@@ -1167,6 +1387,8 @@ class AskTextGTKSource(AskText):
         self._source_buffer = text_buffer
         self._source_view = source_view
         self._source_buffer.set_text(self.text)
+        self._error_line_tag = text_buffer.create_tag("textext-error-line",
+                                                      paragraph_background=self.ERROR_LINE_BACKGROUND)
         self._source_view.set_size_request(-1, 150)
 
         scroll_window.add(self._source_view)
@@ -1187,6 +1409,7 @@ class AskTextGTKSource(AskText):
         action_group.add_toggle_actions(self._confirm_close_action, source_view)
         action_group.add_toggle_actions(self._word_wrap_action, source_view)
         action_group.add_toggle_actions(self._preview_white_background_action, source_view)
+        action_group.add_toggle_actions(self._auto_preview_action, source_view)
         if TOOLKIT == GTKSOURCEVIEW:
             action_group.add_toggle_actions(self._toggle_actions, source_view)
             action_group.add_radio_actions(self._radio_actions, -1, self.tabs_toggled_cb, source_view)
@@ -1265,6 +1488,8 @@ class AskTextGTKSource(AskText):
         action.set_active(self._gui_config.get("confirm_close", self.DEFAULT_CONFIRM_CLOSE))
         action = action_group.get_action('WhitePreviewBackground')
         action.set_active(self._gui_config.get("white_preview_background", self.DEFAULT_PREVIEW_WHITE_BACKGROUND))
+        action = action_group.get_action('AutoPreview')
+        action.set_active(self._gui_config.get("auto_preview", self.DEFAULT_AUTO_PREVIEW))
         if TOOLKIT == GTKSOURCEVIEW:
             action = action_group.get_action('ShowNumbers')
             action.set_active(self._gui_config.get("line_numbers", self.DEFAULT_SHOWLINENUMBERS))
@@ -1294,6 +1519,7 @@ class AskTextGTKSource(AskText):
         # Connect event callbacks
         window.connect("key-press-event", self.cb_key_press)
         text_buffer.connect('changed', self.update_position_label, self, source_view)
+        text_buffer.connect('changed', self.text_changed_cb)
         window.connect('delete-event', self.window_deleted_cb, source_view)
         text_buffer.connect('mark_set', self.move_cursor_cb, source_view)
 
@@ -1327,6 +1553,7 @@ class AskTextGTKSource(AskText):
 
             # main loop
             Gtk.main()
+            self.stop_preview_worker()
             return self._gui_config
 
     def show_error_dialog(self, title, message_text, exception):
@@ -1387,6 +1614,8 @@ class AskTextGTKSource(AskText):
         add_section(None, str(exception))
         dialog.vbox.pack_start(raw_output_box, expand=False, fill=True, padding=5)
 
+        if isinstance(exception, TexTextConversionError) and exception.diagnostics:
+            add_section("Messages: <small><i>(click to expand)</i></small>", str(exception.diagnostics))
         if isinstance(exception, TexTextCommandFailed):
             if exception.stdout:
                 add_section("Stdout: <small><i>(click to expand)</i></small>", exception.stdout.decode('utf-8'))
@@ -1396,7 +1625,12 @@ class AskTextGTKSource(AskText):
         dialog.run()
 
 
-if TOOLKIT == TK:
-    AskTextDefault = AskTextTK
-elif TOOLKIT in (GTK, GTKSOURCEVIEW):
-    AskTextDefault = AskTextGTKSource
+def AskTextDefault(*args, **kwargs):
+    """
+    Creates the dialog of the available GUI toolkit, the toolkit is imported on the first call
+
+    :return: AskTextTK or AskTextGTKSource instance, arguments as for AskText
+    """
+    if _load_toolkit() == TK:
+        return AskTextTK(*args, **kwargs)
+    return AskTextGTKSource(*args, **kwargs)
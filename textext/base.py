@@ -9,20 +9,29 @@ file LICENSE.txt or go to https://github.com/textext/textext
 for full license details.
 """
 from __future__ import print_function
+import atexit
+import bisect
+import collections
+import concurrent.futures
 import hashlib
 import logging
 import logging.handlers
 import math
+import queue
 import re
 import os
 import platform
 import sys
-import uuid
 from io import open # ToDo: For open utf8, remove when Python 2 support is skipped
 
 from .requirements_check import defaults, set_logging_levels, TexTextRequirementsChecker
-from .utility import ChangeToTemporaryDirectory, CycleBufferHandler, MyLogger, NestedLoggingGuard, Settings, Cache, \
-    exec_command, version_greater_or_equal_than
+from .utility import ChangeToTemporaryDirectory, CycleBufferHandler, LocalQueueHandler, MyLogger, \
+    NestedLoggingGuard, Settings, Cache, TemporaryDirectory, exec_command, run_command, startup_profiler, version_greater_or_equal_than
+from .render_cache import RenderCache, file_content, file_fingerprint
+from .inkscape_shell import InkscapeShell
+from .preview_rasterizer import find_rasterizer
+from .svg_tools import content_id_prefix, rename_ids
+from .metrics import Metrics
 from .errors import *
 
 with open(os.path.join(os.path.dirname(__file__), "VERSION")) as version_file:
@@ -65,7 +74,109 @@ file_log_channel = logging.handlers.RotatingFileHandler(LOG_FILENAME,
                                                         )
 file_log_channel.setLevel(logging.NOTSET)
 file_log_channel.setFormatter(log_formatter)
-__logger.addHandler(file_log_channel)
+
+# The log file is written by a background thread so logging does not block compilations
+# and the GUI. stop_file_logging() must be called before exiting to write pending records.
+file_log_queue = queue.Queue()
+file_log_writer = LocalQueueHandler(file_log_queue)
+file_log_listener = logging.handlers.QueueListener(file_log_queue, file_log_channel, respect_handler_level=True)
+file_log_listener.start()
+__logger.addHandler(file_log_writer)
+_file_log_listener_running = True
+
+# After successful runs the log records are kept in memory without formatting them and are
+# written into the log file only if the run fails, see defer_file_logging()
+deferred_log_channel = CycleBufferHandler(capacity=10000)
+deferred_log_channel.setLevel(logging.DEBUG)
+
+
+def _file_log_handler():
+    """ :return: The handler records for the log file are passed to """
+    return file_log_writer if _file_log_listener_running else file_log_channel
+
+
+def defer_file_logging():
+    """ Keeps the log records in deferred_log_channel instead of writing them into the log file """
+    __logger.removeHandler(_file_log_handler())
+    __logger.addHandler(deferred_log_channel)
+
+
+def file_logging_deferred():
+    return deferred_log_channel in __logger.handlers
+
+
+def flush_deferred_log():
+    """ Writes the records kept by defer_file_logging() into the log file """
+    if file_logging_deferred():
+        deferred_log_channel.flush_to(_file_log_handler())
+
+
+def take_deferred_records():
+    """
+    Removes the records kept by defer_file_logging() and returns them with their messages
+    formatted, so they can be passed from a worker process to the main process
+    (see handle_worker_records)
+    """
+    records = deferred_log_channel.take_records()
+    for record in records:
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+    return records
+
+
+def handle_worker_records(records):
+    """ Passes the records of a worker process (see take_deferred_records) to the handlers """
+    for record in records:
+        if __logger.isEnabledFor(record.levelno):
+            __logger.handle(record)
+
+
+def init_worker_process(disabled_level):
+    """
+    Initializer of the worker processes of TexText.compile_snippets: Workers do not write into
+    the log file since they would race on its rotation. Their records are kept in memory and
+    passed to the main process with the results (see compile_snippet_batch_in_worker).
+
+    :param disabled_level: The level logging is disabled for in the main process (logging.disable)
+    """
+    global _file_log_listener_running
+    logging.disable(disabled_level)
+    if _file_log_listener_running:
+        # Worker processes which are not forked import this module again
+        file_log_listener.stop()
+        _file_log_listener_running = False
+    __logger.removeHandler(file_log_writer)
+    __logger.removeHandler(file_log_channel)
+    if not file_logging_deferred():
+        __logger.addHandler(deferred_log_channel)
+    deferred_log_channel.take_records()  # records inherited from the main process (fork)
+
+
+def _write_log_file_directly():
+    """ Lets records for the log file bypass the background thread from now on """
+    global _file_log_listener_running
+    if file_log_writer in __logger.handlers:
+        __logger.removeHandler(file_log_writer)
+        __logger.addHandler(file_log_channel)
+    _file_log_listener_running = False
+
+
+def stop_file_logging():
+    """ Writes all queued records into the log file and stops the background thread """
+    if _file_log_listener_running:
+        file_log_listener.stop()
+        _write_log_file_directly()
+
+
+atexit.register(stop_file_logging)
+
+# Forked worker processes (see TexText.compile_snippets) do not inherit the background thread
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_write_log_file_directly)
+
+# Durations of the conversion stages, recorded if enabled in the config (see textext/metrics.py)
+metrics = Metrics(os.path.join(LOG_LOCATION, "metrics.jsonl"))
 
 import inkex
 import inkex.command as ixc
@@ -84,6 +195,31 @@ NSS = {
 }
 
 
+_system_information_logged = False
+
+
+def log_system_information():
+    """ Logs the version of TexText and information about the system, only once per process """
+    global _system_information_logged
+    if _system_information_logged:
+        return
+    _system_information_logged = True
+
+    with open(__file__, "rb") as fhl:
+        logger.debug("TexText version = %r (md5sum = %s)", __version__, hashlib.md5(fhl.read()).hexdigest())
+    logger.debug("platform.system() = %r", platform.system())
+    logger.debug("platform.release() = %r", platform.release())
+    logger.debug("platform.version() = %r", platform.version())
+
+    logger.debug("platform.machine() = %r", platform.machine())
+    logger.debug("platform.uname() = %r", platform.uname())
+    logger.debug("platform.mac_ver() = %r", platform.mac_ver())
+
+    logger.debug("sys.executable = %r", sys.executable)
+    logger.debug("sys.version = %r", sys.version)
+    logger.debug("os.environ = %r", dict(os.environ))
+
+
 # ------------------------------------------------------------------------------
 # Inkscape plugin functionality
 # ------------------------------------------------------------------------------
@@ -103,50 +239,80 @@ class TexText(inkex.EffectExtension):
             logging.disable(logging.NOTSET)
             logger.debug("First run of TexText. Enforcing DEBUG mode.")
         elif previous_exit_code == EXIT_CODE_OK:
-            logging.disable(logging.CRITICAL)
+            if self.config.get("deferred_logging", False):
+                # Full diagnostics in the log file only if this run fails, show the user only the
+                # messages relevant to them
+                defer_file_logging()
+                user_log_channel.setLevel(logging.INFO)
+            else:
+                logging.disable(logging.CRITICAL)
         elif previous_exit_code == EXIT_CODE_UNEXPECTED_ERROR:
             logging.disable(logging.NOTSET)
-            logger.debug("Enforcing DEBUG mode due to previous exit code `%d`" % previous_exit_code)
+            logger.debug("Enforcing DEBUG mode due to previous exit code `%d`", previous_exit_code)
         else:
             logging.disable(logging.DEBUG)
 
+        NestedLoggingGuard.log_elapsed_time = self.config.get("log_timings", False)
+        metrics.enabled = self.config.get("metrics", False)
+        if metrics.enabled:
+            atexit.register(metrics.flush)
+
         logger.debug("TexText initialized")
-        with open(__file__, "rb") as fhl:
-            logger.debug("TexText version = %s (md5sum = %s)" %
-                         (repr(__version__), hashlib.md5(fhl.read()).hexdigest())
-                         )
-        logger.debug("platform.system() = %s" % repr(platform.system()))
-        logger.debug("platform.release() = %s" % repr(platform.release()))
-        logger.debug("platform.version() = %s" % repr(platform.version()))
-
-        logger.debug("platform.machine() = %s" % repr(platform.machine()))
-        logger.debug("platform.uname() = %s" % repr(platform.uname()))
-        logger.debug("platform.mac_ver() = %s" % repr(platform.mac_ver()))
-
-        logger.debug("sys.executable = %s" % repr(sys.executable))
-        logger.debug("sys.version = %s" % repr(sys.version))
-        logger.debug("os.environ = %s" % repr(os.environ))
-
-        self.requirements_checker = TexTextRequirementsChecker(logger, self.config)
-
-        if previous_exit_code == EXIT_CODE_OK and "requirements_checker" in self.cache.values:
-            self.requirements_checker.inkscape_executable = self.cache["requirements_checker"][
-                "inkscape_executable"]
-            self.requirements_checker.available_tex_to_pdf_converters = self.cache["requirements_checker"][
-                "available_tex_to_pdf_converters"]
-            self.requirements_checker.available_pdf_to_svg_converters = self.cache["requirements_checker"][
-                "available_pdf_to_svg_converters"]
+        startup_profiler.mark("load settings and cache")
+
+        # The system information is only of interest if something goes wrong. In normal runs it
+        # is logged when an error occurs (see __main__.py).
+        if logging.root.manager.disable < logging.DEBUG and not file_logging_deferred():
+            log_system_information()
+            startup_profiler.mark("log system information")
+
+        self.requirements_checker = TexTextRequirementsChecker(logger, self.config, first_match=True)
+
+        # Rely on the results of the last check as long as the environment is unchanged (only the
+        # cached paths are validated by stat calls). Check again after unexpected errors.
+        if previous_exit_code != EXIT_CODE_UNEXPECTED_ERROR and \
+                self.requirements_checker.restore_cached_results(self.cache.get("requirements_checker", None)):
+            logger.debug("Using cached requirements check results")
         else:
+            logger.debug("Checking requirements")
             if self.requirements_checker.check() == False:
                 raise TexTextFatalError("TexText requirements are not met. "
                                         "Please follow instructions "
                                         "https://textext.github.io/textext/")
             else:
-                self.cache["requirements_checker"] = {
-                    "inkscape_executable": self.requirements_checker.inkscape_executable,
-                    "available_tex_to_pdf_converters": self.requirements_checker.available_tex_to_pdf_converters,
-                    "available_pdf_to_svg_converters": self.requirements_checker.available_pdf_to_svg_converters,
-                }
+                self.cache["requirements_checker"] = self.requirements_checker.cached_results()
+        startup_profiler.mark("requirements check")
+
+        self.render_cache = RenderCache(
+            directory=self.config.get("render_cache_path",
+                                      os.path.join(defaults.textext_config_path, "render_cache")),
+            max_size=int(self.config.get("render_cache_max_size", 50)) * 1024 * 1024,  # in MB
+            enabled=self.config.get("render_cache", True),
+            logger=logger)
+
+        # Precompiled preambles (LaTeX format files), one per preamble and TeX command
+        self.format_cache = RenderCache(
+            directory=os.path.join(defaults.textext_config_path, "formats"),
+            max_size=200 * 1024 * 1024,  # format files of preambles loading e.g. TikZ are large
+            enabled=self.config.get("precompiled_preamble", False),
+            logger=logger)
+
+        # Persistent inkscape process for PDF imports, started on first use
+        self.inkscape_shell = None
+        if self.config.get("inkscape_shell", False) and self.requirements_checker.inkscape_executable:
+            self.inkscape_shell = InkscapeShell(self.requirements_checker.inkscape_executable, logger=logger)
+
+        # Keep glyphs as definitions shared by all TexText nodes instead of copying them into each node
+        self.shared_glyphs = self.config.get("shared_glyphs", False)
+
+        # Limits of the TeX/ typst/ dvisvgm runs, so a TeX run stuck in a loop does not block Inkscape
+        self.command_limits = {
+            "timeout": self.config.get("command_timeout", 300) or None,  # in s
+            "cpu_limit": self.config.get("command_cpu_limit", None) or None,  # in s
+            "memory_limit": int(self.config.get("command_memory_limit", 0) or 0) * 1024 * 1024 or None,  # in MB
+            "max_output": TexToPdfConverter.MAX_COMMAND_OUTPUT,
+        }
+        startup_profiler.mark("setup caches")
 
         super(TexText, self).__init__()
 
@@ -178,9 +344,27 @@ class TexText(inkex.EffectExtension):
             default=self.DEFAULT_TEXCMD
         )
 
+        # Program converting the compiled snippet to SVG: "inkscape" (via PDF) or "dvisvgm" (via DVI)
+        self.arg_parser.add_argument(
+            "--svg-backend",
+            type=str,
+            choices=["inkscape", "dvisvgm"],
+            default=self.config.get("svg_backend", "inkscape")
+        )
+
+        # Recompile TexText nodes without GUI: "all" nodes in the document or the "selection"
+        self.arg_parser.add_argument(
+            "--recompile",
+            type=str,
+            choices=["", "all", "selection"],
+            default=""
+        )
+
     def effect(self):
         """Perform the effect: create/modify TexText objects"""
-        from .asktext import AskTextDefault
+        if self.options.recompile:
+            self.recompile_nodes(self.options.recompile == "all")
+            return
 
         with logger.debug("TexText.effect"):
 
@@ -197,23 +381,15 @@ class TexText(inkex.EffectExtension):
                 current_tex_command = list(self.requirements_checker.available_tex_to_pdf_converters.keys())[0]
 
             if text:
-                logger.debug("Old node text = %s" % repr(text))
-                logger.debug("Old node scale = %s" % repr(current_scale))
+                logger.debug("Old node text = %r", text)
+                logger.debug("Old node scale = %r", current_scale)
 
             # This is very important when re-editing nodes which have been created using TexText <= 0.7. It ensures that
             # the scale factor which is displayed in the AskText dialog is adjusted in such a way that the size of the node
             # is preserved when recompiling the LaTeX code. ("version" attribute introduced in 0.7.1)
             if old_svg_ele is not None:
 
-                if old_svg_ele.get_meta("version", '<=0.7') == '<=0.7':
-                    logger.debug("Adjust scale factor for node created with TexText<=0.7")
-                    current_scale *= self.svg.uutounit(1, "pt")
-
-                jac_sqrt = float(old_svg_ele.get_meta("jacobian_sqrt", 1.0))
-
-                if jac_sqrt != 1.0:
-                    logger.debug("Adjust scale factor to account transformations in inkscape")
-                    current_scale *= old_svg_ele.get_jacobian_sqrt() / jac_sqrt
+                current_scale = self.adjusted_scale(old_svg_ele, current_scale)
 
                 alignment = old_svg_ele.get_meta("alignment", TexText.DEFAULT_ALIGNMENT)
 
@@ -223,37 +399,12 @@ class TexText(inkex.EffectExtension):
 
             # Ask for TeX code
             if self.options.text is None:
-                global_scale_factor = self.options.scale_factor
+                # The GUI toolkit is imported only if the dialog is shown
+                from .asktext import AskTextDefault
 
-                if not preamble_file:
-                    logger.debug("Using default preamble file `%s`" % self.options.preamble_file)
-                    if current_tex_command != "typst":
-                        preamble_file = "default_packages.tex"
-                    else:
-                        preamble_file = "default_preamble_typst.typ"
-                else:
-                    logger.debug("Using node preamble file")
-                    # Check if preamble file exists at the specified absolute path location. If not, check to find
-                    # the file in the default path. If this fails, too, fallback to the default.
-                    if not os.path.exists(preamble_file):
-                        logger.debug("Preamble file is NOT found by absolute path")
-                        preamble_file = os.path.join(os.path.dirname(self.options.preamble_file),
-                                                     os.path.basename(preamble_file))
-                        if not os.path.exists(preamble_file):
-                            logger.debug("Preamble file is NOT found along with default preamble file")
-                            if current_tex_command != "typst":
-                                preamble_file = "default_packages.tex"
-                            else:
-                                preamble_file = "default_preamble_typst.typ"
-
-                        else:
-                            logger.debug("Preamble file is found along with default preamble file")
-                    else:
-                        logger.debug("Preamble file found by absolute path")
+                global_scale_factor = self.options.scale_factor
 
-                if not os.path.isfile(preamble_file):
-                    logger.debug("Preamble file is not found")
-                    preamble_file = ""
+                preamble_file = self.find_preamble_file(preamble_file, current_tex_command)
 
                 asker = AskTextDefault(__version__, text, preamble_file, global_scale_factor, current_scale,
                                        current_alignment=alignment, current_texcmd=current_tex_command,
@@ -268,12 +419,13 @@ class TexText(inkex.EffectExtension):
                                            tex_command=tex_cmd,
                                            original_scale=current_scale)
 
-                def preview_callback(_text, _preamble, _preview_callback, _tex_command, _white_bg):
+                def preview_callback(_text, _preamble, _preview_callback, _tex_command, _white_bg, _max_size=None):
                     return self.preview_convert(_text,
                                                 _preamble,
                                                 _preview_callback,
                                                 _tex_command,
-                                                _white_bg
+                                                _white_bg,
+                                                _max_size
                                                 )
 
                 with logger.debug("Run TexText GUI"):
@@ -299,7 +451,194 @@ class TexText(inkex.EffectExtension):
                                 original_scale=current_scale
                                 )
 
-    def preview_convert(self, text, preamble_file, image_setter, tex_command, white_bg):
+    def recompile_nodes(self, all_nodes):
+        """
+        Recompiles several TexText nodes at once. Identical snippets are compiled only once and the
+        snippets are compiled in parallel in a pool of worker processes. Nodes keep their size,
+        alignment and tex command. Nodes which fail to compile are left untouched and reported to the
+        user after all other nodes have been replaced.
+
+        :param (bool) all_nodes: Recompile all TexText nodes in the document if True, otherwise the
+                                 selected TexText nodes and the TexText nodes inside selected groups
+        :return: List of (node id, error message) of the nodes which could not be recompiled
+        """
+        with logger.debug("TexText.recompile_nodes"):
+            failures = []
+
+            # (text, preamble file, tex command) -> nodes using this snippet
+            snippets = collections.OrderedDict()
+            all_textext_nodes = self.find_textext_nodes(all_nodes)
+            for node in all_textext_nodes:
+                try:
+                    text = node.get_meta_text()
+                    tex_command = node.get_meta("texconverter", TexText.DEFAULT_TEXCMD)
+                    preamble_file = self.find_preamble_file(node.get_meta("preamble", ""), tex_command)
+                except (TypeError, AttributeError) as error:
+                    failures.append((node.get_id(), "Not a valid TexText node: %s" % str(error)))
+                    continue
+
+                if tex_command not in self.requirements_checker.available_tex_to_pdf_converters:
+                    failures.append((node.get_id(), "%s is not available" % tex_command))
+                    continue
+
+                if preamble_file:
+                    preamble_file = os.path.abspath(preamble_file)
+
+                snippets.setdefault((text, preamble_file, tex_command), []).append(node)
+
+            num_nodes = sum(len(nodes) for nodes in snippets.values())
+            logger.info("Recompiling %d TexText nodes (%d unique snippets)" % (num_nodes, len(snippets)))
+
+            with TemporaryDirectory() as tmp_dir:
+                svg_files = self.compile_snippets(list(snippets.keys()), tmp_dir)
+
+                with logger.debug("Replacing nodes in document"):
+                    used_ids = self.document_ids()
+                    for (text, preamble_file, tex_command), nodes in snippets.items():
+                        svg_file, error, svg_converter = svg_files[(text, preamble_file, tex_command)]
+                        if svg_file is not None:
+                            with open(svg_file, "rb") as f:
+                                svg_content = f.read()
+                        for node in nodes:
+                            if svg_file is None:
+                                failures.append((node.get_id(), error))
+                                continue
+                            try:
+                                tt_node = TexTextElement(svg_content, self.svg.unit, self.shared_glyphs)
+                                alignment = node.get_meta("alignment", TexText.DEFAULT_ALIGNMENT)
+                                scale = self.adjusted_scale(node, float(node.get_meta("scale", 1.0)))
+                                self.store_meta(tt_node, text, preamble_file, scale, alignment, tex_command,
+                                                svg_converter)
+                                self.replace_textext_node(node, tt_node, svg_content, used_ids, alignment, 1.0)
+                            except (TexTextError, etree.XMLSyntaxError, ValueError) as error:
+                                failures.append((node.get_id(), str(error)))
+
+            if failures:
+                inkex.errormsg("%d of %d TexText nodes could not be recompiled:\n%s" %
+                               (len(failures), len(all_textext_nodes),
+                                "\n".join("  %s: %s" % failure for failure in failures)))
+            return failures
+
+    def find_textext_nodes(self, all_nodes):
+        """
+        :param (bool) all_nodes: Find all TexText nodes in the document if True, otherwise the
+                                 selected TexText nodes and the TexText nodes inside selected groups
+        :return: List of TexTextElement in document order, without duplicates
+        """
+        query = "//svg:g[@textext:text]"
+        if all_nodes:
+            nodes = self.svg.xpath(query, namespaces=NSS)
+        else:
+            nodes = []
+            for node in self.svg.selected.values():
+                if node.tag_name == 'g' and node.get("{%s}text" % TEXTEXT_NS) is not None:
+                    nodes.append(node)
+                nodes.extend(node.xpath("." + query, namespaces=NSS))
+
+        found = collections.OrderedDict()
+        for node in nodes:
+            node.__class__ = TexTextElement
+            found[id(node)] = node
+        return list(found.values())
+
+    @metrics.timed("compile_snippets")
+    def compile_snippets(self, snippets, directory):
+        """
+        Compiles snippets to SVG, in parallel if there is more than one snippet to compile
+
+        The number of worker processes can be limited via the config key "recompile_workers"
+        (defaults to the number of CPUs).
+
+        :param snippets: List of (text, preamble file, tex command)
+        :param directory: Directory the SVG files of snippets not found in the render cache are written to
+        :return: dict snippet -> (svg file, None, svg converter) on success or (None, error message, None)
+                 on failure, the svg converter is the program which created the SVG file
+        """
+        results = dict()
+        jobs = []
+
+        dvisvgm = self.dvisvgm_executable()
+        converter = TexToPdfConverter(None, dvisvgm=dvisvgm, command_limits=self.command_limits)
+
+        with logger.debug("Looking up snippets in render cache"):
+            for snippet in snippets:
+                text, preamble_file, tex_command = snippet
+                tex_executable = self.requirements_checker.available_tex_to_pdf_converters[tex_command]
+                svg_converter = converter.svg_converter_name(tex_executable)
+                cache_key = self.svg_cache_key(converter, text, preamble_file, tex_command, tex_executable,
+                                               svg_converter)
+                svg_file = self.render_cache.get(cache_key, "svg")
+                if svg_file is not None:
+                    results[snippet] = (svg_file, None, svg_converter)
+                else:
+                    jobs.append((snippet, cache_key, tex_executable))
+
+        def store(job_index, svg_code, error, svg_converter):
+            snippet, cache_key, tex_executable = jobs[job_index]
+            if svg_code is None:
+                results[snippet] = (None, error, None)
+                return
+            svg_file = os.path.join(directory, "snippet-%d.svg" % job_index)
+            with open(svg_file, "wb") as f:
+                f.write(svg_code)
+            if svg_converter != converter.svg_converter_name(tex_executable):
+                # e.g. inkscape after dvisvgm failed, do not store it as output of dvisvgm
+                cache_key = self.svg_cache_key(converter, *snippet, tex_executable, svg_converter)
+            results[snippet] = (self.render_cache.put(cache_key, "svg", svg_file), None, svg_converter)
+            logger.info("Compiled snippet %d of %d" % (len(results) - (len(snippets) - len(jobs)), len(jobs)))
+
+        max_workers = int(self.config.get("recompile_workers", None) or os.cpu_count() or 1)
+
+        # Snippets sharing preamble and tex command are typeset as pages of one document, split
+        # into one batch per worker process so all workers are busy
+        groups = collections.OrderedDict()
+        for job_index, (snippet, _, _) in enumerate(jobs):
+            groups.setdefault((snippet[1], snippet[2]), []).append(job_index)
+        batches = []
+        for job_indices in groups.values():
+            batch_size = int(math.ceil(len(job_indices) / float(max_workers)))
+            batches += [job_indices[i:i + batch_size] for i in range(0, len(job_indices), batch_size)]
+
+        def batch_args(batch):
+            (_, preamble_file, tex_command), _, tex_executable = jobs[batch[0]]
+            return [jobs[job_index][0][0] for job_index in batch], preamble_file, tex_command, tex_executable
+
+        max_workers = min(max_workers, len(batches))
+
+        if max_workers <= 1:
+            with logger.debug("Compiling %d snippets", len(jobs)):
+                for batch in batches:
+                    texts, preamble_file, tex_command, tex_executable = batch_args(batch)
+                    with metrics.labels(tex_command=tex_command):
+                        batch_results = compile_snippet_batch(texts, preamble_file, tex_command, tex_executable,
+                                                              format_cache=self.format_cache,
+                                                              inkscape_shell=self.inkscape_shell, dvisvgm=dvisvgm,
+                                                              command_limits=self.command_limits)
+                    for job_index, result in zip(batch, batch_results):
+                        store(job_index, *result)
+            return results
+
+        with logger.debug("Compiling %d snippets in %d processes", len(jobs), max_workers):
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker_process,
+                                                        initargs=(logging.root.manager.disable,)) as executor:
+                futures = {executor.submit(compile_snippet_batch_in_worker, metrics.enabled, *batch_args(batch),
+                                           format_cache=self.format_cache, dvisvgm=dvisvgm,
+                                           command_limits=self.command_limits): batch
+                           for batch in batches}
+                for future in concurrent.futures.as_completed(futures):
+                    batch = futures[future]
+                    try:
+                        batch_results, records, log_records = future.result()
+                        metrics.merge(records)
+                        handle_worker_records(log_records)
+                    except Exception as error:  # e.g. a worker process died
+                        batch_results = [(None, "Worker process failed: %s" % str(error), None)] * len(batch)
+                    for job_index, result in zip(batch, batch_results):
+                        store(job_index, *result)
+
+        return results
+
+    def preview_convert(self, text, preamble_file, image_setter, tex_command, white_bg, max_size=None):
         """
         Generates a preview PNG of the LaTeX output using the selected converter.
 
@@ -308,14 +647,17 @@ class TexText(inkex.EffectExtension):
         :param image_setter: A callback to execute with the file path of the generated PNG
         :param tex_command: Command for tex -> pdf
         :param (bool) white_bg: set background to white if True
+        :param max_size: (width, height) in pixels of the preview area, used to choose the resolution
+                         of the PNG if a fast rasterizer is available. If None, the PNG is rendered at 300 dpi.
         """
 
         tex_executable = self.requirements_checker.available_tex_to_pdf_converters[tex_command]
 
-        with logger.debug("TexText.preview"):
+        with logger.debug("TexText.preview"), metrics.labels(tex_command=tex_command), \
+                metrics.stage("preview_convert"):
             with logger.debug("args:"):
                 for k, v in list(locals().items()):
-                    logger.debug("%s = %s" % (k, repr(v)))
+                    logger.debug("%s = %r", k, v)
 
             if not text:
                 logger.debug("no text, return")
@@ -324,15 +666,27 @@ class TexText(inkex.EffectExtension):
             if isinstance(text, bytes):
                 text = text.decode('utf-8')
 
-            with ChangeToTemporaryDirectory():
-                with logger.debug("Converting tex to pdf"):
-                    converter = TexToPdfConverter(self.requirements_checker)
-                    if tex_command == "typst":
-                        converter.typ_to_any(tex_executable, text, preamble_file, 'pdf')
-                    else:
-                        converter.tex_to_pdf(tex_executable, text, preamble_file)
-                    converter.pdf_to_png(white_bg=white_bg)
-                    image_setter(converter.tmp('png'))
+            # The preview runs in a background thread, hence it must not change the working directory
+            with TemporaryDirectory() as tmp_dir:
+                converter = TexToPdfConverter(self.requirements_checker, self.format_cache, self.inkscape_shell,
+                                              command_limits=self.command_limits, tmp_dir=tmp_dir)
+                if max_size is not None:
+                    # Coarse steps so resizing the dialog a bit does not invalidate cached previews
+                    max_size = tuple(max(int(size) // 50 * 50, 50) for size in max_size)
+                cache_key = self.render_cache_key("png", text, preamble_file, tex_command, tex_executable,
+                                                  converter.LATEX_OPTIONS, bool(white_bg), max_size,
+                                                  self.png_backend_key())
+                png_file = self.render_cache.get(cache_key, "png")
+                metrics.count("render_cache_miss" if png_file is None else "render_cache_hit", kind="png")
+                if png_file is None:
+                    with logger.debug("Converting tex to pdf"):
+                        if tex_command == "typst":
+                            converter.typ_to_any(tex_executable, text, preamble_file, 'pdf')
+                        else:
+                            converter.tex_to_pdf(tex_executable, text, preamble_file)
+                        converter.pdf_to_png(white_bg=white_bg, max_size=max_size)
+                        png_file = self.render_cache.put(cache_key, "png", converter.tmp('png'))
+                image_setter(png_file)
 
     def do_convert(self, text, preamble_file, user_scale_factor, old_svg_ele, alignment, tex_command,
                    original_scale=None):
@@ -351,10 +705,11 @@ class TexText(inkex.EffectExtension):
 
         tex_executable = self.requirements_checker.available_tex_to_pdf_converters[tex_command]
 
-        with logger.debug("TexText.do_convert"):
+        with logger.debug("TexText.do_convert"), metrics.labels(tex_command=tex_command), \
+                metrics.stage("do_convert"):
             with logger.debug("args:"):
                 for k, v in list(locals().items()):
-                    logger.debug("%s = %s" % (k, repr(v)))
+                    logger.debug("%s = %r", k, v)
 
             if not text:
                 logger.debug("no text, return")
@@ -366,30 +721,30 @@ class TexText(inkex.EffectExtension):
             # Convert
             with logger.debug("Converting tex to svg"):
                 with ChangeToTemporaryDirectory():
-                    converter = TexToPdfConverter(self.requirements_checker)
-                    if tex_command == "typst":
-                        converter.typ_to_any(tex_executable, text, preamble_file, 'svg')
-                    else:
-                        converter.tex_to_pdf(tex_executable, text, preamble_file)
-                        converter.pdf_to_svg()
-
-                    tt_node = TexTextElement(converter.tmp("svg"), self.svg.unit)
+                    converter = TexToPdfConverter(self.requirements_checker, self.format_cache, self.inkscape_shell,
+                                                  self.dvisvgm_executable(), self.command_limits)
+                    svg_converter = converter.svg_converter_name(tex_executable)
+                    cache_key = self.svg_cache_key(converter, text, preamble_file, tex_command, tex_executable,
+                                                   svg_converter)
+                    svg_file = self.render_cache.get(cache_key, "svg")
+                    metrics.count("render_cache_miss" if svg_file is None else "render_cache_hit", kind="svg")
+                    if svg_file is None:
+                        if tex_command == "typst":
+                            converter.typ_to_any(tex_executable, text, preamble_file, 'svg')
+                        elif converter.tex_to_svg(tex_executable, text, preamble_file) != svg_converter:
+                            # dvisvgm failed and inkscape has been used
+                            svg_converter = "inkscape"
+                            cache_key = self.svg_cache_key(converter, text, preamble_file, tex_command,
+                                                           tex_executable, svg_converter)
+                        svg_file = self.render_cache.put(cache_key, "svg", converter.tmp("svg"))
+
+                    with open(svg_file, "rb") as f:
+                        svg_content = f.read()
+                    tt_node = TexTextElement(svg_content, self.svg.unit, self.shared_glyphs)
 
             # -- Store textext attributes
-            tt_node.set_meta("version", __version__)
-            tt_node.set_meta("texconverter", tex_command)
-            tt_node.set_meta("pdfconverter", 'inkscape')
-            tt_node.set_meta_text(text)
-            tt_node.set_meta("preamble", preamble_file)
-            tt_node.set_meta("scale", str(user_scale_factor))
-            tt_node.set_meta("alignment", str(alignment))
-            try:
-                inkscape_version = self.document.getroot().get('inkscape:version')
-                tt_node.set_meta("inkscapeversion", inkscape_version.split(' ')[0])
-            except AttributeError as ignored:
-                # Unfortunately when this node comes from an Inkscape document that has never been saved before
-                # no version attribute is provided by Inkscape :-(
-                pass
+            self.store_meta(tt_node, text, preamble_file, user_scale_factor, alignment, tex_command,
+                            svg_converter)
 
             # Place new node in document
             if old_svg_ele is None:
@@ -433,19 +788,17 @@ class TexText(inkex.EffectExtension):
 
                     tt_node.set_none_strokes_to_0pt()
 
+                    tt_node.make_ids_unique_in(svg_content, self.document_ids())
                     self.svg.get_current_layer().add(tt_node)
+
+                    if self.shared_glyphs:
+                        tt_node.share_glyphs(self.svg)
             else:
                 with logger.debug("Replacing node in document"):
                     # Rescale existing nodes according to user request
                     relative_scale = user_scale_factor / original_scale
-                    tt_node.align_to_node(old_svg_ele, alignment, relative_scale)
-
-                    # If no non-black color has been explicitily set by TeX we copy the color information
-                    # from the old node so that coloring done in Inkscape is preserved.
-                    if not tt_node.is_colorized():
-                        tt_node.import_group_color_style(old_svg_ele)
-
-                    self.replace_node(old_svg_ele, tt_node)
+                    self.replace_textext_node(old_svg_ele, tt_node, svg_content, self.document_ids(), alignment,
+                                              relative_scale)
 
             with logger.debug("Saving global settings"):
                 # -- Save settings
@@ -460,6 +813,178 @@ class TexText(inkex.EffectExtension):
 
                 self.config.save()
 
+    def store_meta(self, tt_node, text, preamble_file, scale, alignment, tex_command, svg_converter="inkscape"):
+        """
+        Stores the textext attributes in a freshly converted node
+
+        :param (TexTextElement) tt_node: The new node
+        :param svg_converter: The program which created the SVG ("inkscape" or "dvisvgm")
+        """
+        tt_node.set_meta("version", __version__)
+        tt_node.set_meta("texconverter", tex_command)
+        tt_node.set_meta("pdfconverter", svg_converter)
+        tt_node.set_meta_text(text)
+        tt_node.set_meta("preamble", preamble_file)
+        tt_node.set_meta("scale", str(scale))
+        tt_node.set_meta("alignment", str(alignment))
+        try:
+            inkscape_version = self.document.getroot().get('inkscape:version')
+            tt_node.set_meta("inkscapeversion", inkscape_version.split(' ')[0])
+        except AttributeError as ignored:
+            # Unfortunately when this node comes from an Inkscape document that has never been saved before
+            # no version attribute is provided by Inkscape :-(
+            pass
+
+    def replace_textext_node(self, old_svg_ele, tt_node, svg_content, used_ids, alignment, relative_scale):
+        """
+        Puts tt_node in place of old_svg_ele, aligned and scaled relative to the old node
+
+        :param (TexTextElement) old_svg_ele: The node to be replaced
+        :param (TexTextElement) tt_node: The new node
+        :param (bytes) svg_content: The SVG file tt_node has been created from
+        :param (set) used_ids: The ids used in the document, see document_ids(). Updated by the ids of
+                               tt_node.
+        :param alignment: The anchor both nodes are aligned at, e.g. "middle center"
+        :param relative_scale: Scale of the new node relative to the old one
+        """
+        tt_node.align_to_node(old_svg_ele, alignment, relative_scale)
+
+        # If no non-black color has been explicitily set by TeX we copy the color information
+        # from the old node so that coloring done in Inkscape is preserved.
+        if not tt_node.is_colorized():
+            tt_node.import_group_color_style(old_svg_ele)
+
+        tt_node.make_ids_unique_in(svg_content, used_ids, old_svg_ele)
+        self.replace_node(old_svg_ele, tt_node)
+
+        if self.shared_glyphs:
+            tt_node.share_glyphs(self.svg)
+
+    def document_ids(self):
+        """
+        :return: Set of the ids used in the document. Collect them once and pass them to
+                 TexTextElement.make_ids_unique_in for all nodes placed in the document.
+        """
+        return {str(value) for value in self.svg.xpath("//@id")}
+
+    def adjusted_scale(self, old_svg_ele, scale):
+        """
+        Adjusts the scale factor stored in an old node such that recompiling the node with
+        this scale preserves its size.
+
+        This is very important when re-editing nodes which have been created using TexText <= 0.7
+        ("version" attribute introduced in 0.7.1) and for nodes which have been transformed in Inkscape.
+
+        :param (TexTextElement) old_svg_ele: The node
+        :param (float) scale: The scale factor stored in the node
+        :return: The adjusted scale factor
+        """
+        if old_svg_ele.get_meta("version", '<=0.7') == '<=0.7':
+            logger.debug("Adjust scale factor for node created with TexText<=0.7")
+            scale *= self.svg.uutounit(1, "pt")
+
+        jac_sqrt = float(old_svg_ele.get_meta("jacobian_sqrt", 1.0))
+
+        if jac_sqrt != 1.0:
+            logger.debug("Adjust scale factor to account transformations in inkscape")
+            scale *= old_svg_ele.get_jacobian_sqrt() / jac_sqrt
+
+        return scale
+
+    def find_preamble_file(self, preamble_file, tex_command):
+        """
+        Locates the preamble file of a node
+
+        Checks if preamble file exists at the specified absolute path location. If not, checks to find
+        the file in the default path. If this fails, too, falls back to the default preamble.
+
+        :param preamble_file: The preamble file stored in the node (may be empty)
+        :param tex_command: The tex command of the node, determines the default preamble
+        :return: Path to the preamble file or "" if no preamble file is found
+        """
+        if tex_command != "typst":
+            default_preamble_file = "default_packages.tex"
+        else:
+            default_preamble_file = "default_preamble_typst.typ"
+
+        if not preamble_file:
+            logger.debug("Using default preamble file `%s`", self.options.preamble_file)
+            preamble_file = default_preamble_file
+        else:
+            logger.debug("Using node preamble file")
+            if not os.path.exists(preamble_file):
+                logger.debug("Preamble file is NOT found by absolute path")
+                preamble_file = os.path.join(os.path.dirname(self.options.preamble_file),
+                                             os.path.basename(preamble_file))
+                if not os.path.exists(preamble_file):
+                    logger.debug("Preamble file is NOT found along with default preamble file")
+                    preamble_file = default_preamble_file
+                else:
+                    logger.debug("Preamble file is found along with default preamble file")
+            else:
+                logger.debug("Preamble file found by absolute path")
+
+        if not os.path.isfile(preamble_file):
+            logger.debug("Preamble file is not found")
+            preamble_file = ""
+
+        return preamble_file
+
+    def dvisvgm_executable(self):
+        """
+        :return: Path to dvisvgm if it has been selected as SVG backend (option --svg-backend or
+                 config key "svg_backend") and is available, otherwise None
+        """
+        if self.options.svg_backend != "dvisvgm":
+            return None
+        dvisvgm = self.requirements_checker.available_pdf_to_svg_converters.get("dvisvgm")
+        if dvisvgm is None:
+            logger.warning("dvisvgm is not available, using inkscape as SVG backend")
+        return dvisvgm
+
+    def svg_backend_key(self, converter, svg_converter):
+        """
+        :param svg_converter: The program which created the SVG ("inkscape" or "dvisvgm")
+        :return: The part of the render cache key describing the SVG backend
+        """
+        if svg_converter == "dvisvgm":
+            return ["dvisvgm", file_fingerprint(converter.dvisvgm)]
+        return ["inkscape", file_fingerprint(self.requirements_checker.inkscape_executable)]
+
+    def png_backend_key(self):
+        """
+        :return: The part of the render cache key describing the programs which may render the
+                 preview: the poppler tools (see preview_rasterizer) and inkscape
+        """
+        converters = self.requirements_checker.available_pdf_to_png_converters
+        return [[name, file_fingerprint(converters[name])] for name in sorted(converters)] + \
+               [["inkscape", file_fingerprint(self.requirements_checker.inkscape_executable)]]
+
+    def svg_cache_key(self, converter, text, preamble_file, tex_command, tex_executable, svg_converter):
+        """ :return: The render cache key of the SVG file of a snippet created by svg_converter """
+        return self.render_cache_key("svg", text, preamble_file, tex_command, tex_executable,
+                                     converter.LATEX_OPTIONS, self.svg_backend_key(converter, svg_converter))
+
+    @staticmethod
+    def render_cache_key(kind, text, preamble_file, tex_command, tex_executable, latex_options, *extra):
+        """
+        Computes the render cache key of a snippet. Relative preamble paths are resolved
+        against the current directory, the same way as in TexToPdfConverter.read_preamble.
+
+        :param kind: Kind of output ("svg", "png")
+        :param text: The TeX/ typst code
+        :param preamble_file: Path to the preamble file, its content is part of the key
+        :param tex_command: The tex command ("pdflatex", "typst", ...)
+        :param tex_executable: Path to the executable of tex_command
+        :param latex_options: Options passed to the LaTeX command
+        :param extra: Additional components influencing the output
+        """
+        return RenderCache.make_key(__version__, kind, text,
+                                    file_content(os.path.abspath(preamble_file)),
+                                    TexToPdfConverter.DEFAULT_DOCUMENT_CLASS,
+                                    tex_command, file_fingerprint(tex_executable),
+                                    list(latex_options), *extra)
+
     def get_old(self):
         """
         Dig out LaTeX code and name of preamble file from old
@@ -522,9 +1047,60 @@ class TexToPdfConverter:
     LATEX_OPTIONS = ['-interaction=nonstopmode',
                      '-halt-on-error']
 
-    def __init__(self, checker):
-        self.tmp_base = 'tmp'
+    # TeX commands for which the preamble can be dumped into a format file. LuaTeX
+    # cannot dump the Lua state (fonts loaded via luaotfload), so lualatex is missing here.
+    FORMAT_ENGINES = ["pdflatex", "xelatex"]
+
+    # TeX commands which can be used with dvisvgm and the options switching them to DVI output.
+    # dvisvgm cannot handle the OpenType fonts lualatex writes into DVI files.
+    DVI_OPTIONS = {"pdflatex": ["-output-format=dvi"],
+                   "xelatex": ["-no-pdf"]}
+
+    # Header of the document typesetting several snippets (see tex_to_pdf_batch): Resets the
+    # standard counters (if defined by the document class) before each snippet
+    BATCH_HEADER = (r"\newcommand\textextresetcounter[2]{\ifcsname c@#1\endcsname\setcounter{#1}{#2}\fi}" "\n"
+                    r"\newcommand\textextresetcounters{"
+                    + "".join(r"\textextresetcounter{%s}{0}" % counter
+                              for counter in ["equation", "figure", "table", "footnote", "mpfootnote",
+                                              "section", "subsection", "subsubsection", "paragraph"])
+                    + r"\textextresetcounter{page}{1}}")
+
+    # One page of the batch document, the snippet starts in the second line
+    BATCH_PAGE_TEMPLATE = "\\begingroup\\textextresetcounters\n%s\n\\endgroup\\newpage"
+
+    # Snippets with global assignments which would leak into the following snippets
+    BATCH_EXCLUDE_REGEX = re.compile(r"\\(?:global|gdef|xdef|newcounter|setcounter|addtocounter|stepcounter|"
+                                     r"refstepcounter)(?![a-zA-Z@])")
+
+    # Bytes of stdout and of stderr of a command kept for the error dialog, the end is kept
+    MAX_COMMAND_OUTPUT = 1024 * 1024
+
+    # Results of find_tex_file, looked up once per process: (tex command, file name) -> path or None
+    _tex_files = {}
+
+    def __init__(self, checker, format_cache=None, inkscape_shell=None, dvisvgm=None, command_limits=None,
+                 tmp_dir=None):
+        """
+        :param checker: The requirements checker
+        :param (RenderCache) format_cache: If given and enabled, the preamble is precompiled into
+                                           a format file stored in this cache
+        :param (InkscapeShell) inkscape_shell: If given, PDF files are converted by this persistent
+                                               inkscape process instead of launching inkscape
+        :param dvisvgm: Path to dvisvgm. If given, tex_to_svg compiles to DVI and converts it via
+                        dvisvgm instead of compiling to PDF and converting it via inkscape
+        :param command_limits: dict with the limits (timeout, cpu_limit, memory_limit, max_output) of
+                               the TeX/ typst/ dvisvgm runs, see utility.run_command
+        :param tmp_dir: Directory the temporary files are written to and the commands run in. If None,
+                        the current directory is used. Passing the directory instead of changing into
+                        it allows conversions in background threads (os.chdir affects all threads).
+        """
+        self.tmp_dir = tmp_dir
+        self.tmp_base = os.path.join(tmp_dir, 'tmp') if tmp_dir is not None else 'tmp'
         self.checker = checker  # type: requirements_check.TexTextRequirementsChecker
+        self.format_cache = format_cache
+        self.inkscape_shell = inkscape_shell
+        self.dvisvgm = dvisvgm
+        self.command_limits = command_limits or {}
         
         # If a file with the name "LATEX_OPTIONS" exists in the textext plugin directory, we interpret each line 
         # in that file not starting with "#" as a separate option to be passed to the latex command.
@@ -545,55 +1121,283 @@ class TexToPdfConverter:
         """
         return self.tmp_base + '.' + suffix
 
-    def tex_to_pdf(self, tex_command, latex_text, preamble_file):
+    @metrics.timed("tex_to_pdf")
+    def tex_to_pdf(self, tex_command, latex_text, preamble_file, output_format="pdf"):
         """
         Create a PDF file from latex text
+
+        :param output_format: "pdf", or "dvi"/ "xdv" for a DVI file (see output_format())
         """
 
-        with logger.debug("Converting .tex to .pdf"):
-            # Read preamble
-            preamble_file = os.path.abspath(preamble_file)
-            preamble = ""
+        with logger.debug("Converting .tex to .%s", output_format):
+            preamble = self.read_preamble(preamble_file)
+            snippet_lines = (self.first_snippet_line(preamble), latex_text.count("\n") + 1)
+            self.run_tex(tex_command, preamble, self.DOCUMENT_TEMPLATE % (preamble, latex_text), output_format,
+                         snippet_lines)
 
-            if os.path.isfile(preamble_file):
-                with open(preamble_file, 'r') as f:
-                    preamble += f.read()
+    def first_snippet_line(self, preamble):
+        """ :return: The line of the tex file (starting at 1) where the snippet starts """
+        marker = "\0"
+        return (self.DOCUMENT_TEMPLATE % (preamble, marker)).split(marker)[0].count("\n") + 1
 
-            # Add default document class to preamble if necessary
-            if not _contains_document_class(preamble):
-                preamble = self.DEFAULT_DOCUMENT_CLASS + preamble
+    def tex_to_svg(self, tex_command, latex_text, preamble_file):
+        """
+        Create the SVG file tmp.svg from latex text, via DVI and dvisvgm if the dvisvgm backend
+        is selected and supports the tex command, otherwise via PDF and inkscape.
 
-            # Options pass to LaTeX-related commands
+        :return: The program which created the SVG file ("dvisvgm" or "inkscape")
+        """
+        output_format = self.output_format(tex_command)
+        if output_format != "pdf":
+            self.tex_to_pdf(tex_command, latex_text, preamble_file, output_format)
+            try:
+                self.dvi_to_svg(output_format)
+                return "dvisvgm"
+            except TexTextCommandError as error:
+                logger.warning("dvisvgm failed, falling back to inkscape: %s" % str(error))
 
-            texwrapper = self.DOCUMENT_TEMPLATE % (preamble, latex_text)
+        self.tex_to_pdf(tex_command, latex_text, preamble_file)
+        self.pdf_to_svg()
+        return "inkscape"
 
-            # Convert TeX to PDF
+    def output_format(self, tex_command):
+        """
+        :return: The format tex_to_svg compiles to: "dvi", "xdv" (DVI of xelatex) or "pdf"
+        """
+        engine = os.path.splitext(os.path.basename(tex_command))[0].lower()
+        if self.dvisvgm is None or engine not in self.DVI_OPTIONS:
+            return "pdf"
+        return "xdv" if engine == "xelatex" else "dvi"
 
-            # Write tex
-            with open(self.tmp('tex'), mode='w', encoding='utf-8') as f_tex:
-                f_tex.write(texwrapper)
+    def svg_converter_name(self, tex_command):
+        """ :return: Name of the program tex_to_svg uses to create the SVG file """
+        return "inkscape" if self.output_format(tex_command) == "pdf" else "dvisvgm"
 
-            # Exec tex_command: tex -> pdf
+    @metrics.timed("tex_to_pdf_batch")
+    def tex_to_pdf_batch(self, tex_command, latex_texts, preamble_file, output_format="pdf"):
+        """
+        Create a multi-page PDF file from several snippets sharing the same preamble in as few
+        LaTeX runs as possible: Snippet i is typeset on its own page.
+
+        Each snippet is typeset in a group after resetting the standard counters, so local
+        definitions, font switches and equation numbers do not leak into the next snippet.
+        Snippets making global assignments (see BATCH_EXCLUDE_REGEX) are not batched.
+
+        LaTeX stops at the first error, hence the snippet containing the error is located by
+        the line number reported in the log and compiled on its own to confirm the error. It is
+        then removed from the document and the remaining snippets are compiled again.
+
+        :param tex_command: Path to the TeX executable
+        :param latex_texts: List of snippets
+        :param preamble_file: Path to the preamble file
+        :param output_format: "pdf", or "dvi"/ "xdv" for a DVI file (see output_format())
+        :return: List with one entry per snippet: The page number (1-based) of the snippet in the
+                 PDF file, a TexTextConversionError if the snippet cannot be compiled or None if
+                 the snippet must be compiled on its own. The latter happens for all remaining
+                 snippets if an error cannot be attributed to a single snippet or the PDF file
+                 does not have exactly one page per snippet (e.g. for empty snippets or snippets
+                 producing page breaks).
+        """
+        with logger.debug("Converting %d snippets to a multi-page .pdf", len(latex_texts)):
+            preamble = self.read_preamble(preamble_file)
+
+            # Line of the tex file where the body of the document starts
+            first_line = self.first_snippet_line(preamble)
+
+            results = [None] * len(latex_texts)
+            pending = [index for index, text in enumerate(latex_texts)
+                       if self.BATCH_EXCLUDE_REGEX.search(text) is None]
+
+            while pending:
+                # First line of each pending snippet incl. the line opening its group
+                start_lines = []
+                line = first_line + self.BATCH_HEADER.count("\n") + 1
+                for index in pending:
+                    start_lines.append(line)
+                    line += latex_texts[index].count("\n") + 3
+
+                body = "\n".join([self.BATCH_HEADER] + [self.BATCH_PAGE_TEMPLATE % latex_texts[index]
+                                                        for index in pending])
+                try:
+                    # Only the line of the first error is required to locate the failing snippet
+                    self.run_tex(tex_command, preamble, self.DOCUMENT_TEMPLATE % (preamble, body), output_format,
+                                 first_error_only=True)
+                except TexTextConversionError as error:
+                    errors = error.diagnostics.errors() if error.diagnostics is not None else []
+                    error_line = errors[0].tex_line if errors else None
+                    position = bisect.bisect_right(start_lines, error_line or 0) - 1
+                    if error_line is None or position < 0 or error_line >= line:
+                        # error in the preamble or at \end{document}
+                        logger.debug("Cannot attribute the error to a snippet: %s", error)
+                        break
+
+                    # TeX often reports an error after its cause, e.g. for runaway arguments
+                    index = pending[position]
+                    logger.debug("Error in line %d, compiling snippet %d on its own", error_line, index)
+                    try:
+                        self.tex_to_pdf(tex_command, latex_texts[index], preamble_file, output_format)
+                    except TexTextConversionError as snippet_error:
+                        results[pending.pop(position)] = snippet_error
+                        continue
+                    logger.debug("Snippet %d compiles on its own, the error is caused by another snippet", index)
+                    break
+
+                num_pages = self.parse_pdf_page_count()
+                if num_pages != len(pending):
+                    logger.debug("%d snippets produced %s pages", len(pending), num_pages)
+                    break
+
+                for page, index in enumerate(pending, start=1):
+                    results[index] = page
+                break
+
+            return results
+
+    def read_preamble(self, preamble_file):
+        """
+        :return: The content of the preamble file, prefixed by the default document class if it
+                 does not contain one
+        """
+        preamble_file = os.path.abspath(preamble_file)
+        preamble = ""
+
+        if os.path.isfile(preamble_file):
+            with open(preamble_file, 'r') as f:
+                preamble += f.read()
+
+        # Add default document class to preamble if necessary
+        if not _contains_document_class(preamble):
+            preamble = self.DEFAULT_DOCUMENT_CLASS + preamble
+
+        return preamble
+
+    def run_tex(self, tex_command, preamble, texwrapper, output_format="pdf", snippet_lines=None,
+                first_error_only=False):
+        """
+        Compiles the tex document `texwrapper` with the given preamble into tmp.pdf (or
+        tmp.dvi/ tmp.xdv if output_format is "dvi"/ "xdv")
+
+        :param snippet_lines: (first line, number of lines) of the snippet in texwrapper, used to
+                              map the line numbers of the diagnostics of a failed run to the snippet
+        :param first_error_only: If True, the diagnostics of a failed run contain the first error only
+        :raises: TexTextConversionError with the diagnostics of the LaTeX log
+        """
+        # Write tex
+        with open(self.tmp('tex'), mode='w', encoding='utf-8') as f_tex:
+            f_tex.write(texwrapper)
+
+        format_file = self.preamble_format(tex_command, preamble)
+
+        # Exec tex_command: tex -> pdf
+        try:
+            
+            # Previously, the LATEX_OPTIONS were appended to the end of the command. This causes issues 
+            # then the -shell-escape option is used. For some reason, it seems to only be recognized when 
+            # appearing before the input file. Therefore, there options are added in between the command 
+            # and the input file path here.
+            command = [tex_command, *self.LATEX_OPTIONS, self.tmp('tex')]
+            if format_file is not None:
+                command.insert(1, "-fmt=%s" % format_file)
+            if output_format != "pdf":
+                engine = os.path.splitext(os.path.basename(tex_command))[0].lower()
+                command[1:1] = self.DVI_OPTIONS[engine]
+            result = run_command(command, cwd=self.tmp_dir, **self.command_limits)
+            logger.debug("%s finished after %.2f s", os.path.basename(tex_command), result.elapsed)
+            
+        except TexTextCommandTimeout as error:
+            raise TexTextConversionError(str(error), error.return_code, error.stdout, error.stderr)
+
+        except TexTextCommandFailed as error:
+            
+            if os.path.exists(self.tmp('log')):
+                diagnostics = self.parse_pdf_diagnostics(snippet_lines, first_error_only)
+                message = "TeX compilation failed. See stdout output for more details"
+                if diagnostics is not None and diagnostics.first_error is not None:
+                    message = diagnostics.first_error
+                raise TexTextConversionError(message, error.return_code, error.stdout, error.stderr,
+                                             diagnostics)
+            else:
+                raise TexTextConversionError(str(error), error.return_code, error.stdout, error.stderr)
+
+        if not os.path.exists(self.tmp(output_format)):
+            raise TexTextConversionError("%s didn't produce output %s" % (tex_command, self.tmp(output_format)))
+
+    def preamble_format(self, tex_command, preamble):
+        """
+        Returns the path to a format file containing the precompiled preamble, builds it
+        if it does not exist yet. The format is built via the mylatexformat package. When
+        a document is compiled with this format everything up to \\begin{document} is skipped,
+        hence the snippet can be compiled from exactly the same tex file as without format.
+
+        :param tex_command: Path to the TeX executable
+        :param preamble: The full preamble incl. the document class
+        :return: Path to the format file or None if precompilation is disabled, not supported
+                 by the TeX command or failed
+        """
+        if self.format_cache is None or not self.format_cache.enabled:
+            return None
+
+        engine = os.path.splitext(os.path.basename(tex_command))[0].lower()
+        if engine not in self.FORMAT_ENGINES:
+            return None
+
+        # The key changes whenever the preamble, the TeX installation or the options
+        # change, so outdated formats are rebuilt automatically (and evicted later)
+        key = RenderCache.make_key(__version__, engine, preamble, file_fingerprint(tex_command),
+                                   list(self.LATEX_OPTIONS))
+
+        format_file = self.format_cache.get(key, "fmt")
+        if format_file is not None:
+            return format_file
+
+        # Failures are remembered per location of mylatexformat.ltx, so installing the
+        # package (the usual reason for failures) triggers a new attempt
+        failed_key = RenderCache.make_key(key, self.find_tex_file(tex_command, "mylatexformat.ltx"))
+        if self.format_cache.get(failed_key, "failed") is not None:
+            logger.debug("Building format for this preamble failed previously, compile without format")
+            return None
+
+        with logger.debug("Precompiling preamble into format file"):
+            preamble_tex = self.tmp_base + "-preamble"
+            with open(preamble_tex + ".tex", mode='w', encoding='utf-8') as f_tex:
+                f_tex.write(self.DOCUMENT_TEMPLATE % (preamble, ""))
+
+            command = [tex_command, "-ini", "-jobname=%s" % os.path.basename(preamble_tex), *self.LATEX_OPTIONS,
+                       "&%s" % engine, "mylatexformat.ltx", preamble_tex + ".tex"]
             try:
-                
-                # Previously, the LATEX_OPTIONS were appended to the end of the command. This causes issues 
-                # then the -shell-escape option is used. For some reason, it seems to only be recognized when 
-                # appearing before the input file. Therefore, there options are added in between the command 
-                # and the input file path here.
-                command = [tex_command, *self.LATEX_OPTIONS, self.tmp('tex')]
-                exec_command(command)
-                
-            except TexTextCommandFailed as error:
-                
-                if os.path.exists(self.tmp('log')):
-                    parsed_log = self.parse_pdf_log()
-                    raise TexTextConversionError(parsed_log, error.return_code, error.stdout, error.stderr)
-                else:
-                    raise TexTextConversionError(str(error), error.return_code, error.stdout, error.stderr)
+                exec_command(command, cwd=self.tmp_dir, **self.command_limits)
+            except TexTextCommandError as error:
+                logger.warning("Cannot precompile preamble (is the LaTeX package mylatexformat installed?): %s"
+                               % str(error))
 
-            if not os.path.exists(self.tmp('pdf')):
-                raise TexTextConversionError("%s didn't produce output %s" % (tex_command, self.tmp('pdf')))
+            if not os.path.isfile(preamble_tex + ".fmt"):
+                # Remember the failure so we do not retry on each run with this preamble
+                with open(preamble_tex + ".failed", "w"):
+                    pass
+                self.format_cache.put(failed_key, "failed", preamble_tex + ".failed")
+                return None
 
+            return os.path.abspath(self.format_cache.put(key, "fmt", preamble_tex + ".fmt"))
+
+    def find_tex_file(self, tex_command, filename):
+        """
+        :param tex_command: Path to the TeX executable, kpsewhich is searched next to it
+        :param filename: Name of the file to look up, e.g. "mylatexformat.ltx"
+        :return: Path of the file in the TeX installation as reported by kpsewhich or None
+                 if it cannot be found. The result is cached for the lifetime of the process.
+        """
+        key = (tex_command, filename)
+        if key not in TexToPdfConverter._tex_files:
+            kpsewhich = os.path.join(os.path.dirname(tex_command), "kpsewhich")
+            try:
+                output = exec_command([kpsewhich, filename], cwd=self.tmp_dir, **self.command_limits)
+                path = output.decode("utf-8", errors="replace").strip() or None
+            except TexTextCommandError:
+                path = None
+            TexToPdfConverter._tex_files[key] = path
+        return TexToPdfConverter._tex_files[key]
+
+    @metrics.timed("typ_to_any")
     def typ_to_any(self, typst_command, typst_text, preamble_file, file_type):
         """
         Create a PDF file from latex text
@@ -613,27 +1417,101 @@ class TexToPdfConverter:
 
             # Exec tex_command: tex -> pdf
             try:
-                exec_command([typst_command, "compile", self.tmp('typ'), self.tmp(file_type)])
+                result = run_command([typst_command, "compile", self.tmp('typ'), self.tmp(file_type)],
+                                     cwd=self.tmp_dir, **self.command_limits)
+                logger.debug("%s finished after %.2f s", os.path.basename(typst_command), result.elapsed)
             except TexTextCommandFailed as error:
                 raise TexTextConversionError(str(error), error.return_code, error.stdout, error.stderr)
 
             if not os.path.exists(self.tmp(file_type)):
                 raise TexTextConversionError("%s didn't produce output %s" % (typst_command, self.tmp(file_type)))
 
-    def pdf_to_svg(self):
-        """Convert the PDF file to a SVG file"""
+    @metrics.timed("pdf_to_svg")
+    def pdf_to_svg(self, page=1, svg_file=None):
+        """
+        Convert one page of the PDF file to a SVG file
+
+        :param page: The page number (1-based)
+        :param svg_file: Name of the SVG file, defaults to tmp.svg
+        """
+        if svg_file is None:
+            svg_file = self.tmp('svg')
+
+        # The shell imports the first page only: the page is selected by the start option --pages
+        # and there is no action changing it. Hence, the pages after the first of a multi-page
+        # batch (see tex_to_pdf_batch) are imported by a new inkscape process each.
+        if self.inkscape_shell is not None and page == 1:
+            try:
+                self.inkscape_shell.export(self.tmp('pdf'), svg_file, "svg",
+                                           text_to_path=True, area_drawing=True)
+                return
+            except TexTextCommandError as error:
+                logger.warning("Inkscape shell failed, falling back to inkscape command: %s" % str(error))
+
         kwargs = dict()
-        kwargs["export_filename"] = self.tmp('svg')
+        kwargs["export_filename"] = svg_file
         kwargs["pdf_poppler"] = True
-        kwargs["pages"] = 1
+        kwargs["pages"] = page
         kwargs["export_type"] = "svg"
         kwargs["export_text_to_path"] = True
         kwargs["export_area_drawing"] = True
 
         ixc.inkscape(self.tmp('pdf'), **kwargs)
 
-    def pdf_to_png(self, white_bg):
-        """Convert the PDF file to a PNG file"""
+    @metrics.timed("dvi_to_svg")
+    def dvi_to_svg(self, output_format="dvi", page=1, svg_file=None):
+        """
+        Convert one page of the DVI file to a SVG file via dvisvgm. Glyphs are converted
+        to paths which are referenced via <use> elements.
+
+        :param output_format: "dvi" or "xdv", see output_format()
+        :param page: The page number (1-based)
+        :param svg_file: Name of the SVG file, defaults to tmp.svg
+        """
+        if svg_file is None:
+            svg_file = self.tmp('svg')
+
+        exec_command([self.dvisvgm, "--no-fonts", "--exact-bbox", "--page=%d" % page,
+                      "--output=%s" % svg_file, self.tmp(output_format)],
+                     cwd=self.tmp_dir, **self.command_limits)
+
+        if not os.path.exists(svg_file):
+            raise TexTextConversionError("dvisvgm didn't produce output %s" % svg_file)
+
+    @metrics.timed("pdf_to_png")
+    def pdf_to_png(self, white_bg, max_size=None):
+        """
+        Convert the PDF file to a PNG file
+
+        Uses the poppler tools if available (see preview_rasterizer), otherwise inkscape.
+
+        :param (bool) white_bg: set background to white if True
+        :param max_size: (width, height) in pixels of the preview area, see PopplerRasterizer.render
+        """
+        available_converters = getattr(self.checker, "available_pdf_to_png_converters", None) or {}
+        rasterizer = find_rasterizer(available_converters, self.command_limits)
+        if rasterizer is not None and rasterizer.supports(white_bg):
+            try:
+                with logger.debug("Rendering preview with %s", rasterizer.name):
+                    rasterizer.render(self.tmp('pdf'), self.tmp('png'), white_bg, max_size)
+                return
+            except TexTextCancelledError:
+                raise
+            except TexTextCommandError as error:
+                logger.warning("Preview rendering with %s failed, falling back to inkscape: %s"
+                               % (rasterizer.name, str(error)))
+
+        if self.inkscape_shell is not None:
+            try:
+                # Export settings persist in the shell, hence always set the background explicitly
+                self.inkscape_shell.export(self.tmp('pdf'), self.tmp('png'), "png",
+                                           dpi=300, area_drawing=True,
+                                           background="white" if white_bg else None,
+                                           background_opacity=1.0 if white_bg else 0.0)
+                return
+            except TexTextCommandError as error:
+                logger.warning("Inkscape shell failed, falling back to inkscape command: %s" % str(error))
+
         kwargs = dict()
         kwargs["export_filename"] = self.tmp('png')
         kwargs["pdf_poppler"] = True
@@ -647,21 +1525,35 @@ class TexToPdfConverter:
 
         ixc.inkscape(self.tmp('pdf'), **kwargs)
 
-    def parse_pdf_log(self):
+    def parse_pdf_diagnostics(self, snippet_lines=None, first_error_only=False):
         """
-        Strip down tex output to only the first error etc. and discard all the noise
-        :return: string containing the error message and some context lines after it
+        Parses all messages of the LaTeX log, only the lines containing messages are
+        decoded (see LatexLogParser.iter_file_messages)
+
+        :param snippet_lines: (first line, number of lines) of the snippet in the tex file
+        :param first_error_only: If True, the log is only read up to the first error
+        :return: LatexDiagnostics or None if the log cannot be read
         """
         with logger.debug("Parsing LaTeX log file"):
-            from .texoutparse import LatexLogParser
-            parser = LatexLogParser()
-
+            from .diagnostics import LatexDiagnostics
+            first_snippet_line, num_snippet_lines = snippet_lines or (None, None)
             try:
-                with open(self.tmp('log'), encoding='utf8') as f:
-                    parser.process(f)
-                return parser.errors[0]
-            except Exception as ignored:
-                return "TeX compilation failed. See stdout output for more details"
+                return LatexDiagnostics.from_log_file(self.tmp('log'), first_snippet_line, num_snippet_lines,
+                                                      first_error_only)
+            except Exception as error:
+                logger.debug("Cannot parse the log file: %s", error)
+                return None
+
+    def parse_pdf_page_count(self):
+        """
+        :return: The number of pages of the PDF file according to the LaTeX log or None
+        """
+        try:
+            with open(self.tmp('log'), encoding='utf8', errors='replace') as f:
+                match = re.search(r"^Output written on .*?\((\d+) pages?", f.read(), re.MULTILINE | re.DOTALL)
+        except (OSError, IOError):
+            return None
+        return int(match.group(1)) if match is not None else None
 
 
 def _contains_document_class(preamble):
@@ -680,25 +1572,131 @@ def _contains_document_class(preamble):
     return False
 
 
+def compile_snippet(text, preamble_file, tex_command, tex_executable, format_cache=None, inkscape_shell=None,
+                    dvisvgm=None, command_limits=None):
+    """
+    Converts a single snippet to SVG in a temporary directory. Used by the batch recompilation,
+    hence it is a module level function which can be executed in a worker process and it never
+    raises but returns the error message.
+
+    :param text: The TeX/ typst code
+    :param preamble_file: Absolute path to the preamble file
+    :param tex_command: The tex command ("pdflatex", "typst", ...)
+    :param tex_executable: Path to the executable of tex_command
+    :param (RenderCache) format_cache: Cache for precompiled preambles
+    :param (InkscapeShell) inkscape_shell: Persistent inkscape process, only usable in the main process
+    :param dvisvgm: Path to dvisvgm if the dvisvgm backend is used
+    :param command_limits: Limits of the TeX/ typst/ dvisvgm runs, see TexToPdfConverter
+    :return: (content of the SVG file as bytes, None, svg converter) or (None, error message, None),
+             the svg converter is the program which created the SVG ("inkscape" or "dvisvgm")
+    """
+    try:
+        with ChangeToTemporaryDirectory():
+            converter = TexToPdfConverter(None, format_cache, inkscape_shell, dvisvgm, command_limits)
+            if tex_command == "typst":
+                converter.typ_to_any(tex_executable, text, preamble_file, 'svg')
+                svg_converter = converter.svg_converter_name(tex_executable)
+            else:
+                svg_converter = converter.tex_to_svg(tex_executable, text, preamble_file)
+            with open(converter.tmp('svg'), 'rb') as f:
+                return f.read(), None, svg_converter
+    except Exception as error:
+        # Exceptions with additional constructor arguments (e.g. TexTextCommandFailed)
+        # cannot be passed back from a worker process, hence return the message only
+        return None, str(error) or error.__class__.__name__, None
+
+
+def compile_snippet_batch(texts, preamble_file, tex_command, tex_executable, format_cache=None, inkscape_shell=None,
+                          dvisvgm=None, command_limits=None):
+    """
+    Converts several snippets sharing preamble and tex command to SVG. The snippets are compiled
+    into one multi-page PDF file in a single LaTeX run (see TexToPdfConverter.tex_to_pdf_batch)
+    which is split into one SVG file per page. Snippets which cannot be typeset this way are
+    compiled one by one.
+
+    :param texts: List of snippets
+    :return: List with one entry per snippet: (content of the SVG file as bytes, None, svg converter) or
+             (None, error message, None), see compile_snippet
+    """
+    if len(texts) > 1 and tex_command != "typst":
+        try:
+            with ChangeToTemporaryDirectory():
+                converter = TexToPdfConverter(None, format_cache, inkscape_shell, dvisvgm, command_limits)
+                output_format = converter.output_format(tex_executable)
+                pages = converter.tex_to_pdf_batch(tex_executable, texts, preamble_file, output_format)
+
+                results = []
+                for text, page in zip(texts, pages):
+                    if page is None:
+                        results.append(compile_snippet(text, preamble_file, tex_command, tex_executable,
+                                                       format_cache, inkscape_shell, dvisvgm, command_limits))
+                        continue
+                    if isinstance(page, TexTextError):
+                        results.append((None, str(page), None))
+                        continue
+                    svg_file = "page-%d.svg" % page
+                    try:
+                        if output_format == "pdf":
+                            converter.pdf_to_svg(page, svg_file)
+                        else:
+                            converter.dvi_to_svg(output_format, page, svg_file)
+                        with open(svg_file, 'rb') as f:
+                            results.append((f.read(), None, converter.svg_converter_name(tex_executable)))
+                    except Exception as error:
+                        results.append((None, str(error) or error.__class__.__name__, None))
+                return results
+
+        except Exception as error:
+            logger.debug("Cannot compile snippets in one run, compiling them one by one: %s", error)
+
+    return [compile_snippet(text, preamble_file, tex_command, tex_executable, format_cache, inkscape_shell, dvisvgm,
+                            command_limits)
+            for text in texts]
+
+
+def compile_snippet_batch_in_worker(metrics_enabled, texts, preamble_file, tex_command, tex_executable, **kwargs):
+    """
+    Runs compile_snippet_batch in a worker process. Worker processes exit without running atexit
+    handlers, hence the measurements are returned and merged into the metrics of the main process.
+    The same applies to the log records, which are kept in memory (see init_worker_process).
+
+    :param (bool) metrics_enabled: If the measurements are recorded
+    :return: (result of compile_snippet_batch, list of measurements, list of log records)
+    """
+    metrics.enabled = metrics_enabled
+    metrics.take_records()  # measurements inherited from the main process (fork)
+    with metrics.labels(tex_command=tex_command):
+        results = compile_snippet_batch(texts, preamble_file, tex_command, tex_executable, **kwargs)
+    return results, metrics.take_records(), take_deferred_records()
+
+
 class TexTextElement(inkex.Group):
     tag_name = "g"
 
-    def __init__(self, svg_filename, document_unit):
+    # Prefix of the ids of glyphs shared via the <defs> of the document
+    SHARED_GLYPH_PREFIX = "textext-glyph-"
+
+    # Inheritable style properties moved from shared glyphs to the <use> elements referencing them
+    GLYPH_STYLE_PROPERTIES = ("fill", "fill-opacity", "fill-rule", "stroke", "stroke-opacity", "stroke-width")
+
+    def __init__(self, svg_content, document_unit, keep_glyphs=False):
         """
-        :param svg_filename: The name of the file containing the svg-snippet
+        :param (bytes) svg_content: The content of the svg file of the snippet
         :param document_unit: String specifying the unit of the document into which the node is going
                               to be placed ("mm", "pt", ...)
+        :param keep_glyphs: If True, <use> elements referencing glyphs are not expanded so the glyphs
+                            can be shared via share_glyphs() once the node has been placed in the document
         """
         super(TexTextElement, self).__init__()
-        self._svg_to_textext_node(svg_filename, document_unit)
+        self._svg_to_textext_node(svg_content, document_unit, keep_glyphs)
 
-    def _svg_to_textext_node(self, svg_filename, document_unit):
+    @metrics.timed("svg_to_textext_node")
+    def _svg_to_textext_node(self, content, document_unit, keep_glyphs=False):
         from inkex import ShapeElement, Defs, SvgDocumentElement
-        doc = etree.parse(svg_filename, parser=inkex.SVG_PARSER)
 
-        root = doc.getroot()
+        root = etree.fromstring(content, parser=inkex.SVG_PARSER)
 
-        TexTextElement._expand_defs(root)
+        TexTextElement._expand_defs(root, keep_glyphs)
 
         shape_elements = [el for el in root if isinstance(el, (ShapeElement, Defs))]
         root.append(self)
@@ -706,7 +1704,7 @@ class TexTextElement(inkex.Group):
         for el in shape_elements:
             self.append(el)
 
-        self.make_ids_unique()
+        self.make_ids_unique(content)
 
         self.pure_hlines_to_paths()
 
@@ -716,60 +1714,172 @@ class TexTextElement(inkex.Group):
         self.transform.add_scale(root.uutounit("1{}".format(root.unit), document_unit))
 
     @staticmethod
-    def _expand_defs(root):
+    def _expand_defs(root, keep_glyphs=False):
         from inkex import Transform, ShapeElement
         from copy import deepcopy
-        for el in root:
+        for el in list(root):
+            if isinstance(el, inkex.Use) and keep_glyphs and TexTextElement._glyph_style(el.href) is not None:
+                continue
+
             if isinstance(el, inkex.Use):
                 # <group> element will replace <use> node
                 group = inkex.Group()
 
-                # add all objects from symbol node
-                for obj in el.href:
-                    group.append(deepcopy(obj))
+                href = el.href
+                if isinstance(href, (inkex.Symbol, inkex.Group)):
+                    # add all objects from symbol node (Inkscape)
+                    for obj in href:
+                        group.append(deepcopy(obj))
+                elif href is not None:
+                    # dvisvgm references the glyph paths directly
+                    obj = deepcopy(href)
+                    obj.attrib.pop("id", None)
+                    group.append(obj)
 
                 # translate group
-                group.transform = Transform(translate=(float(el.get("x", "0")), float(el.get("y", "0"))))
+                group.transform = Transform(el.get("transform")) @ \
+                    Transform(translate=(float(el.get("x", "0")), float(el.get("y", "0"))))
 
-                # replace use node with group node
-                parent = el.getparent()
-                parent.remove(el)
-                parent.add(group)
+                # replace use node with group node at the same position
+                el.getparent().replace(el, group)
 
                 el = group  # required for recursive defs
 
             # expand children defs
-            TexTextElement._expand_defs(el)
+            TexTextElement._expand_defs(el, keep_glyphs)
 
-    def make_ids_unique(self):
+    @staticmethod
+    def _glyph_style(definition):
         """
-        PDF->SVG converters tend to use same ids.
-        To avoid confusion between objects with same id from two or more TexText objects we replace auto-generated
-        ids with random unique values
+        Checks if definition is a glyph which can be shared: a <path> (dvisvgm), a <symbol> (Inkscape)
+        or a <g> (poppler/ cairo) consisting of paths only, all with the same inheritable style
+        properties (GLYPH_STYLE_PROPERTIES)
+
+        :return: dict of these style properties or None if the glyph cannot be shared
         """
-        rename_map = {}
+        if isinstance(definition, inkex.PathElement):
+            paths = [definition]
+        elif isinstance(definition, (inkex.Symbol, inkex.Group)) and len(definition) and \
+                all(isinstance(child, inkex.PathElement) for child in definition):
+            paths = list(definition)
+        else:
+            return None
+
+        styles = []
+        for path in paths:
+            style = {name: path.get(name) for name in TexTextElement.GLYPH_STYLE_PROPERTIES
+                     if path.get(name) is not None}
+            style.update({name: value for name, value in inkex.Style(path.get("style", "")).items()
+                          if name in TexTextElement.GLYPH_STYLE_PROPERTIES})
+            styles.append(style)
+
+        if any(style != styles[0] for style in styles):
+            return None
+        return styles[0]
+
+    @metrics.timed("share_glyphs")
+    def share_glyphs(self, svg):
+        """
+        Moves the glyphs referenced by <use> elements of this node into the <defs> of the document
+        where identical glyphs (same path data) of all TexText nodes are stored only once.
 
-        # replace all ids with unique random uuid
-        for el in self.iterfind('.//*[@id]'):
-            old_id = el.attrib["id"]
-            new_id = 'id-' + str(uuid.uuid4())
-            el.attrib["id"] = new_id
-            rename_map[old_id] = new_id
+        The fill and stroke properties of the glyphs are moved to the <use> elements so the glyph
+        definitions inherit them and colorizing the node in Inkscape works as for expanded glyphs.
+        Must be called after the node has been placed in the document.
 
-        # find usages of old ids and replace them
-        def replace_old_id(m):
-            old_name = m.group(1)
-            try:
-                replacement = rename_map[old_name]
-            except KeyError:
-                replacement = old_name
-            return "url(#{})".format(replacement)
-        regex = re.compile(r"url\(#([^)(]*)\)")
+        :param (inkex.SvgDocumentElement) svg: The document
+        """
+        from copy import deepcopy
+
+        local_definitions = {el.get("id"): el for el in self.iter() if el.get("id") is not None}
+        defs = svg.defs
+        shared_ids = {el.get("id") for el in defs if el.get("id", "").startswith(self.SHARED_GLYPH_PREFIX)}
+        glyphs = {}  # local id -> (shared id, style) or None if the glyph cannot be shared
+
+        for use in [el for el in self.iter() if isinstance(el, inkex.Use)]:
+            href = use.get("xlink:href") or ""
+            local_id = href[1:]
+            if not href.startswith("#") or local_id not in local_definitions:
+                continue
+
+            if local_id not in glyphs:
+                definition = local_definitions[local_id]
+                style = self._glyph_style(definition)
+                if style is None:
+                    glyphs[local_id] = None
+                    continue
+
+                glyph = deepcopy(definition)
+                for el in glyph.iter():
+                    el.attrib.pop("id", None)
+                    el_style = inkex.Style(el.get("style", ""))
+                    for name in self.GLYPH_STYLE_PROPERTIES:
+                        el.attrib.pop(name, None)
+                        el_style.pop(name, None)
+                    if el_style:
+                        el.set("style", str(el_style))
+                    else:
+                        el.attrib.pop("style", None)
+
+                shared_id = self.SHARED_GLYPH_PREFIX + hashlib.sha1(etree.tostring(glyph)).hexdigest()[:16]
+                if shared_id not in shared_ids:
+                    glyph.set("id", shared_id)
+                    glyph.set("inkscape:collect", "always")  # removed by Inkscape once unused
+                    defs.append(glyph)
+                    shared_ids.add(shared_id)
+                definition.getparent().remove(definition)
+                glyphs[local_id] = (shared_id, style)
+
+            if glyphs[local_id] is None:
+                continue
+            shared_id, style = glyphs[local_id]
+
+            use.set("xlink:href", "#" + shared_id)
+            if style:
+                # Properties of the glyph override the inherited ones of the <use> element
+                use_style = inkex.Style(use.get("style", ""))
+                use_style.update(style)
+                for name in style:
+                    use.attrib.pop(name, None)
+                use.set("style", str(use_style))
+
+    @metrics.timed("make_ids_unique")
+    def make_ids_unique(self, content, index=0):
+        """
+        PDF->SVG converters tend to use same ids.
+        To avoid confusion between objects with same id from two or more TexText objects we replace auto-generated
+        ids with a prefix derived from the SVG content of this node followed by a counter. Hence, converting
+        the same snippet again yields the same ids.
 
-        for el in self.iter():
-            for name, value in el.items():
-                new_value = regex.sub(replace_old_id, value)
-                el.attrib[name] = new_value
+        :param (bytes) content: The SVG file this node has been created from
+        :param index: Distinguishes nodes with the same content, see make_ids_unique_in
+        """
+        rename_ids(self, content_id_prefix(content, index))
+
+    def make_ids_unique_in(self, content, used_ids, replaced=None):
+        """
+        Renames the ids of this node again if elements of the document already use its id prefix,
+        e.g. a copy of a node with the same snippet. Must be called before the node is placed in
+        the document since inkex renames duplicate ids on insertion without updating references.
+
+        :param (bytes) content: The SVG file this node has been created from
+        :param (set) used_ids: The ids used in the document (see TexText.document_ids), the ids of
+                               this node are added
+        :param replaced: The node which is going to be replaced by this node, its ids are ignored
+        """
+        ignored_ids = set()
+        if replaced is not None:
+            ignored_ids = {el.get("id") for el in replaced.iter() if el.get("id") is not None}
+        num_ids = sum(1 for el in self.iterdescendants() if el.get("id") is not None)
+        index = 0
+        while True:
+            ids = [content_id_prefix(content, index) + str(counter) for counter in range(num_ids)]
+            if not any(new_id in used_ids and new_id not in ignored_ids for new_id in ids):
+                break
+            index += 1
+        if index:
+            self.make_ids_unique(content, index)
+        used_ids.update(el.get("id") for el in self.iterdescendants() if el.get("id") is not None)
 
     def get_jacobian_sqrt(self):
         from inkex import Transform
@@ -808,6 +1918,7 @@ class TexTextElement(inkex.Group):
                 return default
             raise attr_error
 
+    @metrics.timed("align_to_node")
     def align_to_node(self, ref_node, alignment, relative_scale):
         """
         Aligns the node represented by self to a reference node according to the settings defined by the user
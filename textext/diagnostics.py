@@ -0,0 +1,141 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+
+Structured messages of a failed LaTeX run with the line numbers of the
+tex file mapped back to the lines of the snippet.
+"""
+import re
+
+from .texoutparse import LatexLogParser
+
+# Warnings mention their line as "... on input line 12.", possibly in a continuation line
+INPUT_LINE_REGEX = re.compile(r"on input line (\d+)")
+
+
+class Diagnostic(object):
+    """ One message of the LaTeX log """
+
+    def __init__(self, category, text, tex_line=None, snippet_line=None, log_message=None):
+        """
+        :param category: One of the LatexLogParser categories (error, warning, badbox, missing_ref)
+        :param text: Short description of the message
+        :param tex_line: The line of the tex file the message refers to or None
+        :param snippet_line: The line of the snippet (starting at 1) the message refers to,
+                             None if the message refers to the preamble or has no line
+        :param log_message: The LogFileMessage parsed from the log
+        """
+        self.category = category
+        self.text = text
+        self.tex_line = tex_line
+        self.snippet_line = snippet_line
+        self.log_message = log_message
+
+    def __str__(self):
+        location = "line {}: ".format(self.snippet_line) if self.snippet_line is not None else ""
+        return "{}{}: {}".format(location, self.category.replace("_", " "), self.text)
+
+
+class LatexDiagnostics(object):
+    """
+    All errors, warnings, bad boxes and missing references of a LaTeX log in the
+    order of the log.
+
+    The snippet is typeset in the tex file starting at line first_snippet_line
+    (after the preamble, see TexToPdfConverter.DOCUMENT_TEMPLATE), so the snippet
+    line of a message is its tex line minus this offset.
+    """
+
+    def __init__(self, first_snippet_line=None, num_snippet_lines=None):
+        """
+        :param first_snippet_line: The line of the tex file containing the first line of the
+                                   snippet, messages get no snippet lines if None
+        :param num_snippet_lines: The number of lines of the snippet
+        """
+        self.first_snippet_line = first_snippet_line
+        self.num_snippet_lines = num_snippet_lines
+        self.diagnostics = []
+        self.first_error = None
+
+    @classmethod
+    def from_log_file(cls, filename, first_snippet_line=None, num_snippet_lines=None, first_error_only=False):
+        """
+        Parses the LaTeX log file
+
+        :param first_error_only: If True, the log is only read up to the first error and the
+                                 other messages are skipped
+        :return: LatexDiagnostics
+        """
+        diagnostics = cls(first_snippet_line, num_snippet_lines)
+        parser = LatexLogParser()
+        categories = [LatexLogParser.ERROR] if first_error_only else None
+        for message in parser.iter_file_messages(filename, first_error_only, categories):
+            diagnostics.add(message)
+        return diagnostics
+
+    def add(self, message):
+        """ Adds a LogFileMessage of LatexLogParser """
+        if message.category == LatexLogParser.ERROR and self.first_error is None:
+            self.first_error = message
+        tex_line = self.tex_line(message)
+        self.diagnostics.append(Diagnostic(message.category, self.describe(message), tex_line,
+                                           self.snippet_line(tex_line), message))
+
+    @staticmethod
+    def tex_line(message):
+        """ :return: The line of the tex file a LogFileMessage refers to or None """
+        info = message.info
+        try:
+            if message.category == LatexLogParser.BADBOX:
+                return int(info["lines"][0])
+            if message.category == LatexLogParser.WARNING:
+                # the first context line is the message itself, "(package)" lines continue it
+                for index, line in enumerate(message.context_lines):
+                    if index > 0 and not line.startswith("("):
+                        break
+                    match = INPUT_LINE_REGEX.search(line)
+                    if match is not None:
+                        return int(match.group(1))
+                return None
+            return int(info["line"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def describe(message):
+        """ :return: Short description of a LogFileMessage """
+        info = message.info
+        if message.category == LatexLogParser.BADBOX:
+            return "{}full \\{}box ({})".format(info.get("type"), info.get("direction"), info.get("by"))
+        if message.category == LatexLogParser.MISSING_REF:
+            return "{} `{}'".format(info.get("type"), info.get("key"))
+        return info.get("message", "")
+
+    def snippet_line(self, tex_line):
+        """ :return: The line of the snippet (starting at 1) for a line of the tex file or None """
+        if tex_line is None or self.first_snippet_line is None:
+            return None
+        line = tex_line - self.first_snippet_line + 1
+        if line < 1 or (self.num_snippet_lines is not None and line > self.num_snippet_lines):
+            return None
+        return line
+
+    def errors(self):
+        return [diagnostic for diagnostic in self.diagnostics if diagnostic.category == LatexLogParser.ERROR]
+
+    def error_lines(self):
+        """ :return: Sorted list of the snippet lines containing errors """
+        return sorted(set(diagnostic.snippet_line for diagnostic in self.errors()
+                          if diagnostic.snippet_line is not None))
+
+    def __len__(self):
+        return len(self.diagnostics)
+
+    def __str__(self):
+        return "\n".join(str(diagnostic) for diagnostic in self.diagnostics)
@@ -38,9 +38,23 @@ class TexTextCommandFailed(TexTextCommandError):
         self.stderr = stderr
 
 
+class TexTextCommandTimeout(TexTextCommandFailed):
+    """ A command has been killed because it exceeded its time limit """
+    pass
+
+
 class TexTextConversionError(TexTextCommandFailed):
-    def __init__(self, message, return_code=None, stdout=None, stderr=None):
+    def __init__(self, message, return_code=None, stdout=None, stderr=None, diagnostics=None):
+        """
+        :param diagnostics: LatexDiagnostics with all messages of the LaTeX log, if available
+        """
         super(TexTextConversionError, self).__init__(message, return_code, stdout, stderr)
+        self.diagnostics = diagnostics
+
+
+class TexTextCancelledError(TexTextCommandError):
+    """ A command has been cancelled via a CancelToken, e.g. an outdated preview """
+    pass
 
 
 class TexTextFatalError(TexTextError):
@@ -0,0 +1,213 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+
+Keeps an Inkscape process in shell mode (inkscape --shell) alive
+so PDF imports/exports do not pay Inkscape's startup time each time.
+"""
+import atexit
+import collections
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+
+from .errors import TexTextCommandError, TexTextCommandFailed, TexTextCommandNotFound
+from .utility import NestedLoggingGuard, PLATFORM, WINDOWS
+
+
+class InkscapeShell(object):
+    """
+    Feeds actions to a persistent `inkscape --shell` process.
+
+    The process is started on first use and restarted if it died or did not answer
+    within `timeout` seconds. At most `max_pending` commands may wait for the process,
+    further callers are rejected with TexTextCommandError.
+    """
+
+    PROMPT = b"> "
+
+    def __init__(self, executable, options=None, timeout=60, max_pending=8, logger=None):
+        """
+        :param executable: Path to the inkscape executable
+        :param options: Additional command line options for the shell process
+        :param timeout: Seconds to wait for the shell to execute one command
+        :param max_pending: Maximum number of commands queued for the shell
+        :param (NestedLoggingGuard) logger: Logger for diagnostic messages
+        """
+        self.executable = executable
+        self.options = ["--pdf-poppler", "--pages=1"] if options is None else options
+        self.timeout = timeout
+        self.logger = logger if logger is not None else NestedLoggingGuard(logging.getLogger("TexText"))
+
+        self._process = None
+        self._stdout_queue = None
+        self._stderr_lines = collections.deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._atexit_registered = False
+
+    def is_alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """ (Re-)starts the shell process and waits for its first prompt """
+        self.close()
+        with self.logger.debug("Starting inkscape shell"):
+            info = None
+            if PLATFORM == WINDOWS:
+                info = subprocess.STARTUPINFO()
+                info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+                info.wShowWindow = subprocess.SW_HIDE
+
+            env = dict(os.environ)
+            env["SELF_CALL"] = "true"  # same as inkex.command: avoids recursive extension calls
+            try:
+                self._process = subprocess.Popen([self.executable, "--shell"] + self.options,
+                                                 stdin=subprocess.PIPE,
+                                                 stdout=subprocess.PIPE,
+                                                 stderr=subprocess.PIPE,
+                                                 startupinfo=info,
+                                                 env=env)
+            except OSError as err:
+                self._process = None
+                raise TexTextCommandNotFound("Command %s failed: %s" % (self.executable, err))
+
+            self._stdout_queue = queue.Queue()
+            self._stderr_lines.clear()
+            threading.Thread(target=self._read_stdout, args=(self._process, self._stdout_queue),
+                             daemon=True).start()
+            threading.Thread(target=self._read_stderr, args=(self._process,), daemon=True).start()
+
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+            self._wait_for_prompt("startup")
+
+    def execute(self, actions):
+        """
+        Executes a list of inkscape actions, e.g. ["file-open:a.pdf", "export-do"]
+
+        :return: Output of the shell for these actions
+        :raises: TexTextCommandError if the queue is full or an action contains a character the
+                 shell would split it at (the shell cannot escape them), TexTextCommandFailed if
+                 the shell crashed or timed out (it is restarted on the next call)
+        """
+        for action in actions:
+            if ";" in action or "\n" in action or "\r" in action:
+                raise TexTextCommandError("Action `%s` cannot be passed to the inkscape shell" % action)
+
+        if not self._pending.acquire(timeout=self.timeout):
+            raise TexTextCommandError("Too many commands waiting for the inkscape shell")
+        try:
+            with self._lock:
+                if not self.is_alive():
+                    if self._process is not None:
+                        self.logger.warning("Inkscape shell died (code %s), restarting" % self._process.returncode)
+                    self.start()
+
+                command = "; ".join(actions)
+                self.logger.debug("inkscape shell: %s" % command)
+                try:
+                    self._process.stdin.write(command.encode("utf-8") + b"\n")
+                    self._process.stdin.flush()
+                except (OSError, ValueError) as err:
+                    self._kill()
+                    raise TexTextCommandFailed("Inkscape shell is not available: %s" % err, return_code=None)
+                return self._wait_for_prompt(command)
+        finally:
+            self._pending.release()
+
+    def export(self, input_file, output_file, export_type, **options):
+        """
+        Opens input_file, exports it to output_file and closes it again
+
+        :param export_type: "svg", "png", ...
+        :param options: Export options without the "export-" prefix, e.g. dpi=300. Boolean
+                        options are passed without value if True and omitted if False.
+        """
+        actions = ["file-open:%s" % os.path.abspath(input_file),
+                   "export-filename:%s" % os.path.abspath(output_file),
+                   "export-type:%s" % export_type]
+        for name, value in options.items():
+            name = "export-" + name.replace("_", "-")
+            if value is True:
+                actions.append(name)
+            elif value is not False and value is not None:
+                actions.append("%s:%s" % (name, value))
+        actions += ["export-do", "file-close"]
+
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        output = self.execute(actions)
+        if not os.path.isfile(output_file):
+            raise TexTextCommandFailed("Inkscape shell did not export `%s`" % output_file, return_code=None,
+                                       stdout=output, stderr="\n".join(self._stderr_lines).encode("utf-8"))
+
+    def close(self):
+        """ Asks the shell to quit and kills it if it does not """
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            try:
+                self._process.stdin.write(b"quit\n")
+                self._process.stdin.flush()
+                self._process.wait(timeout=5)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                pass
+        self._kill()
+
+    def _kill(self):
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+                self._process.wait()
+            for stream in (self._process.stdin, self._process.stdout, self._process.stderr):
+                try:
+                    stream.close()
+                except (OSError, ValueError):
+                    pass
+        self._process = None
+
+    def _wait_for_prompt(self, command):
+        output = b""
+        deadline = time.time() + self.timeout
+        while not output.endswith(self.PROMPT):
+            try:
+                chunk = self._stdout_queue.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                self._kill()
+                raise TexTextCommandFailed("Inkscape shell did not answer within %d s to `%s`"
+                                           % (self.timeout, command), return_code=None, stdout=output)
+            if not chunk:  # EOF
+                self._kill()
+                raise TexTextCommandFailed("Inkscape shell terminated while executing `%s`" % command,
+                                           return_code=None, stdout=output,
+                                           stderr="\n".join(self._stderr_lines).encode("utf-8"))
+            output += chunk
+        return output[:-len(self.PROMPT)]
+
+    @staticmethod
+    def _read_stdout(process, stdout_queue):
+        fd = process.stdout.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 4096)
+            except (OSError, ValueError):
+                chunk = b""
+            stdout_queue.put(chunk)
+            if not chunk:
+                break
+
+    def _read_stderr(self, process):
+        for line in iter(process.stderr.readline, b""):
+            self._stderr_lines.append(line.decode("utf-8", "replace").rstrip())
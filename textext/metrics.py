@@ -0,0 +1,205 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+
+Records the duration of the stages of the conversion pipeline as
+JSON lines and summarizes them:
+
+    python -m textext.metrics [path/to/metrics.jsonl]
+
+prints the percentiles of the durations per stage and TeX command.
+"""
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# Labels (e.g. the TeX command) attached to all measurements of the current conversion
+_labels = contextvars.ContextVar("textext_metrics_labels", default={})
+
+
+class Metrics(object):
+    """
+    Collects counters and the durations of pipeline stages in memory and appends them
+    to a JSON lines file by flush(). A disabled instance records nothing, so the
+    instrumentation is almost free by default.
+    """
+
+    def __init__(self, filename=None, enabled=False, max_size=5 * 1024 * 1024):
+        """
+        :param filename: The JSON lines file the measurements are appended to
+        :param enabled: If False, nothing is recorded
+        :param max_size: If the file exceeds this size in bytes it is renamed to <filename>.1
+                         (replacing an older one) before writing
+        """
+        self.filename = filename
+        self.enabled = enabled
+        self.max_size = max_size
+        self.counters = collections.Counter()
+        self._records = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def labels(self, **labels):
+        """ Attaches labels to all measurements made in the `with` block (in this thread) """
+        token = _labels.set(dict(_labels.get(), **labels))
+        try:
+            yield
+        finally:
+            _labels.reset(token)
+
+    @contextlib.contextmanager
+    def stage(self, name, **labels):
+        """ Measures the duration of the `with` block as stage `name` """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, status=status, **labels)
+
+    def timed(self, name):
+        """ Decorator measuring each call of the function as stage `name` """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds, **labels):
+        """ Records a duration of stage `name` """
+        if not self.enabled:
+            return
+        record = dict(_labels.get(), **labels)
+        record.update(time=time.time(), stage=name, seconds=seconds)
+        with self._lock:
+            self._records.append(record)
+
+    def count(self, name, value=1, **labels):
+        """ Increments the counter `name` """
+        if not self.enabled:
+            return
+        record = dict(_labels.get(), **labels)
+        record.update(time=time.time(), counter=name, value=value)
+        with self._lock:
+            self.counters[name] += value
+            self._records.append(record)
+
+    def take_records(self):
+        """ Removes and returns the measurements not written yet, e.g. to pass them to another process """
+        with self._lock:
+            records, self._records = self._records, []
+        return records
+
+    def merge(self, records):
+        """ Adds measurements taken from another instance, e.g. of a worker process (see take_records) """
+        if not self.enabled:
+            return
+        with self._lock:
+            for record in records:
+                if "counter" in record:
+                    self.counters[record["counter"]] += record.get("value", 1)
+            self._records.extend(records)
+
+    def flush(self):
+        """ Appends the recorded measurements to the file, errors are ignored """
+        records = self.take_records()
+        if not records or not self.filename:
+            return
+        try:
+            if os.path.isfile(self.filename) and os.path.getsize(self.filename) > self.max_size:
+                os.replace(self.filename, self.filename + ".1")
+            with open(self.filename, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, sort_keys=True) + "\n" for record in records))
+        except (OSError, IOError, TypeError, ValueError):
+            pass
+
+
+def read_records(filename):
+    """ Yields the records of a metrics file, malformed lines are skipped """
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def percentile(sorted_values, p):
+    """ :return: The p-th percentile (0 <= p <= 100) of sorted values, interpolated linearly """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * p / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(records):
+    """
+    :return: (stages, counters): stages maps (stage, tex command) to the sorted durations in
+             seconds, counters maps (counter, tex command) to the summed values
+    """
+    stages = collections.defaultdict(list)
+    counters = collections.Counter()
+    for record in records:
+        tex_command = record.get("tex_command", "-")
+        if "stage" in record:
+            stages[(record["stage"], tex_command)].append(record["seconds"])
+        elif "counter" in record:
+            counters[(record["counter"], tex_command)] += record.get("value", 1)
+    for durations in stages.values():
+        durations.sort()
+    return stages, counters
+
+
+def print_report(records, out=sys.stdout):
+    stages, counters = summarize(records)
+    out.write("{:<24} {:<10} {:>7} {:>10} {:>10} {:>10} {:>10}\n".format(
+        "stage", "command", "count", "p50 [ms]", "p90 [ms]", "p99 [ms]", "max [ms]"))
+    for (stage, tex_command), durations in sorted(stages.items()):
+        out.write("{:<24} {:<10} {:>7} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}\n".format(
+            stage, tex_command, len(durations),
+            percentile(durations, 50) * 1000, percentile(durations, 90) * 1000,
+            percentile(durations, 99) * 1000, durations[-1] * 1000))
+    if counters:
+        out.write("\n{:<24} {:<10} {:>7}\n".format("counter", "command", "value"))
+        for (counter, tex_command), value in sorted(counters.items()):
+            out.write("{:<24} {:<10} {:>7}\n".format(counter, tex_command, value))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        filename = argv[0]
+    else:
+        from .requirements_check import defaults
+        filename = os.path.join(defaults.textext_logfile_path, "metrics.jsonl")
+    if not os.path.isfile(filename):
+        sys.stderr.write("No metrics recorded in `%s`. Set \"metrics\": true in config.json.\n" % filename)
+        return 1
+    print_report(read_records(filename))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
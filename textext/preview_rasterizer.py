@@ -0,0 +1,159 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+
+Renders the preview PNG with the poppler command line tools which
+start much faster than Inkscape.
+"""
+import math
+import os
+import re
+
+from .errors import TexTextConversionError
+from .utility import exec_command
+
+# Resolution used by Inkscape for the preview, never exceeded
+MAX_DPI = 300
+MIN_DPI = 30
+
+# Resolution of the grayscale image used to determine the bounding box of the drawing
+PROBE_DPI = 72
+
+
+def read_pgm(filename):
+    """
+    Reads a binary 8 bit grayscale image (PGM, format P5)
+
+    :return: (width, height, pixel data as bytes)
+    """
+    with open(filename, "rb") as f:
+        content = f.read()
+    # Header: magic number, width, height and maximum value separated by whitespace (comments allowed)
+    match = re.match(rb"P5(?:\s+|#[^\n]*\n)+(\d+)(?:\s+|#[^\n]*\n)+(\d+)(?:\s+|#[^\n]*\n)+(\d+)\s", content)
+    if match is None or int(match.group(3)) > 255:
+        raise TexTextConversionError("Cannot read the bounding box image `%s`" % filename)
+    width, height = int(match.group(1)), int(match.group(2))
+    return width, height, content[match.end():match.end() + width * height]
+
+
+def drawing_bbox(width, height, data):
+    """
+    Computes the bounding box of all non-white pixels of a grayscale image
+
+    :return: (left, top, right, bottom) in pixels (right and bottom exclusive) or None for a blank image
+    """
+    white = b"\xff" * width
+    left, top, right, bottom = width, None, 0, None
+    for y in range(height):
+        row = data[y * width:(y + 1) * width]
+        if row == white:
+            continue
+        if top is None:
+            top = y
+        bottom = y + 1
+        left = min(left, width - len(row.lstrip(b"\xff")))
+        right = max(right, len(row.rstrip(b"\xff")))
+    if top is None:
+        return None
+    return left, top, right, bottom
+
+
+class PopplerRasterizer(object):
+    """
+    Renders the first page of a PDF file cropped to its drawing via pdftoppm/ pdftocairo.
+
+    The bounding box of the drawing is determined from a low resolution grayscale rendering
+    of the page. pdftocairo is preferred since it can render transparent backgrounds.
+    """
+
+    name = "poppler"
+
+    def __init__(self, pdftoppm, pdftocairo=None, command_limits=None):
+        """
+        :param pdftoppm: Path to the pdftoppm executable
+        :param pdftocairo: Path to the pdftocairo executable (optional)
+        :param command_limits: dict with the limits (timeout, cpu_limit, memory_limit, max_output)
+                               of the poppler runs, see utility.run_command
+        """
+        self.pdftoppm = pdftoppm
+        self.pdftocairo = pdftocairo
+        self.command_limits = command_limits or {}
+
+    def supports(self, white_bg):
+        """ pdftoppm cannot render transparent backgrounds """
+        return white_bg or self.pdftocairo is not None
+
+    def render(self, pdf_file, png_file, white_bg, max_size=None):
+        """
+        Renders the first page of pdf_file into png_file
+
+        :param (bool) white_bg: Render on white background if True, otherwise on transparent background
+        :param max_size: (width, height) in pixels of the area the image is displayed in. The
+                         resolution is chosen so that the image fits into it (at most MAX_DPI).
+                         If None, MAX_DPI is used.
+        :raises: TexTextCommandError
+        """
+        bbox = self.probe(pdf_file)
+        if bbox is None:
+            raise TexTextConversionError("The snippet does not produce any output")
+
+        # One probe pixel margin to account for antialiasing and rounding
+        left, top, right, bottom = [value / float(PROBE_DPI) for value in
+                                    (bbox[0] - 1, bbox[1] - 1, bbox[2] + 1, bbox[3] + 1)]  # in inch
+        dpi = self.choose_dpi(right - left, bottom - top, max_size)
+
+        command = [self.pdftocairo or self.pdftoppm, "-png", "-singlefile", "-f", "1", "-l", "1",
+                   "-r", str(dpi),
+                   "-x", str(max(int(math.floor(left * dpi)), 0)),
+                   "-y", str(max(int(math.floor(top * dpi)), 0)),
+                   "-W", str(int(math.ceil((right - left) * dpi))),
+                   "-H", str(int(math.ceil((bottom - top) * dpi)))]
+        if self.pdftocairo is not None and not white_bg:
+            command.append("-transp")
+
+        png_base = os.path.splitext(png_file)[0]
+        exec_command(command + [pdf_file, png_base], **self.command_limits)
+        if png_base + ".png" != png_file:
+            os.replace(png_base + ".png", png_file)
+
+    def probe(self, pdf_file):
+        """
+        :return: Bounding box (left, top, right, bottom) of the drawing on the first page
+                 in pixels at PROBE_DPI or None if the page is blank
+        """
+        probe_base = os.path.splitext(pdf_file)[0] + "-probe"
+        exec_command([self.pdftoppm, "-gray", "-singlefile", "-f", "1", "-l", "1", "-r", str(PROBE_DPI),
+                      pdf_file, probe_base], **self.command_limits)
+        return drawing_bbox(*read_pgm(probe_base + ".pgm"))
+
+    @staticmethod
+    def choose_dpi(width, height, max_size):
+        """
+        :param width: Width of the drawing in inch
+        :param height: Height of the drawing in inch
+        :param max_size: (width, height) in pixels available for the image or None
+        :return: The resolution in dpi
+        """
+        if not max_size or width <= 0 or height <= 0:
+            return MAX_DPI
+        dpi = min(max_size[0] / width, max_size[1] / height)
+        return int(min(max(dpi, MIN_DPI), MAX_DPI))
+
+
+def find_rasterizer(available_converters, command_limits=None):
+    """
+    :param available_converters: dict with the paths of the available tools, e.g.
+                                 TexTextRequirementsChecker.available_pdf_to_png_converters
+    :param command_limits: Limits of the rasterizer runs, see PopplerRasterizer
+    :return: The fastest available rasterizer or None if Inkscape must be used
+    """
+    if available_converters.get("pdftoppm"):
+        return PopplerRasterizer(available_converters["pdftoppm"], available_converters.get("pdftocairo"),
+                                 command_limits)
+    return None
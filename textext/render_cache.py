@@ -0,0 +1,163 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+
+Persistent on-disk cache for the output of the TeX -> SVG/PNG
+conversion pipeline.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+
+def file_fingerprint(filename):
+    """
+    Cheap replacement for a version query of an executable: the absolute path,
+    modification time and size of the file. Changes whenever the executable is
+    updated, but does not require to launch a process.
+
+    :param filename: Path to the file
+    :return: list [path, mtime, size] or [path, None, None] if the file cannot be accessed
+    """
+    if not filename:
+        return [filename, None, None]
+    try:
+        st = os.stat(filename)
+        return [os.path.abspath(filename), st.st_mtime, st.st_size]
+    except OSError:
+        return [filename, None, None]
+
+
+def file_content(filename):
+    """ Returns the content of a file as str or an empty string if the file does not exist """
+    if filename and os.path.isfile(filename):
+        with open(filename, "rb") as f:
+            return f.read().decode("utf-8", "replace")
+    return ""
+
+
+class RenderCache(object):
+    """
+    Content addressed cache of rendered snippets.
+
+    Each entry is a single file `<key>.<suffix>` in `directory` where `key` is a hash of
+    everything which influences the rendering (text, preamble, converter, options, ...).
+    The modification time of an entry is updated on each hit, so it serves as LRU
+    timestamp when the cache exceeds `max_size` bytes and old entries are evicted.
+    """
+
+    def __init__(self, directory, max_size=50 * 1024 * 1024, enabled=True, logger=None):
+        """
+        :param directory: The directory the cached files are stored in (created on demand)
+        :param max_size: Maximum size of all cached files in bytes
+        :param enabled: If False, get() never hits and put() does not store anything
+        :param logger: Logger for diagnostic messages
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.enabled = enabled
+        self.logger = logger if logger is not None else logging.getLogger("TexText")
+
+    @staticmethod
+    def make_key(*components):
+        """
+        Computes a cache key from arbitrary json serializable components
+
+        :return: hex digest (str)
+        """
+        serialized = json.dumps(components, sort_keys=True, ensure_ascii=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, "{0}.{1}".format(key, suffix))
+
+    def get(self, key, suffix):
+        """
+        Looks up an entry
+
+        :return: Path to the cached file or None if there is no such entry
+        """
+        if not self.enabled:
+            return None
+        filename = self.path(key, suffix)
+        try:
+            os.utime(filename, None)  # mark as recently used
+        except OSError:
+            return None
+        self.logger.debug("Render cache hit `%s`" % filename)
+        return filename
+
+    def put(self, key, suffix, filename):
+        """
+        Stores a copy of `filename` in the cache. Errors are logged but never raised
+        since the cache is only an optimization.
+
+        :return: Path to the cached file, or `filename` if it could not be stored.
+        """
+        if not self.enabled:
+            return filename
+        target = self.path(key, suffix)
+        try:
+            if os.path.getsize(filename) > self.max_size:
+                self.logger.debug("`%s` exceeds the render cache size, not cached" % filename)
+                return filename
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary name first so concurrent readers never see partial files
+            tmp_target = "{0}.{1}.tmp".format(target, os.getpid())
+            shutil.copyfile(filename, tmp_target)
+            os.replace(tmp_target, target)
+        except (OSError, IOError) as err:
+            self.logger.warning("Cannot write render cache entry `%s`: %s" % (target, str(err)))
+            return filename
+        self.evict(keep=target)
+        return target
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used entries until the cache size is below `max_size`
+
+        :param keep: Path of an entry which is never removed, e.g. the one just stored
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        except OSError:
+            return
+
+        stats = []
+        total_size = 0
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            stats.append((st.st_mtime, st.st_size, entry.path))
+            total_size += st.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        for _, size, path in sorted(stats):
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total_size -= size
+                self.logger.debug("Evicted render cache entry `%s`" % path)
+            except OSError:
+                pass
+            if total_size <= self.max_size:
+                break
+
+    def clear(self):
+        """ Removes all entries """
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -12,11 +12,15 @@ Classes for handling and checking of the dependencies required
 to successfully run TexText.
 """
 import abc
+import concurrent.futures
 import logging
 import os
 import re
 import subprocess
 import sys
+import threading
+
+from .render_cache import file_fingerprint
 
 
 class Defaults(object):
@@ -70,7 +74,10 @@ class LinuxDefaults(Defaults):
                         "pdflatex": ["pdflatex"],
                         "lualatex": ["lualatex"],
                         "xelatex": ["xelatex"],
-                        "typst": ["typst"]
+                        "typst": ["typst"],
+                        "pdftoppm": ["pdftoppm"],
+                        "pdftocairo": ["pdftocairo"],
+                        "dvisvgm": ["dvisvgm"]
                         }
 
     @property
@@ -103,7 +110,10 @@ class MacDefaults(LinuxDefaults):
                         "pdflatex": ["pdflatex"],
                         "lualatex": ["lualatex"],
                         "xelatex": ["xelatex"],
-                        "typst": ["typst"]
+                        "typst": ["typst"],
+                        "pdftoppm": ["pdftoppm"],
+                        "pdftocairo": ["pdftocairo"],
+                        "dvisvgm": ["dvisvgm"]
                         }
 
     def get_system_path(self):
@@ -132,7 +142,10 @@ class WindowsDefaults(Defaults):
                         "pdflatex": ["pdflatex.exe"],
                         "lualatex": ["lualatex.exe"],
                         "xelatex": ["xelatex.exe"],
-                        "typst": ["typst.exe"]
+                        "typst": ["typst.exe"],
+                        "pdftoppm": ["pdftoppm.exe"],
+                        "pdftocairo": ["pdftocairo.exe"],
+                        "dvisvgm": ["dvisvgm.exe"]
                         }
 
     def __init__(self):
@@ -191,6 +204,67 @@ class WindowsDefaults(Defaults):
 
 
 
+class PathIndex(object):
+    """
+    Listings of the directories of the search path. Each directory is listed only once per
+    process, so looking up several programs needs one scandir call per directory instead of
+    one stat call per combination of program and directory. If a program is not found, the
+    directories modified since they have been listed are listed again, so programs installed
+    while the process runs are found.
+    """
+
+    def __init__(self):
+        self._listings = {}  # directory -> (modification time, names)
+        self._lock = threading.Lock()
+
+    def listing(self, directory, revalidate=False):
+        """
+        :param revalidate: If True, list the directory again if it has been modified since it
+                           has been listed
+        :return: frozenset of the (case normalized) names in directory, empty if it cannot be listed
+        """
+        with self._lock:
+            cached = self._listings.get(directory)
+            if cached is not None and revalidate and cached[0] != self._modification_time(directory):
+                cached = None
+            if cached is None:
+                mtime = self._modification_time(directory)
+                try:
+                    with os.scandir(directory) as entries:
+                        names = frozenset(os.path.normcase(entry.name) for entry in entries)
+                except OSError:
+                    names = frozenset()
+                cached = self._listings[directory] = (mtime, names)
+        return cached[1]
+
+    @staticmethod
+    def _modification_time(directory):
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def find(self, name, directories):
+        """
+        Yields the directories containing an entry `name` in the order of directories. Directories
+        are listed on demand, i.e. the ones after the first match are not listed if the caller stops.
+        """
+        name = os.path.normcase(name)
+        found = False
+        for directory in directories:
+            if name in self.listing(directory):
+                found = True
+                yield directory
+        if not found:
+            for directory in directories:
+                if name in self.listing(directory, revalidate=True):
+                    yield directory
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+
 class LoggingColors(object):
     enable_colors = False
 
@@ -468,9 +542,67 @@ class RequirementCheckResult(object):
         return self.kwargs[item]
 
 
+class DeferredLogger(object):
+    """
+    Logger proxy which collects the messages logged by a thread while it runs a function wrapped
+    by deferred(), so concurrently running requirement probes do not interleave their output. The
+    messages are emitted when the result of the function is picked up.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        method = getattr(self.logger, name)
+
+        def log_method(*args, **kwargs):
+            messages = getattr(self._local, "messages", None)
+            if messages is None:
+                return method(*args, **kwargs)
+            messages.append((method, args, kwargs))
+
+        return log_method
+
+    def deferred(self, func):
+        """
+        :return: Function calling func and returning a function which emits the collected
+                 messages and returns the result of func (or raises its exception)
+        """
+        def run():
+            self._local.messages = []
+            error = result = None
+            try:
+                result = func()
+            except Exception as err:
+                error = err
+            finally:
+                messages, self._local.messages = self._local.messages, None
+
+            def finish():
+                for method, args, kwargs in messages:
+                    method(*args, **kwargs)
+                if error is not None:
+                    raise error
+                return result
+
+            return finish
+
+        return run
+
+
+def _run_now(criteria):
+    def run():
+        result = criteria()
+        return lambda: result
+    return run
+
+
 class Requirement(object):
     def __init__(self, criteria, *args, **kwargs):
         self.criteria = lambda: criteria(*args, **kwargs)
+        self._operands = []
+        self._prefetched = None
         self._prepended_messages = {"ANY": [], "SUCCESS": [], "ERROR": [], "UNKNOWN": []}
         self._appended_messages = {"ANY": [], "SUCCESS": [], "ERROR": [], "UNKNOWN": []}
         self._overwrite_messages = None
@@ -480,7 +612,11 @@ class Requirement(object):
         self._on_failure_callbacks = []
 
     def check(self):
-        result = self.criteria()
+        if self._prefetched is not None:
+            result = self._prefetched.result()()
+            self._prefetched = None
+        else:
+            result = self.criteria()
         if not isinstance(result.messages,list):
             result.messages = [result.messages]
         if self._overwrite_messages:
@@ -508,6 +644,23 @@ class Requirement(object):
             result.messages += self._appended_messages["UNKNOWN"]
         return result
 
+    def prefetch(self, executor, defer=_run_now):
+        """
+        Starts evaluating the criteria of all leaves of the requirement tree on executor. check()
+        then picks up these results instead of evaluating the criteria one after another, callbacks
+        and messages are processed in the same order as without prefetching.
+
+        :param (concurrent.futures.Executor) executor: The executor running the criteria
+        :param defer: Wraps a criteria into the function running on the executor. That function
+                      returns a function which is called by check() and returns the result.
+        """
+        if self._operands:
+            for operand in self._operands:
+                operand.prefetch(executor, defer)
+        else:
+            self._prefetched = executor.submit(defer(self.criteria))
+        return self
+
     def prepend_message(self, result_type, message):
         assert result_type in self._prepended_messages.keys()
         if not isinstance(message, list):
@@ -539,7 +692,9 @@ class Requirement(object):
                                           is_and_node=True
                                           )
 
-        return Requirement(and_impl)
+        requirement = Requirement(and_impl)
+        requirement._operands = [self, rhs]
+        return requirement
 
     def __or__(self, rhs):
         # type: (Requirement) -> Requirement
@@ -552,7 +707,9 @@ class Requirement(object):
                                           is_or_node=True
                                           )
 
-        return Requirement(or_impl)
+        requirement = Requirement(or_impl)
+        requirement._operands = [self, rhs]
+        return requirement
 
     def __invert__(self):
         # type: (Requirement) -> Requirement
@@ -564,7 +721,9 @@ class Requirement(object):
                                           is_not_node=True
                                           )
 
-        return Requirement(invert_impl)
+        requirement = Requirement(invert_impl)
+        requirement._operands = [self]
+        return requirement
 
     def on_success(self, callback):
         self._on_success_callbacks.append(callback)
@@ -581,17 +740,28 @@ class Requirement(object):
 
 class TexTextRequirementsChecker(object):
 
-    def __init__(self, logger, config):
+    def __init__(self, logger, config, first_match=False):
+        """
+        :param logger: Logger for the results of the check
+        :param config: Settings, may contain the paths of the executables ("<program>-executable")
+        :param first_match: If True, stop searching the PATH for a program at its first location,
+                            otherwise all locations are reported
+        """
         self.logger = logger
         self.config = config
+        self.first_match = first_match
         self.available_tex_to_pdf_converters = {}
         self.available_pdf_to_svg_converters = {}
+        self.available_pdf_to_png_converters = {}
 
         self.inkscape_prog_name = "inkscape"
         self.pdflatex_prog_name = "pdflatex"
         self.lualatex_prog_name = "lualatex"
         self.xelatex_prog_name = "xelatex"
         self.typst_prog_name = "typst"
+        self.pdftoppm_prog_name = "pdftoppm"
+        self.pdftocairo_prog_name = "pdftocairo"
+        self.dvisvgm_prog_name = "dvisvgm"
 
         self.inkscape_executable = None
 
@@ -674,16 +844,18 @@ class TexTextRequirementsChecker(object):
 
     def _find_executable_in_path(self, prog_name):
         messages = []
+        system_path = defaults.get_system_path()
         for exe_name in defaults.executable_names[prog_name]:
             first_path = None
-            for path in defaults.get_system_path():
-                full_path_guess = os.path.join(path, exe_name)
-                self.logger.log(VERBOSE, "Looking for `%s` in `%s`" % (exe_name, path))
-                if self.check_executable(full_path_guess):
+            self.logger.log(VERBOSE, "Looking for `%s` in PATH" % exe_name)
+            for path in path_index.find(exe_name, system_path):
+                if self.check_executable(os.path.join(path, exe_name)):
                     self.logger.log(VERBOSE, "`%s` is found at `%s`" % (exe_name, path))
                     messages.append("`%s` is found at `%s`" % (exe_name, path))
                     if first_path is None:
                         first_path = path
+                    if self.first_match:
+                        break
             if first_path is not None:
                 return RequirementCheckResult(True, messages, path=os.path.join(first_path,exe_name))
             messages.append("`%s` is NOT found in PATH" % (exe_name))
@@ -692,14 +864,88 @@ class TexTextRequirementsChecker(object):
     def check_executable(self, filename):
         return filename is not None and os.path.isfile(filename) and os.access(filename, os.X_OK)
 
-    def check(self):
+    def results(self):
+        """ :return: dict with the results of check() (json serializable) """
+        return {
+            "inkscape_executable": self.inkscape_executable,
+            "available_tex_to_pdf_converters": self.available_tex_to_pdf_converters,
+            "available_pdf_to_svg_converters": self.available_pdf_to_svg_converters,
+            "available_pdf_to_png_converters": self.available_pdf_to_png_converters,
+            "pygtk_is_found": self.pygtk_is_found,
+            "tkinter_is_found": self.tkinter_is_found,
+        }
+
+    def environment_fingerprint(self, results):
+        """
+        Computes a fingerprint of everything the outcome of check() depends on using stat calls
+        only: the search path and the modification times of its directories (they change when
+        programs are installed or removed), the Python interpreter, the executables set in the
+        config and the executables found by check()
+
+        :param results: dict as returned by results()
+        :return: json serializable fingerprint
+        """
+        executables = [results["inkscape_executable"]]
+        for converters in ("available_tex_to_pdf_converters", "available_pdf_to_svg_converters",
+                           "available_pdf_to_png_converters"):
+            executables += results[converters].values()
+
+        system_path = defaults.get_system_path()
+        return {
+            "path": [file_fingerprint(path) for path in system_path],
+            "python": file_fingerprint(sys.executable),
+            "configured": {prog_name: self.config.get(prog_name + "-executable", None)
+                           for prog_name in sorted(defaults.executable_names)},
+            "executables": [file_fingerprint(exe) for exe in sorted(set(exe for exe in executables if exe))],
+        }
+
+    def cached_results(self):
+        """ :return: The results of check() together with the fingerprint of the environment """
+        results = self.results()
+        results["fingerprint"] = self.environment_fingerprint(results)
+        return results
+
+    def restore_cached_results(self, cached):
+        """
+        Restores the results of a previous check() from the output of cached_results() if the
+        environment has not changed since then
+
+        :return: True if the results have been restored, False if check() has to be run
+        """
+        try:
+            if cached["fingerprint"] != self.environment_fingerprint(cached):
+                return False
+            self.inkscape_executable = cached["inkscape_executable"]
+            self.available_tex_to_pdf_converters = cached["available_tex_to_pdf_converters"]
+            self.available_pdf_to_svg_converters = cached["available_pdf_to_svg_converters"]
+            self.available_pdf_to_png_converters = cached["available_pdf_to_png_converters"]
+            self.pygtk_is_found = cached["pygtk_is_found"]
+            self.tkinter_is_found = cached["tkinter_is_found"]
+        except (KeyError, TypeError, AttributeError):
+            return False
+        return True
+
+    def check(self, parallel=True):
+        """
+        Checks which programs are available
+
+        :param parallel: If True, the programs are probed in parallel threads (the output is the same)
+        :return: TrinaryLogicValue, True if all requirements are met
+        """
 
         def set_inkscape(exe):
             self.inkscape_executable = exe
+            self.available_pdf_to_svg_converters.update({"inkscape": exe})
 
         def add_latex(name, exe):
             self.available_tex_to_pdf_converters.update({name: exe})
 
+        def add_pdf_to_svg(name, exe):
+            self.available_pdf_to_svg_converters.update({name: exe})
+
+        def add_pdf_to_png(name, exe):
+            self.available_pdf_to_png_converters.update({name: exe})
+
         def set_pygtk(result):
             self.pygtk_is_found = True
 
@@ -762,19 +1008,53 @@ class TexTextRequirementsChecker(object):
             .append_message("ERROR", help_message_with_url("gui-library"))
         ).overwrite_check_message("TexText requirements")
 
-        check_result = textext_requirements.check()
+        # Optional tools, TexText falls back to inkscape if they are missing
+        optional_requirements = [
+            Requirement(self.find_executable, self.pdftoppm_prog_name)
+            .on_success(lambda result: add_pdf_to_png("pdftoppm", result["path"]))
+            .prepend_message("ANY", "Detect pdftoppm for fast previews (optional)"),
+            Requirement(self.find_executable, self.pdftocairo_prog_name)
+            .on_success(lambda result: add_pdf_to_png("pdftocairo", result["path"]))
+            .prepend_message("ANY", "Detect pdftocairo for fast previews with transparent background (optional)"),
+            Requirement(self.find_executable, self.dvisvgm_prog_name)
+            .on_success(lambda result: add_pdf_to_svg("dvisvgm", result["path"]))
+            .prepend_message("ANY", "Detect dvisvgm for the dvisvgm SVG backend (optional)"),
+        ]
 
-        check_result = check_result.flatten()
+        executor = None
+        logger = self.logger
+        if parallel:
+            # Probe all programs at once. The messages logged by the probes are emitted when
+            # check() picks up their results, i.e. in the same order as in a sequential check.
+            self.logger = DeferredLogger(logger)
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+            textext_requirements.prefetch(executor, self.logger.deferred)
+            for requirement in optional_requirements:
+                requirement.prefetch(executor, self.logger.deferred)
 
-        check_result.mark_critical_errors()
+        try:
+            check_result = textext_requirements.check()
 
-        check_result.print_to_logger(self.logger)
+            check_result = check_result.flatten()
+
+            check_result.mark_critical_errors()
+
+            check_result.print_to_logger(self.logger)
+
+            for requirement in optional_requirements:
+                requirement.check().flatten().print_to_logger(self.logger)
+        finally:
+            self.logger = logger
+            if executor is not None:
+                executor.shutdown(wait=True)
 
         return check_result.value
 
 
 get_levels_colors = LoggingColors()
 
+path_index = PathIndex()
+
 if sys.platform.startswith("win"):
     defaults = WindowsDefaults()
 elif sys.platform.startswith("darwin"):
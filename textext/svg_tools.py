@@ -0,0 +1,79 @@
+"""
+This file is part of TexText, an extension for the vector
+illustration program Inkscape.
+
+Copyright (c) 2006-2025 TexText developers.
+
+TexText is released under the 3-Clause BSD license. See
+file LICENSE.txt or go to https://github.com/textext/textext
+for full license details.
+
+Helpers working on plain (lxml/ ElementTree) SVG elements.
+"""
+import hashlib
+import re
+
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+# Attributes which may reference other elements via url(#id) or #id, all others are left alone
+URL_ATTRIBUTES = frozenset(["style", "clip-path", "mask", "fill", "stroke", "filter",
+                            "marker-start", "marker-mid", "marker-end"])
+HREF_ATTRIBUTES = frozenset([XLINK_HREF, "href"])
+
+URL_REGEX = re.compile(r"url\(\s*#([^)(\s]*)\s*\)")
+
+
+def content_id_prefix(content, index=0):
+    """
+    Deterministic prefix for the ids of one TexText node, so converting the same snippet
+    again yields the same ids
+
+    :param (bytes) content: The content the prefix is derived from, e.g. the SVG file of the snippet
+    :param index: Distinguishes nodes with the same content in one document, see
+                  TexTextElement.make_ids_unique_in
+    :return: The prefix, e.g. "id-0123456789ab-" or "id-0123456789ab-2-" for index 2
+    """
+    digest = hashlib.sha1(content).hexdigest()[:12]
+    return "id-{}-{}".format(digest, "{}-".format(index) if index else "")
+
+
+def rename_ids(root, prefix):
+    """
+    Replaces the ids of all descendants of root by prefix + counter and updates all
+    url(#id) and (xlink:)href="#id" references to them. References to ids not defined
+    below root are kept.
+
+    :param root: The element whose descendants are renamed (root itself is not)
+    :param prefix: Prefix of the new ids, see content_id_prefix
+    :return: dict mapping old to new ids
+    """
+    rename_map = {}
+    elements = []
+    for el in root.iter():
+        elements.append(el)
+        if el is root:
+            continue
+        old_id = el.get("id")
+        if old_id is not None:
+            new_id = "{}{}".format(prefix, len(rename_map))
+            el.set("id", new_id)
+            rename_map[old_id] = new_id
+
+    if not rename_map:
+        return rename_map
+
+    def replace_url(m):
+        return "url(#{})".format(rename_map.get(m.group(1), m.group(1)))
+
+    for el in elements:
+        attrib = el.attrib
+        for name in URL_ATTRIBUTES.intersection(attrib.keys()):
+            value = attrib[name]
+            if "url(" in value:
+                attrib[name] = URL_REGEX.sub(replace_url, value)
+        for name in HREF_ATTRIBUTES.intersection(attrib.keys()):
+            value = attrib[name]
+            if value.startswith("#") and value[1:] in rename_map:
+                attrib[name] = "#" + rename_map[value[1:]]
+
+    return rename_map
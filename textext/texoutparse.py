@@ -31,8 +31,11 @@ END OF LICENSE
 
 Adapted to be compatible with Python 2.7 by TexText developers
 """
+import mmap
 import re
+import sys
 from collections import deque
+from itertools import islice
 
 
 class LogFileMessage(object):
@@ -43,7 +46,10 @@ class LogFileMessage(object):
     the item notation.
     """
 
-    def __init__(self):
+    __slots__ = ("category", "info", "context_lines")
+
+    def __init__(self, category=None):
+        self.category = category
         self.info = {}
         self.context_lines = []
 
@@ -79,6 +85,24 @@ class _LineIterWrapper(object):
             self.current = current = next(self.iterable)
         return current
 
+    def lines(self):
+        """
+        Generator over the lines, faster than calling next() for each line
+        """
+        cache = self.cache
+        while True:
+            while cache:
+                self.current = line = cache.popleft()
+                yield line
+            for line in self.iterable:
+                self.current = line
+                yield line
+                if cache:
+                    # get_context() read ahead
+                    break
+            else:
+                return
+
     def next(self):
         return self.__next__()
 
@@ -87,6 +111,8 @@ class _LineIterWrapper(object):
 
     def get_context(self):
         rv = [self.current] if self.current else []
+        # lines read ahead by the previous call come first
+        rv.extend(islice(self.cache, self.ctx_lines + 1 - len(rv)))
         for _ in range(self.ctx_lines + 1 - len(rv)):
             try:
                 next_val = next(self.iterable)
@@ -97,6 +123,98 @@ class _LineIterWrapper(object):
         return rv
 
 
+class _MappedLogLines(object):
+    """
+    Lines of a log in a bytes buffer (e.g. an mmap of the log file). Only the
+    lines found by a regex and their context lines are decoded, all other lines
+    are skipped by the regex engine. Lines hard wrapped by TeX are joined.
+    """
+
+    def __init__(self, data, ctx_lines, line_start, message_start, max_print_line):
+        """
+        :param data: bytes like object containing the log
+        :param ctx_lines: Number of context lines returned by get_context
+        :param line_start: bytes regex matching the newline in front of the lines
+                           yielded by lines()
+        :param message_start: bytes regex matching the newline in front of any message,
+                              a line starting a message is never joined with the
+                              previous one
+        :param max_print_line: A line of this length (in bytes) is continued in the next
+                               line, no lines are joined if None
+        """
+        self.data = data
+        self.ctx_lines = ctx_lines
+        self.line_start = line_start
+        self.message_start = message_start
+        self.max_print_line = max_print_line or sys.maxsize
+        self.position = 0
+        self.current = None
+        # lines decoded by get_context by their start position
+        self.read_ahead = {}
+
+    def read_line(self, start):
+        """
+        :return: (position after the line, line decoded to str with a newline as line end)
+        """
+        data = self.data
+        end = data.find(b"\n", start) + 1
+        if 0 < end - start <= self.max_print_line:
+            # Too short to be wrapped, the common case
+            line = data[start:end]
+            if line.endswith(b"\r\n"):
+                line = line[:-2] + b"\n"
+            return end, line.decode("utf-8", "replace")
+
+        size = len(data)
+        pieces = []
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                pieces.append(data[start:])
+                end = size
+                break
+            content_end = end - 1 if end > start and data[end - 1] == 13 else end  # strip \r
+            if content_end - start != self.max_print_line or end + 1 >= size or \
+                    self.message_start.match(data, end) is not None:
+                # Not wrapped, a line may also have exactly max_print_line characters
+                pieces.append(data[start:content_end] + b"\n")
+                end += 1
+                break
+            pieces.append(data[start:content_end])
+            start = end + 1
+        return end, b"".join(pieces).decode("utf-8", "replace")
+
+    def lines(self):
+        data = self.data
+        # The first line has no newline in front, the message prefixes are shorter than 16 bytes
+        if self.line_start.match(b"\n" + data[:16]) is not None:
+            self.position, self.current = self.read_line(0)
+            yield self.current
+        search = self.line_start.search
+        while True:
+            # the newline in front of the next line is the last character of the current line
+            found = search(data, max(self.position - 1, 0))
+            if found is None:
+                return
+            start = found.start() + 1
+            line = self.read_ahead.get(start)
+            self.read_ahead.clear()
+            self.position, self.current = line or self.read_line(start)
+            yield self.current
+
+    def get_context(self):
+        rv = [self.current] if self.current else []
+        position = self.position
+        for _ in range(self.ctx_lines + 1 - len(rv)):
+            if position >= len(self.data):
+                break
+            start = position
+            position, line = self.read_line(start)
+            self.read_ahead[start] = position, line
+            rv.append(line)
+        return rv
+
+
 class LatexLogParser(object):
     """
     Parser for LaTeX Log files.
@@ -108,27 +226,63 @@ class LatexLogParser(object):
     """
 
     error = re.compile(
-            r"^(?:! ((?:La|pdf)TeX|Package|Class)(?: (\w+))? [eE]rror(?: \(([\\]?\w+)\))?: (.*)|! (.*))"
+            r"^(?:! (?P<error_type>(?:La|pdf)TeX|Package|Class)(?: (?P<error_name>\w+))? [eE]rror"
+            r"(?: \((?P<error_extra>[\\]?\w+)\))?: (?P<error_message>.*)|! (?P<tex_error_message>.*))"
             )
     warning = re.compile(
-            r"^((?:La|pdf)TeX|Package|Class)(?: (\w+))? [wW]arning(?: \(([\\]?\w+)\))?: (.*)"
+            r"^(?P<warning_type>(?:La|pdf)TeX|Package|Class)(?: (?P<warning_name>\w+))? [wW]arning"
+            r"(?: \((?P<warning_extra>[\\]?\w+)\))?: (?P<warning_message>.*)"
             )
 
     info = re.compile(
             r"^((?:La|pdf)TeX|Package|Class)(?: (\w+))? [iI]nfo(?: \(([\\]?\w+)\))?: (.*)"
             )
     badbox = re.compile(
-            r"^(Over|Under)full "
-            r"\\([hv])box "
-            r"\((?:badness (\d+)|(\d+(?:\.\d+)?pt) too \w+)\) (?:"
+            r"^(?P<badbox_type>Over|Under)full "
+            r"\\(?P<badbox_direction>[hv])box "
+            r"\((?:badness (?P<badbox_badness>\d+)|(?P<badbox_size>\d+(?:\.\d+)?pt) too \w+)\) (?:"
             r"(?:(?:in paragraph|in alignment|detected) "
-            r"(?:at lines (\d+)--(\d+)|at line (\d+)))"
-            r"|(?:has occurred while [\\]output is active [\[](\d+)?[\]]))"
+            r"(?:at lines (?P<badbox_first_line>\d+)--(?P<badbox_last_line>\d+)|at line (?P<badbox_line>\d+)))"
+            r"|(?:has occurred while [\\]output is active [\[](?P<badbox_page>\d+)?[\]]))"
             )
+    # Message categories which can be selected in iter_messages
+    ERROR = "error"
+    WARNING = "warning"
+    BADBOX = "badbox"
+    MISSING_REF = "missing_ref"
+    CATEGORIES = frozenset([ERROR, WARNING, BADBOX, MISSING_REF])
+
     missing_ref = re.compile(
-        r"^LaTeX Warning: (Citation|Reference) `([^']+)' on page (\d+) undefined on input line (\d+)\."
+        r"^LaTeX Warning: (?P<ref_type>Citation|Reference) `(?P<ref_key>[^']+)' on page (?P<ref_page>\d+) "
+        r"undefined on input line (?P<ref_line>\d+)\."
     )
 
+    # Order in which the message regexes are tried, missing refs are also warnings
+    # so they must come first. The category names are the names of the regexes.
+    DISPATCH_ORDER = (MISSING_REF, BADBOX, WARNING, ERROR)
+
+    # Most lines of a log start with none of these, so they are skipped without
+    # running a regex
+    MESSAGE_PREFIXES = ("LaTeX ", "pdfTeX ", "Package ", "Class ", "Overfull ", "Underfull ", "! ")
+
+    # Prefixes of the lines of the messages of each category
+    CATEGORY_PREFIXES = {
+        ERROR: ("! ",),
+        WARNING: ("LaTeX ", "pdfTeX ", "Package ", "Class "),
+        BADBOX: ("Overfull ", "Underfull "),
+        MISSING_REF: ("LaTeX ",),
+    }
+
+    # TeX wraps lines of the log after this number of characters (its
+    # max_print_line setting), see iter_file_messages
+    max_print_line = 79
+
+    # Combined regexes per (class, categories), see _dispatch_regex and _line_start_regex
+    _dispatch_regexes = {}
+    _line_start_regexes = {}
+    # TeX reports the input line of an error as "l.<number> <code>"
+    error_line = re.compile(r"^l\.(\d+)")
+
     def __init__(self, context_lines=2):
         self.warnings = []
         self.errors = []
@@ -149,51 +303,197 @@ class LatexLogParser(object):
 
         :param lines: Iterable over lines of log.
         """
-        lines_iterable = _LineIterWrapper(lines, self.context_lines)
+        for _ in self.iter_messages(lines):
+            pass
 
-        # cache the line processor for speed
-        process_line = self.process_line
+    def iter_messages(self, lines, stop_after_first_error=False, categories=None):
+        """
+        Process the lines of a logfile and yield the messages as they are found.
+
+        Lines are only read as far as the caller consumes the messages, so
+        looking for the first error does not require parsing the whole log.
+        The messages are also stored in the lists of the parser as in process.
+        An error is yielded when its "l.<number>" line has been read (or the
+        next error or the end of the log is reached), messages found in the
+        meantime are yielded after it.
+
+        :param lines: Iterable over lines of log.
+        :param stop_after_first_error: Stop reading after the first error.
+        :param categories: Iterable of the categories to report (ERROR, WARNING,
+                           BADBOX, MISSING_REF), all if None. Lines of other
+                           categories are skipped without creating messages.
+        """
+        categories = self._check_categories(categories)
+        return self._iter_messages(_LineIterWrapper(lines, self.context_lines),
+                                   stop_after_first_error, categories)
+
+    def iter_file_messages(self, filename, stop_after_first_error=False, categories=None):
+        """
+        Like iter_messages, but reads the log file via mmap: the lines which may
+        contain a message of the requested categories are found by a bytes regex,
+        only they and their context lines are decoded (as utf-8). Lines TeX has
+        hard wrapped at max_print_line are joined, so the messages are complete
+        (unless the next line starts a message itself).
+
+        The file is closed when the generator is exhausted or closed.
+
+        :param filename: Path to the log file.
+        """
+        categories = self._check_categories(categories)
+        with open(filename, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                return
+            with data:
+                lines = _MappedLogLines(data, self.context_lines, self._line_start_regex(categories),
+                                        self._line_start_regex(self.CATEGORIES), self.max_print_line)
+                for message in self._iter_messages(lines, stop_after_first_error, categories):
+                    yield message
+
+    def _check_categories(self, categories):
+        """
+        :return: The categories as frozenset, all if None
+        :raises: ValueError for unknown categories
+        """
+        if categories is None:
+            return self.CATEGORIES
+        categories = frozenset(categories)
+        if not categories <= self.CATEGORIES:
+            raise ValueError("Unknown message categories: {}".format(
+                ", ".join(sorted(categories - self.CATEGORIES))))
+        return categories
+
+    def _iter_messages(self, lines_iterable, stop_after_first_error, categories):
+        """
+        Implementation of iter_messages for a _LineIterWrapper or _MappedLogLines
+        """
+        # cache the line dispatch for speed
+        dispatch = self._dispatch_regex(categories).match
+        process_match = self._process_match
+        message_prefixes = self.MESSAGE_PREFIXES
 
-        for _, line in enumerate(lines_iterable):
+        # error which waits for its "l.<number>" line and the messages found meanwhile
+        pending_error = None
+        held_back = []
+
+        for line in lines_iterable.lines():
             if not line:
                 continue
-            err = process_line(line)
-            if err is not None:
-                err.context_lines = lines_iterable.get_context()
-
-    def process_line(self, line):
+            if pending_error is not None:
+                match = self.error_line.match(line)
+                if match is not None:
+                    pending_error['line'] = int(match.group(1))
+                    yield pending_error
+                    if stop_after_first_error:
+                        return
+                    pending_error = None
+                    for message in held_back:
+                        yield message
+                    del held_back[:]
+                    continue
+            if not line.startswith(message_prefixes):
+                continue
+            match = dispatch(line)
+            if match is None:
+                continue
+            message = process_match(match, categories)
+            if message is None:
+                continue
+            message.context_lines = lines_iterable.get_context()
+            if message.category != self.ERROR:
+                if pending_error is None:
+                    yield message
+                else:
+                    held_back.append(message)
+                continue
+            if pending_error is not None:
+                # The previous error has no line number
+                yield pending_error
+                if stop_after_first_error:
+                    return
+                for held_message in held_back:
+                    yield held_message
+                del held_back[:]
+            pending_error = message
+
+        if pending_error is not None:
+            yield pending_error
+            if stop_after_first_error:
+                return
+        for message in held_back:
+            yield message
+
+    def process_line(self, line, categories=None):
         """
         Process a line in the log file and delegate to correct handler.
 
-        Tests in turn matches to the badbox regex, warning regex, and
-        then error regex. Once a match is found, the corresponding
-        process function is called its result returned.
+        Lines starting with one of the MESSAGE_PREFIXES are matched against one
+        regex combining the missing ref, badbox, warning and error regexes (in
+        this order). The name of the matching alternative selects the process
+        function which is called and its result returned.
 
         :param line: Line to process
+        :param categories: Set of the categories to report, all if None
         :returns: LogFileMessage object or None
         """
+        if not line.startswith(self.MESSAGE_PREFIXES):
+            return None
 
-        # Missings refs are very common, try those first
-        match = self.missing_ref.match(line)
-        if match is not None:
-            return self.process_missing_ref(match)
-
-        # Badboxes are next most common, so match those first
-        match = self.badbox.match(line)
-        if match is not None:
-            return self.process_badbox(match)
-
-        # Now try warnings
-        match = self.warning.match(line)
-        if match is not None:
-            return self.process_warning(match)
+        match = self._dispatch_regex(categories).match(line)
+        if match is None:
+            return None
+        return self._process_match(match, self.CATEGORIES if categories is None else categories)
 
-        # Now try errors
-        match = self.error.match(line)
-        if match is not None:
-            return self.process_error(match)
+    def _process_match(self, match, categories):
+        """
+        Calls the process function of the category of a match of the dispatch regex
 
-        return None
+        :return: LogFileMessage object or None if the category is not in categories
+        """
+        category = match.lastgroup
+        if category not in categories:
+            # A missing ref while only warnings are requested
+            return None
+        return getattr(self, "process_" + category)(match)
+
+    @classmethod
+    def _dispatch_regex(cls, categories):
+        """
+        :param categories: Set of the categories to report, all if None
+        :return: The regex matching the messages of all categories, each alternative
+                 is a group named by its category
+        """
+        key = (cls, cls.CATEGORIES if categories is None else frozenset(categories))
+        regex = cls._dispatch_regexes.get(key)
+        if regex is None:
+            selected = set(key[1])
+            if cls.WARNING in selected:
+                selected.add(cls.MISSING_REF)
+            regex = re.compile("|".join("(?P<{}>{})".format(category, getattr(cls, category).pattern)
+                                        for category in cls.DISPATCH_ORDER if category in selected))
+            cls._dispatch_regexes[key] = regex
+        return regex
+
+    @classmethod
+    def _line_start_regex(cls, categories):
+        """
+        :param categories: Set of the categories to report
+        :return: bytes regex matching the newline in front of all lines which may contain
+                 a message of the categories or the line number of an error. It starts with
+                 a literal, so the regex engine only tries to match at newlines.
+        """
+        key = (cls, categories)
+        regex = cls._line_start_regexes.get(key)
+        if regex is None:
+            prefixes = set()
+            for category in categories:
+                prefixes.update(cls.CATEGORY_PREFIXES[category])
+            regex = re.compile(b"\n(?:" + b"|".join(re.escape(prefix.encode("ascii"))
+                                                    for prefix in sorted(prefixes)) + rb"|l\.\d)")
+            cls._line_start_regexes[key] = regex
+        return regex
 
     def process_badbox(self, match):
         """
@@ -204,27 +504,27 @@ class LatexLogParser(object):
         """
 
         # Regex match groups
-        # 0 - Whole match (line)
-        # 1 - Type (Over|Under)
-        # 2 - Direction ([hv])
-        # 3 - Underfull box badness (badness (\d+))
-        # 4 - Overfull box over size (\d+(\.\d+)?pt too \w+)
-        # 5 - Multi-line start line (at lines (\d+)--)
-        # 6 - Multi-line end line (--(d+))
-        # 7 - Single line (at line (\d+))
-
-        message = LogFileMessage()
-        message['type'] = match.group(1)
-        message['direction'] = match.group(2)
+        # badbox_type - Type (Over|Under)
+        # badbox_direction - Direction ([hv])
+        # badbox_badness - Underfull box badness (badness (\d+))
+        # badbox_size - Overfull box over size (\d+(\.\d+)?pt too \w+)
+        # badbox_first_line - Multi-line start line (at lines (\d+)--)
+        # badbox_last_line - Multi-line end line (--(d+))
+        # badbox_line - Single line (at line (\d+))
+
+        message = LogFileMessage(self.BADBOX)
+        message['type'] = match.group('badbox_type')
+        message['direction'] = match.group('badbox_direction')
 
         # direction is either h or v
-        message['by'] = match.group(3) or match.group(4)
+        message['by'] = match.group('badbox_badness') or match.group('badbox_size')
 
         # single or multi-line
-        if match.group(7) is not None:
-            message['lines'] = (match.group(7), match.group(7))
+        line = match.group('badbox_line')
+        if line is not None:
+            message['lines'] = (line, line)
         else:
-            message['lines'] = (match.group(5), match.group(6))
+            message['lines'] = (match.group('badbox_first_line'), match.group('badbox_last_line'))
 
         self.badboxes.append(message)
         return message
@@ -238,30 +538,28 @@ class LatexLogParser(object):
         """
 
         # Regex match groups
-        # 0 - Whole match (line)
-        # 1 - Type ((?:La|pdf)TeX|Package|Class)
-        # 2 - Package or Class name (\w*)
-        # 3 - extra
-        # 4 - Warning message (.*)
+        # warning_type - Type ((?:La|pdf)TeX|Package|Class)
+        # warning_name - Package or Class name (\w*)
+        # warning_extra - extra
+        # warning_message - Warning message (.*)
 
-        message = LogFileMessage()
-        message['type'] = type_ = match.group(1)
+        message = LogFileMessage(self.WARNING)
+        message['type'] = type_ = match.group('warning_type')
+        name = match.group('warning_name')
 
         if type_ == 'Package':
-            # package name should be group 2
-            message['package'] = match.group(2)
+            message['package'] = name
         elif type_ == 'Class':
-            # class should be group 2
-            message['class'] = match.group(2)
-        elif match.group(2) is not None:
+            message['class'] = name
+        elif name is not None:
             # In any other case we want to record the component responsible for
             # the warning, if one is present.
-            message['component'] = match.group(2)
+            message['component'] = name
 
-        if match.group(3) is not None:
-            message['extra'] = match.group(3)
+        if match.group('warning_extra') is not None:
+            message['extra'] = match.group('warning_extra')
 
-        message['message'] = match.group(4)
+        message['message'] = match.group('warning_message')
         self.warnings.append(message)
         return message
 
@@ -274,32 +572,31 @@ class LatexLogParser(object):
         """
 
         # Regex match groups
-        # 0 - Whole match (line)
-        # 1 - Type (LaTeX|Package|Class)
-        # 2 - Package or Class (\w+)
-        # 3 - extra (\(([\\]\w+)\))
-        # 4 - Error message for typed error (.*)
-        # 5 - TeX error message (.*)
-
-        message = LogFileMessage()
-        if match.group(1) is not None:
-            message['type'] = type_ = match.group(1)
+        # error_type - Type (LaTeX|Package|Class)
+        # error_name - Package or Class (\w+)
+        # error_extra - extra (\(([\\]\w+)\))
+        # error_message - Error message for typed error (.*)
+        # tex_error_message - TeX error message (.*)
+
+        message = LogFileMessage(self.ERROR)
+        type_ = match.group('error_type')
+        if type_ is not None:
+            message['type'] = type_
+            name = match.group('error_name')
 
             if type_ == 'Package':
-                # Package name should be group 2
-                message['package'] = match.group(2)
+                message['package'] = name
             elif type_ == 'Class':
-                # Class name should be group 2
-                message['class'] = match.group(2)
-            elif match.group(2) is not None:
-                message['component'] = match.group(2)
+                message['class'] = name
+            elif name is not None:
+                message['component'] = name
 
-            if match.group(3) is not None:
-                message['extra'] = match.group(3)
+            if match.group('error_extra') is not None:
+                message['extra'] = match.group('error_extra')
 
-            message['message'] = match.group(4)
+            message['message'] = match.group('error_message')
         else:
-            message['message'] = match.group(5)
+            message['message'] = match.group('tex_error_message')
 
         self.errors.append(message)
         return message
@@ -311,11 +608,11 @@ class LatexLogParser(object):
         :param match: regex match object to process
         :return: LogFileMessage object.
         """
-        message = LogFileMessage()
-        message["type"] = "Missing {grp}".format(grp=match.group(1))
-        message["key"] = match.group(2)
-        message["page"] = match.group(3)
-        message["line"] = match.group(4)
+        message = LogFileMessage(self.MISSING_REF)
+        message["type"] = "Missing {grp}".format(grp=match.group('ref_type'))
+        message["key"] = match.group('ref_key')
+        message["page"] = match.group('ref_page')
+        message["line"] = match.group('ref_line')
 
         self.missing_refs.append(message)
         return message
@@ -11,15 +11,20 @@ for full license details.
 Provides handlers for temp-dir management, logging, settings and
 system command execution
 """
+import collections
 import contextlib
+import contextvars
 import json
 import logging.handlers
 import os
 import platform
 import shutil
+import signal
 import stat
 import subprocess
 import tempfile
+import threading
+import time
 import re
 
 from .errors import *
@@ -88,21 +93,43 @@ class MyLogger(logging.Logger):
         return rv
 
 
+# Indentation of the messages logged via NestedLoggingGuard. Each thread (and asyncio task)
+# has its own value, so concurrent conversions do not mess up each other's nesting.
+_message_offset = contextvars.ContextVar("textext_message_offset", default=0)
+
+
 class NestedLoggingGuard(object):
-    message_offset = 0
+    """
+    Logs messages indented according to the nesting of `with` blocks. As with the logging
+    module, arguments of the message are merged into it only when the record is formatted,
+    e.g. logger.debug("text = %r", text), so disabled or deferred messages cost no formatting.
+
+    If `log_elapsed_time` is True, the message closing a `with` block contains the time
+    spent in the block.
+    """
     message_indent = 2
+    log_elapsed_time = False
 
-    def __init__(self, _logger, lvl=None, message=None):
+    def __init__(self, _logger, lvl=None, message=None, args=()):
         self._logger = _logger
         self._level = lvl
         self._message = message
+        self._args = args
+        self._token = None
+        self._start = None
         if lvl is not None and message is not None:
-            self._logger.log(self._level, " " * NestedLoggingGuard.message_offset + self._message)
+            self._logger.log(self._level, " " * _message_offset.get() + self._message, *self._args)
+
+    @property
+    def message_offset(self):
+        """ Current indentation of the messages in the calling thread """
+        return _message_offset.get()
 
     def __enter__(self):
         assert self._level is not None
         assert self._message is not None
-        NestedLoggingGuard.message_offset += NestedLoggingGuard.message_indent
+        self._token = _message_offset.set(_message_offset.get() + NestedLoggingGuard.message_indent)
+        self._start = time.perf_counter()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         assert self._level is not None
@@ -111,42 +138,83 @@ class NestedLoggingGuard(object):
             result = "done"
         else:
             result = "failed"
-        NestedLoggingGuard.message_offset -= NestedLoggingGuard.message_indent
+        if NestedLoggingGuard.log_elapsed_time:
+            result += " (%.1f ms)" % ((time.perf_counter() - self._start) * 1000)
+        _message_offset.reset(self._token)
 
         def tmp1():  # this nesting needed to even number of stack frames in __enter__ and __exit__
             def tmp2():
-                self._logger.log(self._level, " " * NestedLoggingGuard.message_offset + self._message.strip() + " " + result)
+                self._logger.log(self._level, " " * _message_offset.get() + self._message.strip() + " " + result,
+                                 *self._args)
             tmp2()
         tmp1()
 
-    def debug(self, message):
-        return self.log(logging.DEBUG, message)
+    def debug(self, message, *args):
+        return self.log(logging.DEBUG, message, *args)
 
-    def info(self, message):
-        return self.log(logging.INFO, message)
+    def info(self, message, *args):
+        return self.log(logging.INFO, message, *args)
 
-    def error(self, message):
-        return self.log(logging.ERROR, message)
+    def error(self, message, *args):
+        return self.log(logging.ERROR, message, *args)
 
-    def warning(self, message):
-        return self.log(logging.WARNING, message)
+    def warning(self, message, *args):
+        return self.log(logging.WARNING, message, *args)
 
-    def critical(self, message):
-        return self.log(logging.CRITICAL, message)
+    def critical(self, message, *args):
+        return self.log(logging.CRITICAL, message, *args)
 
-    def log(self, lvl, message):
-        return NestedLoggingGuard(self._logger, lvl, message)
+    def log(self, lvl, message, *args):
+        return NestedLoggingGuard(self._logger, lvl, message, args)
 
 
 class CycleBufferHandler(logging.handlers.BufferingHandler):
+    """
+    Keeps the last `capacity` log records in memory without formatting them, older
+    records are dropped. Used to show the messages to the user on errors.
+    """
+
+    # Escape sequences coloring the level names, see set_logging_levels
+    _COLOR_CODES = re.compile(r"\033\[[0-9;]*m")
 
     def __init__(self, capacity):
         super(CycleBufferHandler, self).__init__(capacity)
+        self.buffer = collections.deque(maxlen=capacity)
 
     def emit(self, record):
         self.buffer.append(record)
-        if len(self.buffer) > self.capacity:
-            self.buffer = self.buffer[-self.capacity:]
+
+    def flush(self):
+        self.acquire()
+        try:
+            self.buffer.clear()
+        finally:
+            self.release()
+
+    def records(self, level=logging.NOTSET, last=None):
+        """
+        :param level: Only records of at least this level
+        :param last: Only the last `last` of these records (all if None)
+        :return: list of logging.LogRecord, oldest first
+        """
+        self.acquire()
+        try:
+            records = [record for record in self.buffer if record.levelno >= level]
+        finally:
+            self.release()
+        if last is not None:
+            records = records[-last:] if last > 0 else []
+        return records
+
+    def to_json(self, level=logging.NOTSET, last=None):
+        """ :return: The records selected as in records() as JSON list of objects """
+        return json.dumps([{"time": record.created,
+                            "level": self._COLOR_CODES.sub("", record.levelname).strip(),
+                            "levelno": record.levelno,
+                            "message": record.getMessage(),
+                            "file": record.filename,
+                            "line": record.lineno}
+                           for record in self.records(level, last)])
 
     def show_messages(self):
         import sys
@@ -154,11 +222,83 @@ class CycleBufferHandler(logging.handlers.BufferingHandler):
         if version_is_good:
             import inkex
             """show messages to user and empty buffer"""
-            inkex.errormsg("\n".join([self.format(record) for record in self.buffer]))
+            inkex.errormsg("\n".join([self.format(record) for record in self.records()]))
         else:
-            sys.stderr.write("\n".join([self.format(record) for record in self.buffer]))
+            sys.stderr.write("\n".join([self.format(record) for record in self.records()]))
         self.flush()
 
+    def take_records(self):
+        """ Removes and returns the buffered records, oldest first """
+        self.acquire()
+        try:
+            records = list(self.buffer)
+            self.buffer.clear()
+        finally:
+            self.release()
+        return records
+
+    def flush_to(self, handler):
+        """ Passes the buffered records to handler (e.g. a file handler) and empties the buffer """
+        for record in self.take_records():
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Passes the records unchanged to a QueueListener running in the same process, so
+    their messages are formatted in the thread of the listener, not in the logging one.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class StartupProfiler(object):
+    """
+    Records the duration of the phases of the extension startup (imports, settings, requirements
+    check, ...). Enabled by setting the environment variable TEXTEXT_PROFILE_STARTUP, the timings
+    are written into the log by report().
+    """
+
+    ENV_VARIABLE = "TEXTEXT_PROFILE_STARTUP"
+
+    def __init__(self, enabled=None):
+        """
+        :param enabled: Record timings, if None the environment variable decides
+        """
+        self.enabled = bool(os.environ.get(self.ENV_VARIABLE)) if enabled is None else enabled
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.phases = []  # [(name, seconds)]
+
+    def mark(self, name):
+        """ Records the time elapsed since the previous mark (or the start) as phase `name` """
+        now = time.perf_counter()
+        if self.enabled:
+            self.phases.append((name, now - self._last))
+        self._last = now
+
+    def total(self):
+        """ :return: Seconds elapsed from the start until the last mark """
+        return self._last - self.start
+
+    def report(self, logger):
+        """ Writes the recorded phases into the log, even if logging is currently disabled """
+        if not self.enabled or not self.phases:
+            return
+        disabled_level = logging.root.manager.disable
+        logging.disable(logging.NOTSET)
+        try:
+            logger.info("Startup profile (%.1f ms in total):" % (self.total() * 1000))
+            for name, seconds in self.phases:
+                logger.info("  %-32s %8.1f ms" % (name, seconds * 1000))
+        finally:
+            logging.disable(disabled_level)
+
+
+startup_profiler = StartupProfiler()
+
 
 class Settings(object):
     def __init__(self, basename="config.json", directory=None):
@@ -238,38 +378,301 @@ class SuppressStream(object):
         self.devnull.close()
 
 
-def exec_command(cmd, ok_return_value=0):
+class CancelToken(object):
     """
-    Run given command, check return value, and return
-    concatenated stdout and stderr.
-    :param cmd: Command to execute
-    :param ok_return_value: The expected return value after successful completion
-    :raises: TexTextCommandNotFound, TexTextCommandFailed
+    Allows to cancel the commands executed via exec_command in another thread: Within
+    `with cancel_scope(token):` the running process is killed when token.cancel() is
+    called and exec_command raises TexTextCancelledError.
     """
 
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._processes = set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """ Marks the token as cancelled and kills the running processes """
+        with self._lock:
+            self._cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            kill_process_group(process)
+
+    def check(self):
+        """ :raises: TexTextCancelledError if the token has been cancelled """
+        if self._cancelled:
+            raise TexTextCancelledError("Cancelled")
+
+    def register(self, process):
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self._cancelled
+        if cancelled:
+            kill_process_group(process)
+
+    def unregister(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+
+_cancel_state = threading.local()
+
+
+@contextlib.contextmanager
+def cancel_scope(token):
+    """ Commands executed via exec_command in this thread can be cancelled by `token` """
+    previous_token = getattr(_cancel_state, "token", None)
+    _cancel_state.token = token
+    try:
+        yield token
+    finally:
+        _cancel_state.token = previous_token
+
+
+class CommandResult(object):
+    """ Result of run_command """
+
+    def __init__(self, return_code, stdout, stderr, elapsed, truncated=False):
+        """
+        :param return_code: The return code of the process
+        :param (bytes) stdout: The (last part of the) standard output
+        :param (bytes) stderr: The (last part of the) standard error
+        :param elapsed: The run time in seconds
+        :param truncated: True if the beginning of stdout or stderr has been dropped
+        """
+        self.return_code = return_code
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.truncated = truncated
+
+    @property
+    def output(self):
+        """ Concatenated stdout and stderr """
+        return self.stdout + self.stderr
+
+
+class _OutputTail(object):
+    """
+    Reads a pipe of a process in a background thread and keeps only its last max_size bytes
+    """
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self, stream, max_size=None):
+        """
+        :param stream: The pipe
+        :param max_size: Maximum number of bytes kept, all if None
+        """
+        self.max_size = max_size
+        self.truncated = False
+        self._chunks = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()  # the thread may still read when result() gives up waiting
+        self._thread = threading.Thread(target=self._read, args=(stream,), daemon=True)
+        self._thread.start()
+
+    def _read(self, stream):
+        try:
+            while True:
+                chunk = os.read(stream.fileno(), self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                with self._lock:
+                    self._chunks.append(chunk)
+                    self._size += len(chunk)
+                    # drop whole chunks as long as the rest is large enough
+                    while self.max_size is not None and self._size - len(self._chunks[0]) >= self.max_size:
+                        self._size -= len(self._chunks.popleft())
+                        self.truncated = True
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+
+    def result(self, timeout=None):
+        """
+        Waits until the pipe is closed (at most timeout seconds)
+
+        :return: The content read (the last max_size bytes)
+        """
+        self._thread.join(timeout)
+        with self._lock:
+            data = b"".join(self._chunks)
+        if self.max_size is not None and len(data) > self.max_size:
+            data = data[len(data) - self.max_size:]
+            self.truncated = True
+        return data
+
+
+def kill_process_group(process):
+    """
+    Kills a process started by run_command and all processes it started (on Windows only
+    the process itself)
+    """
     try:
-        # hides the command window for cli tools that are run (in Windows)
-        info = None
         if PLATFORM == WINDOWS:
-            info = subprocess.STARTUPINFO()
-            info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            info.wShowWindow = subprocess.SW_HIDE
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
 
+def _resource_limits_preexec(cpu_limit=None, memory_limit=None):
+    """
+    Prepares limits of the CPU time (seconds) and the address space (bytes) of a command.
+    They are set in the child process before the command is executed, so they also apply to
+    all processes started by the command. Only supported on POSIX systems.
+
+    :return: Function to be passed as preexec_fn to subprocess.Popen or None if no limits
+             are requested or they are not supported
+    """
+    if cpu_limit is None and memory_limit is None:
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    limits = []
+    for limit, value in [(getattr(resource, "RLIMIT_CPU", None), cpu_limit),
+                         (getattr(resource, "RLIMIT_AS", None), memory_limit)]:
+        if limit is None or value is None:
+            continue
+        try:
+            _, hard = resource.getrlimit(limit)
+        except (OSError, ValueError):
+            continue
+        value = int(value)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        limits.append((limit, (value, hard)))
+    if not limits:
+        return None
+
+    def set_limits():
+        # Runs between fork and exec, hence does as little as possible (all values are prepared)
+        for limit, values in limits:
+            try:
+                resource.setrlimit(limit, values)
+            except (OSError, ValueError):
+                pass
+
+    return set_limits
+
+
+def run_command(cmd, ok_return_value=0, timeout=None, max_output=None, cpu_limit=None, memory_limit=None,
+                cwd=None):
+    """
+    Run given command and capture its output while it runs.
+
+    The command is started in its own process group (session), so on timeout or
+    cancellation all processes it started are killed as well.
+
+    :param cmd: Command to execute
+    :param ok_return_value: The expected return value after successful completion, None accepts any
+    :param timeout: Time in seconds after which the command is killed, None for no limit
+    :param max_output: Only the last max_output bytes of stdout and of stderr are kept, all if None
+    :param cpu_limit: Limit of the CPU time of the command and of each process it starts in
+                      seconds (not on Windows)
+    :param memory_limit: Limit of the address space of the command and of each process it starts
+                         in bytes (not on Windows)
+    :param cwd: Working directory of the command, the current directory if None
+    :return: CommandResult
+    :raises: TexTextCommandNotFound, TexTextCommandFailed, TexTextCommandTimeout,
+             TexTextCancelledError (see cancel_scope)
+    """
+    token = getattr(_cancel_state, "token", None)  # type: CancelToken
+    if token is not None:
+        token.check()
+
+    popen_kwargs = {}
+    if PLATFORM == WINDOWS:
+        # hides the command window for cli tools that are run (in Windows)
+        info = subprocess.STARTUPINFO()
+        info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        info.wShowWindow = subprocess.SW_HIDE
+        popen_kwargs["startupinfo"] = info
+        popen_kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        popen_kwargs["start_new_session"] = True
+        preexec_fn = _resource_limits_preexec(cpu_limit, memory_limit)
+        if preexec_fn is not None:
+            popen_kwargs["preexec_fn"] = preexec_fn
+
+    start = time.perf_counter()
+    try:
         p = subprocess.Popen(cmd,
                              stdout=subprocess.PIPE,
                              stderr=subprocess.PIPE,
                              stdin=subprocess.PIPE,
-                             startupinfo=info)
-        out, err = p.communicate()
+                             cwd=cwd,
+                             **popen_kwargs)
     except OSError as err:
         raise TexTextCommandNotFound("Command %s failed: %s" % (' '.join(cmd), err))
 
+    # nothing to read, commands waiting for input fail instead of hanging
+    p.stdin.close()
+    out_tail = _OutputTail(p.stdout, max_output)
+    err_tail = _OutputTail(p.stderr, max_output)
+
+    timed_out = False
+    if token is not None:
+        token.register(p)
+    try:
+        try:
+            p.wait(timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+        except BaseException:
+            # e.g. KeyboardInterrupt, do not leave the command running
+            kill_process_group(p)
+            raise
+        if timed_out:
+            kill_process_group(p)
+            p.wait()
+    finally:
+        if token is not None:
+            token.unregister(p)
+
+    # Processes started by the command may still hold the pipes open after it has been killed
+    reader_timeout = 5 if timed_out else None
+    out, err = out_tail.result(reader_timeout), err_tail.result(reader_timeout)
+    elapsed = time.perf_counter() - start
+
+    if token is not None:
+        token.check()
+
+    if timed_out:
+        raise TexTextCommandTimeout(message="Command %s killed after %.0f s (time limit)" % (' '.join(cmd), elapsed),
+                                    return_code=p.returncode,
+                                    stdout=out,
+                                    stderr=err)
+
     if ok_return_value is not None and p.returncode != ok_return_value:
         raise TexTextCommandFailed(message="Command %s failed (code %d)" % (' '.join(cmd), p.returncode),
                                    return_code=p.returncode,
                                    stdout=out,
                                    stderr=err)
-    return out + err
+    return CommandResult(p.returncode, out, err, elapsed, out_tail.truncated or err_tail.truncated)
+
+
+def exec_command(cmd, ok_return_value=0, **limits):
+    """
+    Run given command, check return value, and return
+    concatenated stdout and stderr.
+    :param cmd: Command to execute
+    :param ok_return_value: The expected return value after successful completion
+    :param limits: timeout, max_output, cpu_limit, memory_limit, cwd, see run_command
+    :raises: TexTextCommandNotFound, TexTextCommandFailed, TexTextCommandTimeout,
+             TexTextCancelledError (see cancel_scope)
+    """
+    return run_command(cmd, ok_return_value, **limits).output
 
 
 def version_greater_or_equal_than(version_str, other_version_str):